@@ -0,0 +1,302 @@
+"""Tolerant parsing of the JSON analysis that AIService asks Claude for.
+
+The prompt asks for a single JSON object, but some responses wrap it in a
+```json fence or a line of preamble, leave trailing commas, or stop
+part-way through the object when they hit max_tokens. parse_analysis()
+finds the object, repairs what it can and checks each field against the
+schema. Any field that survives is kept. Only the fields listed in
+ParsedAnalysis.missing need a follow-up call (AIService._follow_up).
+
+StreamingAnalysis reads the same answer as it streams. It reports the
+category, score and each complete bullet as soon as they arrive, and it
+can stop the stream once a low score makes the rest of the answer
+worthless.
+"""
+
+import json
+import math
+import re
+import time
+from collections import namedtuple
+
+# fields: validated values; missing: required fields that could not be recovered;
+# outcome: 'clean', 'repaired', 'salvaged' or 'unparsed'
+ParsedAnalysis = namedtuple('ParsedAnalysis', 'fields missing outcome')
+
+REQUIRED_FIELDS = ('bullets', 'category', 'relevancy_score')
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*(.*?)(?:```|$)", re.S)
+_STRING_RE = r'"((?:[^"\\]|\\.)*)"'
+_TRAILING_SCALAR_RE = re.compile(r"[-+.\w]+\s*$")
+_BULLET_LINE_RE = re.compile(r"^\s*(?:[•*-]|\d+[.)])\s+(.+)$", re.M)
+# A score only counts once something follows it; "8" may still become "85"
+_STREAM_SCORE_RE = re.compile(r'"relevancy_score"\s*:\s*"?(\d{1,3})"?\s*[,}\n]')
+_STREAM_BULLETS_RE = re.compile(r'"bullets"\s*:\s*\[(.*?)(?:\]|$)', re.S)
+# Candidate cut points tried when repairing, from the end backwards
+_MAX_REPAIR_CUTS = 40
+
+def extract_json_text(text):
+    """The first JSON object in text, without fences or preamble.
+
+    If the object is never closed (truncated output), everything from its
+    opening brace on is returned. None when there is no brace at all.
+    """
+    fenced = _FENCE_RE.search(text)
+    if fenced and '{' in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find('{')
+    if start < 0:
+        return None
+    depth, in_string, escape = 0, False, False
+    for index in range(start, len(text)):
+        ch = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+def _scan(text):
+    """Drop trailing commas; return (text, open brackets, start of an unterminated string or None)"""
+    out, stack = [], []
+    in_string, escape, string_start = False, False, None
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string, string_start = True, len(out)
+        elif ch in '{[':
+            stack.append(ch)
+        elif ch in '}]':
+            while out and (out[-1].isspace() or out[-1] == ','):
+                out.pop()
+            if stack:
+                stack.pop()
+        out.append(ch)
+    return ''.join(out), stack, string_start if in_string else None
+
+def _close(text):
+    """Make a truncated fragment parseable: drop an unfinished string, close the brackets"""
+    text, stack, string_start = _scan(text)
+    if string_start is not None:
+        text = text[:string_start]
+    elif stack:
+        # A number or literal at a cut-off end may be incomplete ("relevancy_score": 8)
+        text = _TRAILING_SCALAR_RE.sub('', text)
+    text = text.rstrip().rstrip(',').rstrip()
+    if text.endswith(':'):
+        text += ' null'
+    return text + ''.join('}' if ch == '{' else ']' for ch in reversed(stack))
+
+def _cut_points(text):
+    """Offsets of commas and opening brackets outside strings, last first"""
+    points, in_string, escape = [], False, False
+    for index, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in ',[{':
+            points.append(index + (ch != ','))
+    return reversed(points[-_MAX_REPAIR_CUTS:])
+
+def repair_json(fragment):
+    """Parse a damaged JSON fragment, dropping whatever was cut off; None if nothing parses"""
+    candidates = [fragment]
+    candidates += [fragment[:point] for point in _cut_points(fragment)]
+    for candidate in candidates:
+        try:
+            return json.loads(_close(candidate), strict=False)
+        except ValueError:
+            continue
+    return None
+
+def _unescape(value):
+    try:
+        return json.loads(f'"{value}"', strict=False)
+    except ValueError:
+        return value
+
+def salvage_fields(text):
+    """Pull whatever fields are recognisable out of text that is not JSON"""
+    data = {}
+    for name in ('category', 'author'):
+        match = re.search(rf'"?{name}"?\s*[:=]\s*{_STRING_RE}', text)
+        if match:
+            data[name] = _unescape(match.group(1))
+    match = re.search(r'"?relevancy_score"?\s*[:=]\s*"?(\d{1,3})', text)
+    if match:
+        data['relevancy_score'] = int(match.group(1))
+    match = re.search(r'"?bullets"?\s*[:=]\s*\[(.*?)(?:\]|$)', text, re.S)
+    if match:
+        # Only complete strings; a bullet cut off mid-sentence is not worth keeping
+        data['bullets'] = [_unescape(value) for value in re.findall(_STRING_RE, match.group(1))]
+    else:
+        data['bullets'] = _BULLET_LINE_RE.findall(text)
+    return data
+
+def _score(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return max(0, min(100, int(round(value))))
+    if isinstance(value, str):
+        match = re.match(r'\s*(\d{1,3})(?:\.\d+)?\s*%?\s*$', value)
+        if match:
+            return min(100, int(match.group(1)))
+    return None
+
+def _category(value, categories):
+    if not isinstance(value, str) or not value.strip():
+        return None
+    if not categories:
+        return value.strip()
+    wanted = value.strip().strip('"\'').lower()
+    for name in categories:
+        if name.lower() == wanted:
+            return name
+    return None
+
+def validate_analysis(data, categories):
+    """(fields, missing) for a decoded analysis; categories are the allowed names"""
+    fields = {}
+    bullets = data.get('bullets')
+    if isinstance(bullets, str):
+        bullets = bullets.splitlines()
+    if isinstance(bullets, list):
+        bullets = [b.strip() for b in bullets if isinstance(b, str) and b.strip()]
+        if bullets:
+            fields['bullets'] = bullets
+    category = _category(data.get('category'), categories)
+    if category is not None:
+        fields['category'] = category
+    score = _score(data.get('relevancy_score'))
+    if score is not None:
+        fields['relevancy_score'] = score
+    author = data.get('author')
+    fields['author'] = author.strip() if isinstance(author, str) else ''
+    missing = [name for name in REQUIRED_FIELDS if name not in fields]
+    return fields, missing
+
+def parse_analysis(text, categories):
+    """ParsedAnalysis for a model response; categories are the allowed category names"""
+    fragment = extract_json_text(text or '')
+    data, outcome = None, 'unparsed'
+    if fragment is not None:
+        try:
+            data, outcome = json.loads(fragment, strict=False), 'clean'
+        except ValueError:
+            data = repair_json(fragment)
+            outcome = 'repaired'
+    if not isinstance(data, dict):
+        data, outcome = salvage_fields(text or ''), 'salvaged'
+    fields, missing = validate_analysis(data, categories)
+    if outcome == 'salvaged' and len(missing) == len(REQUIRED_FIELDS):
+        outcome = 'unparsed'
+    return ParsedAnalysis(fields, missing, outcome)
+
+class StreamingAnalysis:
+    """Consumer for invoke_model_with_response_stream events (see ResilientInvoker.invoke_stream).
+
+    feed() takes each decoded event and returns True to stop the stream,
+    which it does once the relevancy score is known to be below
+    stop_below. on_update(fields) is called whenever the category, the
+    score or the list of complete bullets changes. body() rebuilds an
+    invoke_model-style response body from what arrived, so the usual
+    parse_analysis path handles the rest.
+    """
+    def __init__(self, categories, stop_below=None, on_update=None):
+        self.categories = categories
+        self.stop_below = stop_below
+        self.on_update = on_update
+        self.reset()
+
+    def reset(self):
+        """Start over; called before every attempt, since a retry streams the answer again"""
+        self.chunks = []
+        self.usage = {}
+        self.stop_reason = None
+        self.fields = {}
+        self.stopped_early = False
+        self.first_result_seconds = None
+        self._started = time.monotonic()
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def feed(self, event):
+        kind = event.get('type')
+        if kind == 'message_start':
+            self.usage.update((event.get('message') or {}).get('usage') or {})
+        elif kind == 'message_delta':
+            self.usage.update(event.get('usage') or {})
+            self.stop_reason = (event.get('delta') or {}).get('stop_reason') or self.stop_reason
+        elif kind == 'content_block_delta':
+            delta = (event.get('delta') or {}).get('text', '')
+            self.chunks.append(delta)
+            if any(ch in delta for ch in '",]}\n'):
+                return self._update()
+        return False
+
+    def _update(self):
+        text = self.text
+        found = {}
+        if 'category' not in self.fields:
+            match = re.search(rf'"category"\s*:\s*{_STRING_RE}', text)
+            category = _category(_unescape(match.group(1)), self.categories) if match else None
+            if category:
+                found['category'] = category
+        if 'relevancy_score' not in self.fields:
+            match = _STREAM_SCORE_RE.search(text)
+            if match:
+                found['relevancy_score'] = min(100, int(match.group(1)))
+        match = _STREAM_BULLETS_RE.search(text)
+        if match:
+            bullets = [_unescape(b).strip() for b in re.findall(_STRING_RE, match.group(1)) if b.strip()]
+            if len(bullets) > len(self.fields.get('bullets', ())):
+                found['bullets'] = bullets
+        if not found:
+            return False
+        self.fields.update(found)
+        if self.first_result_seconds is None and 'relevancy_score' in self.fields:
+            self.first_result_seconds = time.monotonic() - self._started
+        if self.on_update is not None:
+            self.on_update(dict(self.fields))
+        score = self.fields.get('relevancy_score')
+        if self.stop_below is not None and score is not None and score < self.stop_below:
+            self.stopped_early = True
+            return True
+        return False
+
+    def body(self):
+        """invoke_model-style response body for what has streamed so far"""
+        usage = dict(self.usage)
+        if self.stopped_early or 'output_tokens' not in usage:
+            # An abandoned stream reports no final count; estimate what was generated
+            usage['output_tokens'] = max(usage.get('output_tokens', 0), math.ceil(len(self.text) / 4))
+        stop_reason = 'stopped_early' if self.stopped_early else self.stop_reason
+        return {'content': [{'type': 'text', 'text': self.text}], 'usage': usage, 'stop_reason': stop_reason}
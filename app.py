@@ -1,14 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context, g
 from dotenv import load_dotenv
 import os
-import threading
+import logging
 from sqlalchemy.orm import joinedload
-from database import SessionLocal, Feed, Topic, Article, Category, SystemConfig
+from database import SessionLocal, Feed, Topic, Article, Category, SystemConfig, PendingEntry, RunArtifact
 from sqlalchemy import func
-from collections import Counter
 from services import NewsProcessor
-from scheduler import init_scheduler, rss_scheduler
-from output_generators import OutputGenerator
+from jobs import job_manager
+from scheduler import (init_scheduler, get_scheduler, scheduler_lock, schedule_from_form, save_schedule,
+                       scheduler_enabled, set_scheduler_enabled)
+from output_generators import OutputGenerator, REPORT_FORMATS
+from report_cache import ReportCache, bump_content_revision
+from stats import get_article_stats, get_total_stat
+from run_history import recent_runs, daily_trends, artifact_names
+from profiling import configured_profile_mode, save_profile_mode, PROFILE_MODES
+from metrics import registry, CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_RESPONSES, QUEUE_DEPTH
+import io
+import time
 import pytz
 from datetime import datetime, date
 
@@ -31,9 +39,36 @@ app.jinja_env.filters['slugify'] = slugify
 # Initialize news processor (no API key needed for AWS Bedrock)
 news_processor = NewsProcessor()
 output_generator = OutputGenerator()
-
-# Initialize scheduler
-init_scheduler()
+report_cache = ReportCache(output_generator)
+
+def create_app(start_scheduler=True):
+    """Configure the application for serving.
+
+    Importing this module has no side effects beyond route registration;
+    the scheduler only starts here, and only in the process that wins the
+    scheduler lock (see scheduler.init_scheduler).
+    """
+    if not app.config.get('INITIALIZED'):
+        logging.basicConfig(level=logging.INFO)
+        app.secret_key = os.getenv('FLASK_SECRET_KEY', app.secret_key)
+        if start_scheduler:
+            init_scheduler()
+        app.config['INITIALIZED'] = True
+    return app
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is not None:
+        # Label by route endpoint, not path, so article ids don't create new series
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        HTTP_RESPONSES.labels(endpoint, response.status_code).inc()
+    return response
 
 @app.route('/')
 def dashboard():
@@ -46,23 +81,24 @@ def dashboard():
         
         categories = db.query(Category).filter(Category.active == True).all()
         
-        total_articles = db.query(Article).count()
+        # Counts come from the article_stats table refreshed after each ingest run
+        total_stat = get_total_stat(db)
+        total_articles = total_stat.article_count if total_stat else 0
         
-        latest_article = db.query(Article).order_by(Article.created_at.desc()).first()
         last_refresh = None
-        if latest_article and latest_article.created_at:
+        if total_stat and total_stat.latest_created_at:
             pst = pytz.timezone('US/Pacific')
-            last_refresh = latest_article.created_at.replace(tzinfo=pytz.UTC).astimezone(pst)
+            last_refresh = total_stat.latest_created_at.replace(tzinfo=pytz.UTC).astimezone(pst)
         
-        # Calculate stats from the actually fetched articles to ensure links match content
-        category_names = [a.category_name for a in articles if a.category_name]
-        category_stats = dict(Counter(category_names))
+        category_stats = {key: stat.article_count for key, stat in get_article_stats(db, 'category').items()}
+        shown_categories = {article.category_name for article in articles}
         
         return render_template('dashboard.html', 
                              articles=articles, 
                              categories=categories,
                              last_refresh=last_refresh,
                              category_stats=category_stats,
+                             shown_categories=shown_categories,
                              total_articles=total_articles)
     finally:
         db.close()
@@ -76,7 +112,8 @@ def admin_feeds():
     db = SessionLocal()
     try:
         feeds = db.query(Feed).all()
-        return render_template('admin_feeds.html', feeds=feeds, active_tab='feeds')
+        feed_stats = get_article_stats(db, 'feed')
+        return render_template('admin_feeds.html', feeds=feeds, feed_stats=feed_stats, active_tab='feeds')
     finally:
         db.close()
 
@@ -95,7 +132,8 @@ def admin_categories():
     db = SessionLocal()
     try:
         categories = db.query(Category).all()
-        return render_template('admin_categories.html', categories=categories, active_tab='categories')
+        category_stats = get_article_stats(db, 'category')
+        return render_template('admin_categories.html', categories=categories, category_stats=category_stats, active_tab='categories')
     finally:
         db.close()
 
@@ -216,17 +254,40 @@ def edit_category(category_id):
 
 @app.route('/refresh_news')
 def refresh_news():
-    def background_refresh():
-        result = news_processor.process_feeds()
-        print(f"Background refresh result: {result}")
-    
-    if not news_processor.processing:
-        thread = threading.Thread(target=background_refresh)
-        thread.daemon = True
-        thread.start()
-        return jsonify({"status": "started", "message": "News refresh started in background"})
+    job_id, started = job_manager.submit('refresh_news', news_processor.process_feeds)
+    if started:
+        return jsonify({"status": "started", "job_id": job_id, "message": f"News refresh started in background (job {job_id})"})
     else:
-        return jsonify({"status": "busy", "message": "Already processing"})
+        return jsonify({"status": "busy", "job_id": job_id, "message": "Already processing"})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for this process"""
+    db = SessionLocal()
+    try:
+        depth = dict(db.query(PendingEntry.status, func.count(PendingEntry.id)).group_by(PendingEntry.status).all())
+    finally:
+        db.close()
+    for status in ('pending', 'rejected'):
+        QUEUE_DEPTH.labels(status).set(depth.get(status, 0))
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({"jobs": job_manager.recent()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if job_manager.cancel(job_id):
+        return jsonify({"success": True, "message": "Cancellation requested"})
+    return jsonify({"success": False, "message": "Job not found or not running"}), 404
 
 @app.route('/clear_all_news')
 def clear_all_news():
@@ -276,6 +337,7 @@ def delete_feed(feed_id):
         feed = db.get(Feed, feed_id)
         if feed:
             db.delete(feed)
+            bump_content_revision(db)
             db.commit()
             flash('Feed deleted successfully')
     finally:
@@ -310,53 +372,114 @@ def delete_category(category_id):
 
 @app.route('/admin/scheduler')
 def admin_scheduler():
+    rss_scheduler = get_scheduler()
     next_run = rss_scheduler.get_next_run_time()
+    db = SessionLocal()
+    try:
+        day_stats = sorted(get_article_stats(db, 'day').values(), key=lambda stat: stat.key, reverse=True)[:14]
+        runs = recent_runs(db)
+        run_trends = daily_trends(db)
+        run_artifacts = artifact_names(db, [run.id for run in runs])
+    finally:
+        db.close()
     return render_template('admin_scheduler.html', 
                          next_run=next_run, 
+                         scheduled_jobs=rss_scheduler.get_jobs() if rss_scheduler.is_running else [],
                          is_running=rss_scheduler.is_running,
+                         scheduler_enabled=scheduler_enabled(),
+                         leader_pid=None if rss_scheduler.is_running else scheduler_lock.holder_pid(),
+                         day_stats=day_stats,
+                         runs=runs,
+                         run_trends=run_trends,
+                         run_artifacts=run_artifacts,
+                         profile_mode=configured_profile_mode() or 'off',
+                         job_id=request.args.get('job_id'),
                          active_tab='scheduler')
 
 @app.route('/update_schedule', methods=['POST'])
 def update_schedule():
-    hour = int(request.form['hour'])
-    minute = int(request.form['minute'])
+    try:
+        schedule = schedule_from_form(request.form.get('frequency', 'daily'),
+                                      request.form.get('time', '09:00'),
+                                      request.form.get('interval', '6'),
+                                      request.form.get('weekday', '1'))
+    except (ValueError, IndexError) as e:
+        flash(f'Invalid schedule: {e}')
+        return redirect(url_for('admin_scheduler'))
     
-    rss_scheduler.schedule_daily(hour=hour, minute=minute)
-    flash(f'Schedule updated to {hour:02d}:{minute:02d} daily')
+    save_schedule(schedule)
+    rss_scheduler = get_scheduler()
+    cron = f"{schedule['minute']} {schedule['hour']} {schedule['day']} {schedule['month']} {schedule['day_of_week']}"
+    if rss_scheduler.is_running:
+        rss_scheduler.schedule_cron(**schedule)
+        flash(f'Feed fetch schedule updated to {cron}')
+    else:
+        flash(f'Feed fetch schedule saved as {cron}; the scheduler worker picks it up shortly')
+    return redirect(url_for('admin_scheduler'))
+
+@app.route('/toggle_scheduler', methods=['POST'])
+def toggle_scheduler():
+    enabled = request.form.get('action') == 'start'
+    rss_scheduler = set_scheduler_enabled(enabled)
+    if not enabled:
+        flash('Scheduler stopped; no worker runs scheduled jobs until it is started again')
+    elif rss_scheduler.is_running or scheduler_lock.holder_pid():
+        flash('Scheduler started')
+    else:
+        flash('Scheduler enabled; a worker takes it over within RSS_SCHEDULER_LOCK_RETRY seconds')
     return redirect(url_for('admin_scheduler'))
 
+@app.route('/update_profiling', methods=['POST'])
+def update_profiling():
+    mode = request.form.get('profile_mode', 'off')
+    save_profile_mode(mode)
+    if mode in PROFILE_MODES:
+        flash(f'Ingest runs will be profiled ({mode}) until profiling is turned off')
+    else:
+        flash('Run profiling turned off')
+    return redirect(url_for('admin_scheduler'))
+
+@app.route('/admin/runs/<int:run_id>/artifacts/<name>')
+def download_run_artifact(run_id, name):
+    db = SessionLocal()
+    try:
+        artifact = db.query(RunArtifact).filter(RunArtifact.run_id == run_id, RunArtifact.name == name).first()
+        if not artifact:
+            return "Artifact not found", 404
+        return send_file(io.BytesIO(artifact.data), as_attachment=True, download_name=f"run-{run_id}-{name}",
+                         mimetype=artifact.content_type or 'application/octet-stream')
+    finally:
+        db.close()
+
 @app.route('/run_scheduler_now')
 def run_scheduler_now():
-    print("=== Run Now button clicked ===")
     app.logger.info("Run Now button clicked")
     
-    if not news_processor.processing:
-        print("=== Starting RSS processing ===")
-        result = news_processor.process_feeds()
-        print(f"=== RSS processing result: {result} ===")
-        flash(f'RSS summary completed: {result}')
+    job_id, started = job_manager.submit('run_now', news_processor.process_feeds)
+    if started:
+        flash(f'RSS summary started (job {job_id})')
     else:
-        print("=== RSS processing already in progress ===")
         flash('RSS summary already in progress')
-    return redirect(url_for('admin_scheduler'))
+    return redirect(url_for('admin_scheduler', job_id=job_id))
+
+REPORT_MIMETYPES = {'markdown': 'text/markdown; charset=utf-8', 'html': 'text/html; charset=utf-8', 'text': 'text/plain; charset=utf-8'}
+
+def _send_report(format_type, download_name, start_date=None, end_date=None):
+    """Serve a report from the cache, or stream it while it is written to the cache"""
+    mimetype = REPORT_MIMETYPES[format_type]
+    path, chunks = report_cache.open_report(format_type, start_date, end_date)
+    if path:
+        return send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
 
 @app.route('/generate_markdown')
 def generate_markdown():
-    try:
-        filename = output_generator.generate_markdown()
-        return send_file(filename, as_attachment=True, download_name=f"rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
-    except Exception as e:
-        flash(f'Error generating markdown: {e}')
-        return redirect(url_for('dashboard'))
+    return _send_report('markdown', f"rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
 
 @app.route('/generate_html')
 def generate_html():
-    try:
-        filename = output_generator.generate_html()
-        return send_file(filename, as_attachment=True, download_name=f"rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html")
-    except Exception as e:
-        flash(f'Error generating HTML: {e}')
-        return redirect(url_for('dashboard'))
+    return _send_report('html', f"rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html")
 
 @app.route('/generate_date_range_report', methods=['POST'])
 def generate_date_range_report():
@@ -364,16 +487,17 @@ def generate_date_range_report():
         start_date = request.form['start_date']
         end_date = request.form['end_date']
         format_type = request.form['format']
-        
-        if format_type == 'markdown':
-            filename = output_generator.generate_markdown(start_date=start_date, end_date=end_date)
-        else:
-            filename = output_generator.generate_html(start_date=start_date, end_date=end_date)
-            
-        return send_file(filename, as_attachment=True, download_name=f"rss_summary_{start_date}_to_{end_date}.{format_type}")
+        # Validate up front; errors raised while streaming cannot redirect
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
     except Exception as e:
         flash(f'Error generating date range report: {e}')
         return redirect(url_for('admin_scheduler'))
+    
+    if format_type not in REPORT_FORMATS:
+        format_type = 'html'
+    extension = REPORT_FORMATS[format_type][1]
+    return _send_report(format_type, f"rss_summary_{start_date}_to_{end_date}.{extension}", start_date, end_date)
 
 @app.route('/update_summary/<int:article_id>', methods=['POST'])
 def update_summary(article_id):
@@ -388,6 +512,7 @@ def update_summary(article_id):
         article = db.get(Article, article_id)
         if article:
             article.summary = new_summary
+            bump_content_revision(db)
             db.commit()
             return jsonify({"success": True})
         return jsonify({"success": False, "message": "Article not found"}), 404
@@ -418,4 +543,4 @@ def rate_article(article_id):
         db.close()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""Record and replay everything an ingest run reads from the network.
+
+An archive is a directory of zlib-compressed, content-addressed blobs
+(blobs/<sha256[:2]>/<sha256>) plus index.jsonl, which maps each request
+(a feed URL, an article page URL, or a Bedrock request body) to the blob
+holding its response. Identical responses are stored once, so repeated
+recordings of the same feeds stay small.
+
+In record mode the live responses are written to the archive as they are
+used; in replay mode NewsProcessor is driven entirely from the archive,
+with no network access and no rate-limit sleeps, using the recording's
+start time as its clock. Both modes freeze the prompt builder's
+calibration (PromptBuilder.freeze) so request bodies, and with them the
+Bedrock keys, do not depend on the order in which answers came back.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class ArchiveMiss(KeyError):
+    """Replay asked for a response that was never recorded"""
+
+def request_key(*parts):
+    return hashlib.sha256('\x00'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+class FetchArchive:
+    def __init__(self, path, mode):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._index = {}
+        self.started_at = datetime.now()
+        index_path = os.path.join(path, 'index.jsonl')
+        if mode == 'replay':
+            if not os.path.exists(index_path):
+                raise FileNotFoundError(f"No archive at {path}")
+            with open(self._manifest_path()) as f:
+                self.started_at = datetime.fromisoformat(json.load(f)['started_at'])
+            with open(index_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._index[(record['kind'], record['key'])] = record['blob']
+        else:
+            os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+            with open(self._manifest_path(), 'w') as f:
+                json.dump({'started_at': self.started_at.isoformat(), 'format': 1}, f)
+        self._index_file = open(index_path, 'a', encoding='utf-8') if mode == 'record' else None
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, 'blobs', digest[:2], digest)
+
+    def store(self, kind, key, data):
+        """Record the response for (kind, key); data is bytes"""
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                with open(blob_path, 'wb') as f:
+                    f.write(zlib.compress(data, 6))
+            if self._index.get((kind, key)) != digest:
+                self._index[(kind, key)] = digest
+                self._index_file.write(json.dumps({'kind': kind, 'key': key, 'blob': digest}) + '\n')
+                self._index_file.flush()
+
+    def load(self, kind, key):
+        """Recorded response bytes for (kind, key); raises ArchiveMiss if absent"""
+        digest = self._index.get((kind, key))
+        if digest is None:
+            raise ArchiveMiss(f"{kind} {key} is not in the archive")
+        with open(self._blob_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def close(self):
+        if self._index_file:
+            self._index_file.close()
+            self._index_file = None
+
+class ArchivedBedrockClient:
+    """Bedrock runtime stand-in that records or replays invoke_model and streamed calls.
+
+    A stream is archived as the list of chunks the caller read, so a replay
+    ends exactly where the recorded stream did, including streams that
+    StreamingAnalysis closed early. A stream that failed part-way is not
+    stored; the retry records it again.
+    """
+    def __init__(self, archive, client=None):
+        self.archive = archive
+        self.client = client
+
+    def invoke_model(self, **kwargs):
+        key = request_key(kwargs.get('modelId'), kwargs.get('body'))
+        if self.archive.replaying:
+            return {'body': io.BytesIO(self.archive.load('bedrock', key))}
+        response = self.client.invoke_model(**kwargs)
+        data = response['body'].read()
+        self.archive.store('bedrock', key, data)
+        return dict(response, body=io.BytesIO(data))
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        key = request_key(kwargs.get('modelId'), kwargs.get('body'))
+        if self.archive.replaying:
+            chunks = json.loads(self.archive.load('bedrock-stream', key))
+            return {'body': iter([{'chunk': {'bytes': chunk.encode('utf-8')}} for chunk in chunks])}
+        response = self.client.invoke_model_with_response_stream(**kwargs)
+        return dict(response, body=self._record_stream(key, response['body']))
+
+    def _record_stream(self, key, stream):
+        chunks, finished = [], False
+        try:
+            for event in stream:
+                chunk = event.get('chunk')
+                if chunk:
+                    chunks.append(chunk['bytes'].decode('utf-8'))
+                yield event
+            finished = True
+        except GeneratorExit:
+            finished = True  # the caller closed the stream on purpose
+            raise
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            if finished:
+                self.archive.store('bedrock-stream', key, json.dumps(chunks).encode('utf-8'))
+
+def attach_archive(processor, archive):
+    """Route a NewsProcessor's feed, page and Bedrock traffic through the archive"""
+    processor.rss_fetcher.archive = archive
+    processor.content_extractor.archive = archive
+    processor.ai_service.prompts.freeze()
+    if archive.replaying:
+        processor.ai_service.bedrock_client = ArchivedBedrockClient(archive)
+        processor.clock = lambda: archive.started_at
+        processor.analyze_delay = 0
+    else:
+        processor.ai_service.bedrock_client = ArchivedBedrockClient(archive, processor.ai_service.bedrock_client)
+    logger.info(f"{archive.mode.title()}ing ingest traffic in {archive.path}")
+    return processor
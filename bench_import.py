@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Import-time benchmark for the app and CLI entry points.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter for
+each module and reports the cumulative import time plus the slowest
+imports underneath it. Importing any of these modules must not create
+clients, engines or schedulers, so the numbers should stay small.
+
+Usage:
+    python bench_import.py
+    python bench_import.py --json bench_import.json --budget-ms 1500
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ['database', 'stats', 'services', 'scheduler', 'output_generators', 'app', 'run_once']
+
+def measure_import(module):
+    """Import a module in a clean interpreter and parse -X importtime output"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    cumulative_ms = next((cum / 1000 for name, _, cum in entries if name == module), 0.0)
+    slowest = sorted(entries, key=lambda e: e[1], reverse=True)[:5]
+    return {
+        'module': module,
+        'import_ms': round(cumulative_ms, 1),
+        'process_wall_ms': round(wall_ms, 1),
+        'slowest_self_ms': [{'module': name, 'ms': round(self_us / 1000, 1)} for name, self_us, _ in slowest],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--budget-ms', type=float, help='fail if any module takes longer to import')
+    args = parser.parse_args()
+
+    results = [measure_import(module) for module in args.modules]
+
+    print(f"{'module':<20} {'import ms':>10} {'process ms':>11}  slowest self")
+    for result in results:
+        slowest = ', '.join(f"{s['module']} {s['ms']}" for s in result['slowest_self_ms'][:3])
+        print(f"{result['module']:<20} {result['import_ms']:>10} {result['process_wall_ms']:>11}  {slowest}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+    if args.budget_ms:
+        over = [r for r in results if r['import_ms'] > args.budget_ms]
+        for result in over:
+            print(f"OVER BUDGET: {result['module']} {result['import_ms']} ms > {args.budget_ms} ms")
+        return 1 if over else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
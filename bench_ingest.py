@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""End-to-end ingest benchmark with a mock feed server and a stub Bedrock client.
+
+Starts a local HTTP server with synthetic RSS feeds (and article pages for
+the extraction stage), swaps a latency-simulating fake into
+AIService.bedrock_client, and runs NewsProcessor.process_feeds against a
+temporary SQLite database. Nothing touches the network, Bedrock or
+news.db.
+
+Reports entries/sec, p50/p99 latency per stage, peak RSS and time spent
+in the database. Use --json to keep the numbers and --min-eps to fail a
+run that falls below a throughput floor.
+
+Usage:
+    python bench_ingest.py
+    python bench_ingest.py --feeds 50 --entries 40 --bedrock-ms 300 --json bench_ingest.json
+    python bench_ingest.py --description-chars 80   # force full-article extraction
+    python bench_ingest.py --stream                 # streamed answers, low scores stopped early
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import hashlib
+import io
+import json
+import resource
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ('market policy rate inflation bank growth energy trade labor credit '
+         'housing supply demand outlook survey index report quarter forecast').split()
+
+def _text(seed, chars):
+    words = []
+    i = seed
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(WORDS[i % len(WORDS)])
+        i = i * 7 + 3
+    return ' '.join(words)[:chars]
+
+class FeedServer:
+    """Serves /feed/<n>.xml with synthetic entries and /article/<n>/<i>-<generation> pages"""
+    def __init__(self, feeds, entries, description_chars, latency_ms):
+        self.feeds = feeds
+        self.entries = entries
+        self.description_chars = description_chars
+        self.latency = latency_ms / 1000
+        self.generation = 0  # bump to publish a fresh set of entry links
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def feed_xml(self, feed):
+        published = format_datetime(datetime.now(timezone.utc))
+        items = ''.join(
+            f"<item><title>Feed {feed} story {i}</title>"
+            f"<link>{self.base_url}/article/{feed}/{i}-{self.generation}</link>"
+            f"<author>reporter{i % 7}@example.com (Reporter {i % 7})</author>"
+            f"<description>{_text(feed * 1000 + i, self.description_chars)}</description>"
+            f"<pubDate>{published}</pubDate></item>"
+            for i in range(self.entries)
+        )
+        return f"<?xml version='1.0'?><rss version='2.0'><channel><title>Feed {feed}</title>{items}</channel></rss>"
+
+    def article_html(self, feed, i):
+        paragraphs = ''.join(f"<p>{_text(feed * 1000 + i + p, 300)}</p>" for p in range(8))
+        return f"<html><body><nav>Home News</nav><article><h1>Story {i}</h1>{paragraphs}</article></body></html>"
+
+    def _handler(self):
+        bench = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with bench._lock:
+                    bench.requests += 1
+                time.sleep(bench.latency)
+                parts = self.path.strip('/').split('/')
+                if parts[0] == 'feed':
+                    body, content_type = bench.feed_xml(int(parts[1].split('.')[0])), 'application/rss+xml'
+                elif parts[0] == 'article':
+                    body, content_type = bench.article_html(int(parts[1]), int(parts[2].split('-')[0])), 'text/html'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+class FakeBedrockClient:
+    """invoke_model stand-in with fixed latency and a deterministic relevancy score.
+
+    invoke_model_with_response_stream spreads the same latency over the
+    answer's tokens (about 4 characters each), and stops generating when
+    the caller closes the stream.
+    """
+    def __init__(self, latency_ms, relevant_ratio, category):
+        self.latency = latency_ms / 1000
+        self.relevant_ratio = relevant_ratio
+        self.category = category
+        self.calls = 0
+        self.output_tokens = 0  # tokens actually generated
+        self._lock = threading.Lock()
+
+    def _answer(self, body):
+        with self._lock:
+            self.calls += 1
+        digest = int(hashlib.md5(body).hexdigest()[:8], 16)
+        score = 90 if (digest % 1000) / 1000 < self.relevant_ratio else 40
+        text = json.dumps({
+            'category': self.category,
+            'relevancy_score': score,
+            'author': '',
+            'bullets': [f"Synthetic bullet {n} for request {digest % 10000}" for n in range(4)],
+        })
+        return text, {'input_tokens': len(body) // 4, 'output_tokens': len(text) // 4}
+
+    def invoke_model(self, **kwargs):
+        text, usage = self._answer(kwargs['body'])
+        time.sleep(self.latency)
+        with self._lock:
+            self.output_tokens += usage['output_tokens']
+        return {'body': io.BytesIO(json.dumps({'content': [{'type': 'text', 'text': text}], 'usage': usage}).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        text, usage = self._answer(kwargs['body'])
+        return {'body': self._stream(text, usage)}
+
+    def _stream(self, text, usage):
+        def event(payload):
+            return {'chunk': {'bytes': json.dumps(payload).encode('utf-8')}}
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        yield event({'type': 'message_start', 'message': {'usage': {'input_tokens': usage['input_tokens']}}})
+        for token in tokens:
+            time.sleep(self.latency / len(tokens))
+            with self._lock:
+                self.output_tokens += 1
+            yield event({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': token}})
+        yield event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                     'usage': {'output_tokens': len(tokens)}})
+        yield event({'type': 'message_stop'})
+
+class StageTimer:
+    """Collects per-call latencies by stage"""
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        return {stage: _latency_summary(values) for stage, values in sorted(self.samples.items())}
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def _latency_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(_percentile(values, 50) * 1000, 2),
+        'p99_ms': round(_percentile(values, 99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2),
+        'total_s': round(sum(values), 3),
+    }
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='rss_bench_')
+    # Must be set before the first database access; the engine is created lazily
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from sqlalchemy import event
+    from database import SessionLocal, Feed, Category, get_engine
+    from feed_parsing import parse_pool
+    from services import NewsProcessor
+
+    server = FeedServer(args.feeds, args.entries, args.description_chars, args.feed_ms)
+    server.start()
+
+    db = SessionLocal()
+    db.add(Category(name='Economy', description='Synthetic benchmark category', active=True))
+    db.add_all(Feed(name=f"Bench feed {n}", url=f"{server.base_url}/feed/{n}.xml", active=True)
+               for n in range(args.feeds))
+    db.commit()
+    db.close()
+
+    timer = StageTimer()
+    db_time = {'seconds': 0.0, 'statements': 0}
+    db_lock = threading.Lock()
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._bench_start = time.perf_counter()
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        with db_lock:
+            db_time['seconds'] += time.perf_counter() - context._bench_start
+            db_time['statements'] += 1
+
+    engine = get_engine()
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    event.listen(engine, 'after_cursor_execute', after_execute)
+
+    processor = NewsProcessor()
+    processor.analyze_delay = args.analyze_delay
+    processor.ai_service.stream = args.stream
+    fake = FakeBedrockClient(args.bedrock_ms, args.relevant_ratio, 'Economy')
+    processor.ai_service.bedrock_client = fake
+    fetcher = processor.rss_fetcher
+    fetcher.fetch_raw = timer.wrap('fetch', fetcher.fetch_raw)
+    processor.content_extractor._fetch_page = timer.wrap('extract', processor.content_extractor._fetch_page)
+    processor.ai_service.analyze_article = timer.wrap('analyze', processor.ai_service.analyze_article)
+
+    original_submit = parse_pool.submit
+
+    def timed_submit(func, *func_args):
+        start = time.perf_counter()
+        future = original_submit(func, *func_args)
+        future.add_done_callback(lambda f: timer.record(f"pool:{func.__name__}", time.perf_counter() - start))
+        return future
+    parse_pool.submit = timed_submit
+
+    print(f"Benchmarking {args.feeds} feeds x {args.entries} entries "
+          f"(feed latency {args.feed_ms} ms, Bedrock latency {args.bedrock_ms} ms)...")
+    start = time.perf_counter()
+    result = processor.process_feeds()
+    wall = time.perf_counter() - start
+    parse_pool.shutdown()
+    server.stop()
+
+    entries = args.feeds * args.entries
+    rss_self, rss_children = _peak_rss_mb()
+    return {
+        'python': sys.version.split()[0],
+        'config': vars(args),
+        'result': result,
+        'wall_s': round(wall, 3),
+        'entries': entries,
+        'entries_per_s': round(entries / wall, 2) if wall else None,
+        'bedrock_calls': fake.calls,
+        'bedrock_output_tokens': fake.output_tokens,
+        'http_requests': server.requests,
+        'stages': timer.summary(),
+        'db': {'seconds': round(db_time['seconds'], 3), 'statements': db_time['statements']},
+        'peak_rss_mb': {'main': rss_self, 'parse_workers': rss_children},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feeds', type=int, default=20)
+    parser.add_argument('--entries', type=int, default=25, help='entries per feed')
+    parser.add_argument('--feed-ms', type=float, default=50, help='mock server latency per request')
+    parser.add_argument('--bedrock-ms', type=float, default=200, help='stub Bedrock latency per call')
+    parser.add_argument('--description-chars', type=int, default=600,
+                        help='description length; below RSS_EXTRACT_MIN_CHARS triggers page extraction')
+    parser.add_argument('--relevant-ratio', type=float, default=0.6, help='share of entries scored as relevant')
+    parser.add_argument('--analyze-delay', type=float, default=0, help='extra sleep before each Bedrock call (production: 0)')
+    parser.add_argument('--stream', action='store_true', help='stream Bedrock answers (RSS_BEDROCK_STREAM)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--min-eps', type=float, help='fail if entries/sec is below this')
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+
+    print(f"\nResult: {results['result']}")
+    print(f"Wall time: {results['wall_s']} s  ({results['entries_per_s']} entries/s)")
+    print(f"Bedrock: {results['bedrock_calls']} calls, {results['bedrock_output_tokens']} output tokens generated")
+    print(f"DB time: {results['db']['seconds']} s over {results['db']['statements']} statements")
+    print(f"Peak RSS: {results['peak_rss_mb']['main']} MB main, {results['peak_rss_mb']['parse_workers']} MB parse workers")
+    print(f"\n{'stage':<24} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'total s':>9}")
+    for stage, stats in results['stages'].items():
+        print(f"{stage:<24} {stats['count']:>6} {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['total_s']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+    if args.min_eps and results['entries_per_s'] < args.min_eps:
+        print(f"BELOW FLOOR: {results['entries_per_s']} entries/s < {args.min_eps}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
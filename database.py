@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
-from sqlalchemy.orm import sessionmaker, relationship, DeclarativeBase
+import os
+import threading
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, LargeBinary
+from sqlalchemy.orm import sessionmaker, relationship, DeclarativeBase, Session
 from datetime import datetime, timezone
+from metrics import DB_COMMIT_SECONDS
 
 class Base(DeclarativeBase):
     pass
@@ -58,10 +61,154 @@ class SystemConfig(Base):
     value = Column(Text)
     description = Column(Text)
 
+class ArticleStat(Base):
+    """Aggregate article counts, refreshed at the end of each ingest run."""
+    __tablename__ = 'article_stats'
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(20), nullable=False)  # total, category, feed, day
+    key = Column(String(100), nullable=False)
+    label = Column(String(100))
+    article_count = Column(Integer, default=0)
+    avg_score = Column(Float)
+    latest_created_at = Column(DateTime)
+    refreshed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class JobRecord(Base):
+    """Persisted snapshot of a background job so any web worker can report on it"""
+    __tablename__ = 'jobs'
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False)  # running, completed, failed, cancelled
+    stage = Column(String(100))
+    counts = Column(JSON)
+    progress = Column(Float, default=0.0)
+    result = Column(Text)
+    cancel_requested = Column(Boolean, default=False)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class HighWaterMark(Base):
+    """Last article emitted to an incremental consumer (exports, digests)"""
+    __tablename__ = 'high_water_marks'
+    name = Column(String(200), primary_key=True)
+    last_created_at = Column(DateTime)
+    last_article_id = Column(Integer)
+    updated_at = Column(DateTime)
+
+class PendingEntry(Base):
+    """Feed entry fetched but not yet analyzed (the analyze queue)"""
+    __tablename__ = 'pending_entries'
+    id = Column(Integer, primary_key=True)
+    url = Column(String(1000), nullable=False, unique=True)
+    title = Column(String(500), nullable=False)
+    author = Column(String(200))
+    content = Column(Text)
+    feed_id = Column(Integer, ForeignKey('feeds.id'))
+    published_date = Column(DateTime)
+    status = Column(String(20), default='pending')  # pending, rejected
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ExtractedPage(Base):
+    """Main text scraped from an article page, reused while fresh or unchanged (ETag)"""
+    __tablename__ = 'extracted_pages'
+    url = Column(String(1000), primary_key=True)
+    etag = Column(String(200))
+    last_modified = Column(String(100))
+    text = Column(Text)
+    fetched_at = Column(DateTime)
+
+class WorkerLease(Base):
+    """Heartbeat row of a running ingest worker (see sharding.py)"""
+    __tablename__ = 'worker_leases'
+    worker_id = Column(String(100), primary_key=True)
+    hostname = Column(String(255))
+    pid = Column(Integer)
+    shard_size = Column(Integer, default=0)  # feeds owned at the last rebalance
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+
+class ProcessingRun(Base):
+    """Timing, volume and Bedrock spend of one ingest run (see run_history.py)"""
+    __tablename__ = 'processing_runs'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # full, fetch, analyze, worker
+    status = Column(String(20), nullable=False)  # completed, failed, cancelled
+    result = Column(Text)
+    started_at = Column(DateTime, index=True)
+    finished_at = Column(DateTime)
+    duration_seconds = Column(Float)
+    active_feeds = Column(Integer)
+    active_categories = Column(Integer)
+    entries_fetched = Column(Integer, default=0)
+    entries_queued = Column(Integer, default=0)
+    entries_analyzed = Column(Integer, default=0)
+    articles_saved = Column(Integer, default=0)
+    bedrock_calls = Column(Integer, default=0)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    estimated_cost = Column(Float, default=0.0)  # USD
+    cache_hits = Column(Integer, default=0)  # extracted pages served from extracted_pages
+    failures = Column(Integer, default=0)  # feed, extraction and analysis failures
+    stage_seconds = Column(JSON)  # {stage: wall seconds}
+    feed_stats = Column(JSON)  # {feed_id: {name, seconds, entries, queued, error}}
+    counts = Column(JSON)  # every progress counter of the run
+
+class RunArtifact(Base):
+    """File attached to a processing run, e.g. a CPU profile or memory report (see profiling.py)"""
+    __tablename__ = 'run_artifacts'
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey('processing_runs.id'), index=True, nullable=False)
+    name = Column(String(100), nullable=False)
+    content_type = Column(String(100))
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 # Database setup
-engine = create_engine('sqlite:///news.db', connect_args={'check_same_thread': False})
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine)
+# The engine is created on first use so that importing this module (from
+# CLI scripts, tests or the web app) does not open files or run DDL.
+_engine = None
+_engine_lock = threading.Lock()
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer; several workers may share one file
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))}")
+    cursor.close()
+
+def get_engine():
+    """Return the shared engine, creating it and the schema on first call"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = os.getenv('DATABASE_URL', 'sqlite:///news.db')
+                connect_args = {'check_same_thread': False} if url.startswith('sqlite') else {}
+                engine = create_engine(url, connect_args=connect_args)
+                if url.startswith('sqlite'):
+                    event.listen(engine, 'connect', _sqlite_pragmas)
+                Base.metadata.create_all(engine)
+                _engine = engine
+    return _engine
+
+class LazySession(Session):
+    """Session that resolves its bind to the lazily created engine"""
+    def get_bind(self, mapper=None, **kwargs):
+        return get_engine()
+
+    def commit(self):
+        with DB_COMMIT_SECONDS.time():
+            super().commit()
+
+SessionLocal = sessionmaker(class_=LazySession)
+
+def __getattr__(name):
+    # Backwards compatible access to ``database.engine``
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_db():
     db = SessionLocal()
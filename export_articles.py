@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Export articles to JSONL, CSV or Parquet for analytics.
+
+Examples:
+    python export_articles.py jsonl
+    python export_articles.py parquet --incremental          # nightly: only new rows
+    python export_articles.py csv --start-date 2025-12-01 --end-date 2025-12-31
+"""
+
+import argparse
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from exporters import ArticleExporter, WRITERS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('format', choices=sorted(WRITERS))
+    parser.add_argument('--output', help='output file (default: exports/articles_<timestamp>.<ext>)')
+    parser.add_argument('--incremental', action='store_true', help='only export rows added since the last incremental run')
+    parser.add_argument('--name', help='high-water mark name for incremental exports (default: the format)')
+    parser.add_argument('--start-date', help='YYYY-MM-DD, filters on published date')
+    parser.add_argument('--end-date', help='YYYY-MM-DD, filters on published date')
+    parser.add_argument('--include-content', action='store_true', help='include the raw article content column')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    path, count = ArticleExporter().export(
+        args.format,
+        path=args.output,
+        incremental=args.incremental,
+        name=args.name,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        include_content=args.include_content
+    )
+    if path:
+        print(f"Exported {count} articles to {path}")
+    else:
+        print("No new articles to export")
+
+if __name__ == "__main__":
+    main()
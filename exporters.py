@@ -0,0 +1,138 @@
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import select, and_
+from database import SessionLocal, Article, Feed
+from watermarks import load_watermark, after_watermark, save_watermark
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    'id', 'title', 'url', 'author', 'summary', 'category_name', 'relevancy_score',
+    'user_feedback', 'feed_id', 'feed_name', 'published_date', 'created_at'
+]
+
+EXPORT_EXTENSIONS = {'jsonl': 'jsonl', 'csv': 'csv', 'parquet': 'parquet'}
+
+class JsonlWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_batch(self, rows):
+        self.file.write(''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in rows))
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Writes one Parquet row group per batch; requires the optional pyarrow package"""
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        types = {
+            'id': pa.int64(), 'relevancy_score': pa.int32(), 'user_feedback': pa.int32(), 'feed_id': pa.int64(),
+            'published_date': pa.timestamp('us'), 'created_at': pa.timestamp('us'),
+        }
+        self.pa = pa
+        self.schema = pa.schema([(name, types.get(name, pa.string())) for name in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write_batch(self, rows):
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self.writer.write_table(table, row_group_size=len(rows))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+class ArticleExporter:
+    """Streams article rows to JSONL, CSV or Parquet in constant memory.
+
+    Rows are read with a server-side cursor (yield_per) as plain tuples and
+    written in batches. With incremental=True only rows after the export's
+    high-water mark are written, and the mark advances once the file is
+    complete. Files go to exports/ rather than output/: the report
+    retention in output_generators.prune_output_dir would delete them
+    after the mark had already moved past their rows.
+    """
+    batch_size = 5000
+
+    def __init__(self, output_dir="exports"):
+        self.output_dir = output_dir
+
+    def _statement(self, columns, start_date=None, end_date=None):
+        fields = [Feed.name.label('feed_name') if name == 'feed_name' else getattr(Article, name) for name in columns]
+        stmt = select(*fields).select_from(Article).outerjoin(Feed, Feed.id == Article.feed_id)
+        if start_date and end_date:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+            stmt = stmt.where(and_(Article.published_date >= start_dt, Article.published_date <= end_dt))
+        return stmt
+
+    def export(self, fmt, path=None, incremental=False, name=None, start_date=None, end_date=None,
+               include_content=False):
+        """Write an export file and return (path, row_count)"""
+        if fmt not in WRITERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        columns = EXPORT_COLUMNS + (['content'] if include_content else [])
+        mark_name = f"export:{name or fmt}"
+        if path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_EXTENSIONS[fmt]}")
+
+        db = SessionLocal()
+        try:
+            stmt = self._statement(columns, start_date, end_date)
+            if incremental:
+                stmt = after_watermark(stmt, load_watermark(db, mark_name))
+            else:
+                stmt = stmt.order_by(Article.created_at.asc(), Article.id.asc())
+
+            # Write to a temp file so a failed or empty run never clobbers a finished export
+            tmp_path = f"{path}.tmp"
+            writer = WRITERS[fmt](tmp_path, columns)
+            count = 0
+            last = None
+            try:
+                result = db.execute(stmt.execution_options(yield_per=self.batch_size))
+                for partition in result.partitions():
+                    rows = [dict(zip(columns, row)) for row in partition]
+                    writer.write_batch(rows)
+                    count += len(rows)
+                    last = rows[-1]
+            except Exception:
+                writer.close()
+                os.remove(tmp_path)
+                raise
+            writer.close()
+
+            if incremental and last is None:
+                # Nothing new since the last run
+                os.remove(tmp_path)
+                return None, 0
+            os.replace(tmp_path, path)
+            if incremental:
+                save_watermark(db, mark_name, last['created_at'], last['id'])
+                db.commit()
+            logger.info(f"Exported {count} articles to {path}")
+            return path, count
+        finally:
+            db.close()
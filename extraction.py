@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from database import SessionLocal, ExtractedPage
+from feed_parsing import extract_main_text, parse_pool
+from metrics import PAGES_EXTRACTED
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def text_length(content):
+    """Length of content with HTML tags removed (cheap, no parser)"""
+    return len(' '.join(_TAG_RE.sub(' ', content or '').split()))
+
+class ContentExtractor:
+    """Replaces short feed descriptions with the main text of the linked page.
+
+    Pages are fetched concurrently on the fetcher's pooled session, at most
+    RSS_EXTRACT_PER_HOST at a time per host, and parsed in the process pool.
+    Results are cached in extracted_pages: a page fetched within
+    RSS_EXTRACT_CACHE_HOURS is not requested again, and an older one is
+    revalidated with its ETag / Last-Modified (its text is still used if
+    that request fails). Pages are fetched batch_size at a time and a
+    cancelled job stops before the next batch.
+    """
+    batch_size = 50
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self.enabled = os.getenv('RSS_EXTRACT_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+        self.min_chars = int(os.getenv('RSS_EXTRACT_MIN_CHARS', '500'))
+        self.workers = int(os.getenv('RSS_EXTRACT_WORKERS', '8'))
+        self.per_host = int(os.getenv('RSS_EXTRACT_PER_HOST', '2'))
+        self.cache_ttl = timedelta(hours=float(os.getenv('RSS_EXTRACT_CACHE_HOURS', '24')))
+        self.archive = None  # archive.FetchArchive when recording or replaying
+        self._host_limits = defaultdict(lambda: threading.Semaphore(self.per_host))
+        self._host_lock = threading.Lock()
+
+    def needs_extraction(self, content):
+        return self.enabled and text_length(content) < self.min_chars
+
+    def _host_limit(self, url):
+        with self._host_lock:
+            return self._host_limits[urlparse(url).netloc]
+
+    def _fetch_page(self, url, cached):
+        """Return (text, etag, last_modified, changed) for one page"""
+        if self.archive is not None and self.archive.replaying:
+            html = self.archive.load('page', url).decode('utf-8')
+            return parse_pool.submit(extract_main_text, html).result(), None, None, True
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        with self._host_limit(url):
+            response = self.fetcher.session.get(url, headers=headers, timeout=self.fetcher.timeout)
+        if response.status_code == 304 and cached is not None:
+            return cached['text'], cached['etag'], cached['last_modified'], False
+        response.raise_for_status()
+        if 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return '', None, None, True
+        if self.archive is not None:
+            self.archive.store('page', url, response.text.encode('utf-8'))
+        text = parse_pool.submit(extract_main_text, response.text).result()
+        return text, response.headers.get('ETag'), response.headers.get('Last-Modified'), True
+
+    def extract(self, urls, progress=None):
+        """Return {url: main text} for the given article URLs (missing on failure).
+
+        progress, if given, counts cache_hits, pages_fetched and extract_failures;
+        once it is cancelled, pages not yet fetched are left out.
+        """
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if not urls:
+            return {}
+        now = datetime.now(timezone.utc)
+        cached = {}
+        # Recording and replay bypass the cache so every page used is in the archive
+        if self.archive is None:
+            db = SessionLocal()
+            try:
+                for row in db.query(ExtractedPage).filter(ExtractedPage.url.in_(urls)):
+                    cached[row.url] = dict(text=row.text, etag=row.etag, last_modified=row.last_modified,
+                                           fetched_at=row.fetched_at.replace(tzinfo=timezone.utc) if row.fetched_at else None)
+            finally:
+                db.close()
+
+        results = {url: entry['text'] for url, entry in cached.items()
+                   if entry['fetched_at'] and now - entry['fetched_at'] < self.cache_ttl}
+        to_fetch = [url for url in urls if url not in results]
+        PAGES_EXTRACTED.labels('cache').inc(len(results))
+        if progress is not None:
+            progress.incr('cache_hits', len(results))
+        if not to_fetch:
+            return results
+
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='rss-extract') as executor:
+            for start in range(0, len(to_fetch), self.batch_size):
+                if progress is not None and progress.is_cancelled():
+                    logger.info(f"Extraction cancelled with {len(to_fetch) - start} pages left")
+                    break
+                batch = to_fetch[start:start + self.batch_size]
+                futures = {url: executor.submit(self._fetch_page, url, cached.get(url)) for url in batch}
+                for url, future in futures.items():
+                    try:
+                        fetched[url] = future.result()
+                    except Exception as e:
+                        logger.warning(f"Could not extract {url}: {e}")
+                        if progress is not None:
+                            progress.incr('extract_failures')
+                        if url in cached:
+                            # Stale text beats none; fetched_at is left alone so the next run retries
+                            results[url] = cached[url]['text']
+                            PAGES_EXTRACTED.labels('stale').inc()
+        if progress is not None:
+            progress.incr('pages_fetched', len(fetched))
+
+        db = SessionLocal()
+        try:
+            for url, (text, etag, last_modified, changed) in fetched.items():
+                PAGES_EXTRACTED.labels('fetched' if changed else 'not_modified').inc()
+                page = db.get(ExtractedPage, url) or ExtractedPage(url=url)
+                page.text = text
+                page.etag = etag
+                page.last_modified = last_modified
+                page.fetched_at = now
+                db.add(page)
+                results[url] = text
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error caching extracted pages: {e}")
+        finally:
+            db.close()
+        logger.info(f"Extracted {len(fetched)} pages ({len(urls) - len(to_fetch)} from cache)")
+        return results
+
+    def enrich(self, entries, progress=None):
+        """Swap in page text for entries whose content is shorter than the threshold.
+
+        entries are objects with url and content attributes (PendingEntry);
+        returns the number of entries whose content was replaced.
+        """
+        short = [entry for entry in entries if self.needs_extraction(entry.content)]
+        if not short:
+            return 0
+        texts = self.extract((entry.url for entry in short), progress)
+        replaced = 0
+        for entry in short:
+            text = texts.get(entry.url)
+            if text and len(text) > text_length(entry.content):
+                entry.content = text
+                replaced += 1
+        return replaced
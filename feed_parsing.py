@@ -0,0 +1,158 @@
+"""CPU-bound feed parsing and article text extraction, run in a process pool.
+
+parse_feed() takes the raw bytes of a feed and returns compact EntryRecord
+tuples (plain strings and datetimes), which pickle cheaply back to the
+parent; extract_main_text() likewise takes page HTML and returns text.
+Parsing in worker processes keeps feedparser's pure-Python work off the
+GIL shared with the fetch threads and the web app.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+EntryRecord = namedtuple('EntryRecord', ['link', 'title', 'author', 'published', 'content'])
+
+def _entry_author(entry):
+    # Type-safe author extraction
+    if hasattr(entry, 'author'):
+        return str(entry.author)
+    elif 'authors' in entry and entry.authors:
+        return str(entry.authors[0].get('name', ''))
+    elif 'dc_creator' in entry:
+        return str(entry.dc_creator)
+    elif 'author_detail' in entry and hasattr(entry.author_detail, 'name'):
+        return str(entry.author_detail.name)
+    return ''
+
+def _entry_published(entry):
+    published_date = datetime.now()
+    if hasattr(entry, 'published_parsed') and entry.published_parsed:
+        try:
+            published_date = datetime(*entry.published_parsed[:6])
+        except:
+            pass
+    return published_date
+
+def parse_feed(raw, base_url=None):
+    """Parse raw feed bytes into a list of EntryRecord"""
+    import feedparser
+    feed = feedparser.parse(raw, response_headers={'content-location': base_url} if base_url else None)
+    return [
+        EntryRecord(
+            link=getattr(entry, 'link', ''),
+            title=getattr(entry, 'title', 'Untitled'),
+            author=_entry_author(entry),
+            published=_entry_published(entry),
+            content=getattr(entry, 'description', '') or getattr(entry, 'summary', '')
+        )
+        for entry in feed.entries
+    ]
+
+# Elements that never hold article body text
+_BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'figure', 'iframe', 'svg']
+
+_BLOCK_TAGS = ['p', 'br', 'div', 'li', 'tr', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+def _html_parser():
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+def extract_main_text(html, min_paragraph_chars=40):
+    """Return the main text of an article page as newline-separated paragraphs.
+
+    Uses <article> or <main> when present, otherwise the element whose
+    direct <p> children hold the most text.
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, _html_parser())
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+
+    root = soup.find('article') or soup.find('main')
+    if root is None:
+        best_len = 0
+        for candidate in soup.find_all(['div', 'section', 'body']):
+            length = sum(len(p.get_text()) for p in candidate.find_all('p', recursive=False))
+            if length > best_len:
+                root, best_len = candidate, length
+    if root is None:
+        return ''
+
+    paragraphs = (' '.join(p.get_text(' ').split()) for p in root.find_all('p'))
+    return '\n'.join(text for text in paragraphs if len(text) >= min_paragraph_chars)
+
+def html_to_text(html):
+    """Visible text of an HTML fragment (a feed description), one line per block"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, _html_parser())
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup(_BLOCK_TAGS):
+        tag.insert_before('\n')
+    lines = (' '.join(line.split()) for line in soup.get_text().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+class ParsePool:
+    """Lazily started process pool for parse_feed.
+
+    RSS_PARSE_WORKERS sets the number of processes (default: CPU count);
+    0 parses in the calling process, which is also the fallback when a
+    pool cannot be started. Workers come from a forkserver (spawn where
+    that is unavailable), never a plain fork: the web and scheduler
+    processes run many threads, and a forked child could inherit a lock
+    one of them held (logging, the SQLAlchemy pool, ssl) and hang on it.
+    Submitted functions must therefore be module-level and their arguments
+    picklable.
+    """
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = int(os.getenv('RSS_PARSE_WORKERS', str(os.cpu_count() or 1)))
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            with self._lock:
+                if self._executor is None:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, func, *args):
+        """Run func(*args) in the pool; returns a Future"""
+        executor = self._get_executor()
+        if executor is not None:
+            try:
+                return executor.submit(func, *args)
+            except RuntimeError as e:  # pool broken or shut down
+                logger.warning(f"Parse pool unavailable, parsing inline: {e}")
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def parse(self, raw, base_url=None):
+        return self.submit(parse_feed, raw, base_url).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+parse_pool = ParsePool()
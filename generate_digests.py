@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Generate per-category and per-feed digests from one scan of the articles.
+
+Examples:
+    python generate_digests.py                                  # HTML digest per category
+    python generate_digests.py --by category feed --format html markdown --max-articles 10
+"""
+
+import argparse
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from output_generators import OutputGenerator, REPORT_FORMATS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--by', nargs='+', choices=['category', 'feed'], default=['category'])
+    parser.add_argument('--format', nargs='+', choices=sorted(REPORT_FORMATS), default=['html'])
+    parser.add_argument('--max-articles', type=int, default=25, help='cap on articles per digest')
+    parser.add_argument('--start-date', help='YYYY-MM-DD, filters on published date')
+    parser.add_argument('--end-date', help='YYYY-MM-DD, filters on published date')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    digests = OutputGenerator().generate_digests(
+        group_by=tuple(args.by),
+        formats=tuple(args.format),
+        max_articles=args.max_articles,
+        start_date=args.start_date,
+        end_date=args.end_date
+    )
+    for (group, key), paths in sorted(digests.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        print(f"{group} {key}: {', '.join(paths.values())}")
+
+if __name__ == "__main__":
+    main()
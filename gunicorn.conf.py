@@ -0,0 +1,18 @@
+"""Gunicorn settings for the RSS Summarizer web tier.
+
+Each worker calls create_app(); the scheduler lock makes sure only one of
+them runs scheduled jobs, so workers can be scaled freely.
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+accesslog = '-'
+
+# The app must be loaded after fork so the scheduler thread lives in a worker,
+# never in the master process.
+preload_app = False
@@ -0,0 +1,327 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import DateTime, exists, insert, literal, select, update
+from database import SessionLocal, JobRecord
+
+logger = logging.getLogger(__name__)
+
+# A running job that has not written a snapshot for this long is assumed dead
+STALE_AFTER = timedelta(minutes=10)
+# Running jobs write a snapshot at least this often, even when a stage reports no progress
+HEARTBEAT_SECONDS = 30
+# Articles kept in Job.previews, newest last
+PREVIEW_LIMIT = 5
+
+class Job:
+    """Live state of a background run, also used as the progress sink for NewsProcessor"""
+    COUNTERS = ('fetched', 'skipped', 'analyzed', 'saved')
+
+    def __init__(self, kind, flush_interval=2.0):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'running'
+        self.stage = 'queued'
+        self.counts = {name: 0 for name in self.COUNTERS}
+        self.total_feeds = 0
+        self.feeds_done = 0
+        self.total_items = 0
+        self.items_done = 0
+        self.result = None
+        self.previews = OrderedDict()  # title -> fields streamed so far (in memory only)
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._last_flush = 0.0
+        self._heartbeat = None
+
+    # Progress interface (see services.NullProgress)
+    def set_stage(self, stage):
+        self.stage = stage
+        self._maybe_flush(force=True)
+
+    def set_total_feeds(self, total):
+        self.total_feeds = total
+        self._maybe_flush()
+
+    def feed_done(self):
+        self.feeds_done += 1
+        self._maybe_flush()
+
+    def record_feed(self, feed, seconds, entries, queued, error=None):
+        pass  # per-feed numbers go to processing_runs (run_history.RunRecorder)
+
+    def set_total_items(self, total):
+        self.total_items = total
+        self._maybe_flush()
+
+    def item_done(self):
+        self.items_done += 1
+        self._maybe_flush()
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self.counts[counter] = self.counts.get(counter, 0) + amount
+        self._maybe_flush()
+
+    def preview(self, title, fields):
+        """Merge an article's analysis fields (category, score, bullets, status) into the live view"""
+        with self._lock:
+            item = self.previews.pop(title, None) or {'title': title}
+            item.update(fields)
+            self.previews[title] = item
+            while len(self.previews) > PREVIEW_LIMIT:
+                self.previews.popitem(last=False)
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def progress(self):
+        if self.status != 'running':
+            return 1.0
+        # Feeds (fetch stage) and queued entries (analyze stage) weigh the same
+        total = self.total_feeds + self.total_items
+        if not total:
+            return 0.0
+        return min((self.feeds_done + self.items_done) / total, 1.0)
+
+    def to_dict(self):
+        job = _job_dict(self.id, self.kind, self.status, self.stage, dict(self.counts), self.progress,
+                        self.started_at, self.finished_at, self.result, self.is_cancelled())
+        # Only the process running the job has previews; snapshots from the jobs table leave the key out
+        with self._lock:
+            job['previews'] = [dict(item) for item in reversed(self.previews.values())]
+        return job
+
+    def start_heartbeat(self, interval=HEARTBEAT_SECONDS):
+        """Flush every interval seconds until stop_heartbeat, so a long silent stage never looks stale"""
+        self._heartbeat_stop = threading.Event()
+        def beat():
+            while not self._heartbeat_stop.wait(interval):
+                self.flush()
+        self._heartbeat = threading.Thread(target=beat, name=f"job-{self.id}-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def _maybe_flush(self, force=False):
+        now = time.monotonic()
+        if force or now - self._last_flush >= self._flush_interval:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self):
+        """Write a snapshot to the jobs table and pick up cancel requests from other workers.
+
+        cancel_requested is only ever set here, never cleared, so a cancel
+        committed by another worker between our read and write survives.
+        """
+        values = dict(status=self.status, stage=self.stage, counts=dict(self.counts), progress=self.progress,
+                      result=self.result, updated_at=datetime.now(timezone.utc), finished_at=self.finished_at)
+        if self.is_cancelled():
+            values['cancel_requested'] = True
+        db = SessionLocal()
+        try:
+            updated = db.execute(update(JobRecord).where(JobRecord.id == self.id).values(**values)).rowcount
+            if not updated:
+                db.add(JobRecord(id=self.id, kind=self.kind, started_at=self.started_at, **values))
+            elif db.execute(select(JobRecord.cancel_requested).where(JobRecord.id == self.id)).scalar():
+                self._cancel.set()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving job {self.id}: {e}")
+        finally:
+            db.close()
+
+    def claim(self, conflicts=None):
+        """Insert this job's row unless a conflicting job is running; True if it was inserted.
+
+        The check and the insert are one INSERT ... SELECT ... WHERE NOT
+        EXISTS statement, so two workers submitting at once cannot both
+        pass (SQLite runs one writer at a time).
+        """
+        now = datetime.now(timezone.utc)
+        running = select(JobRecord.id).where(JobRecord.status == 'running', JobRecord.updated_at >= now - STALE_AFTER)
+        if conflicts is not None:
+            running = running.where(JobRecord.kind.in_(conflicts))
+        row = select(literal(self.id), literal(self.kind), literal(self.status), literal(self.stage),
+                     literal(0.0), literal(False), literal(self.started_at, DateTime), literal(now, DateTime))
+        stmt = insert(JobRecord).from_select(
+            ['id', 'kind', 'status', 'stage', 'progress', 'cancel_requested', 'started_at', 'updated_at'],
+            row.where(~exists(running)))
+        db = SessionLocal()
+        try:
+            claimed = db.execute(stmt).rowcount == 1
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+def _job_dict(job_id, kind, status, stage, counts, progress, started_at, finished_at, result, cancel_requested):
+    end = finished_at or datetime.now(timezone.utc)
+    elapsed = (end - started_at).total_seconds() if started_at else 0
+    eta = None
+    if status == 'running' and progress > 0:
+        eta = round(elapsed * (1 - progress) / progress, 1)
+    return {
+        'id': job_id,
+        'kind': kind,
+        'status': status,
+        'stage': stage,
+        'counts': counts,
+        'progress': round(progress, 3),
+        'elapsed_seconds': round(elapsed, 1),
+        'eta_seconds': eta,
+        'result': result,
+        'cancel_requested': cancel_requested,
+    }
+
+def _record_to_dict(record):
+    # SQLite returns naive datetimes; they were stored as UTC
+    started_at = record.started_at.replace(tzinfo=timezone.utc) if record.started_at else None
+    finished_at = record.finished_at.replace(tzinfo=timezone.utc) if record.finished_at else None
+    return _job_dict(record.id, record.kind, record.status, record.stage, record.counts or {},
+                     record.progress or 0.0, started_at, finished_at, record.result,
+                     bool(record.cancel_requested))
+
+class JobManager:
+    """Runs NewsProcessor work as observable, cancellable background jobs"""
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, conflicts=None):
+        """Start func(progress=job) on a background thread.
+
+        Returns (job_id, started). When a conflicting job is already running,
+        in this process or in another worker, its id is returned with
+        started=False. conflicts lists the job kinds that block this one;
+        None means any running job does.
+        """
+        with self._lock:
+            job, running = self._claim(kind, conflicts)
+            if job is None:
+                return running, False
+            # Finished jobs are served from the jobs table from here on
+            self._jobs = {job_id: job for job_id, job in self._jobs.items() if job.status == 'running'}
+            self._jobs[job.id] = job
+        thread = threading.Thread(target=self._run, args=(job, func), daemon=True)
+        thread.start()
+        return job.id, True
+
+    def run(self, kind, func, conflicts=None):
+        """Run func(progress=job) on the calling thread (used by the scheduler)"""
+        with self._lock:
+            job, running = self._claim(kind, conflicts)
+            if job is None:
+                logger.info(f"Skipping {kind}: job {running} is still running")
+                return "Already processing"
+            self._jobs[job.id] = job
+        return self._run(job, func)
+
+    def _claim(self, kind, conflicts):
+        """(new Job holding its row in the jobs table, None) or (None, id of the job that blocks it)"""
+        running = self._running_here(conflicts)
+        if running:
+            return None, running
+        job = Job(kind)
+        if job.claim(conflicts):
+            return job, None
+        # Lost to a job in another worker, which may even have finished by now
+        return None, self.find_running(conflicts)
+
+    def _run(self, job, func):
+        logger.info(f"Job {job.id} ({job.kind}) started")
+        job.start_heartbeat()
+        try:
+            job.result = func(progress=job)
+            job.status = 'cancelled' if job.is_cancelled() else 'completed'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.result = f"Error: {e}"
+            job.status = 'failed'
+        finally:
+            job.stop_heartbeat()
+            job.finished_at = datetime.now(timezone.utc)
+            job.stage = 'done'
+            job.flush()
+        logger.info(f"Job {job.id} finished: {job.status} - {job.result}")
+        return job.result
+
+    def _running_here(self, kinds=None):
+        for job in self._jobs.values():
+            if job.status == 'running' and (kinds is None or job.kind in kinds):
+                return job.id
+        return None
+
+    def find_running(self, kinds=None):
+        """Id of a running job (of one of kinds, if given) in this or another process"""
+        running = self._running_here(kinds)
+        if running:
+            return running
+        db = SessionLocal()
+        try:
+            cutoff = datetime.now(timezone.utc) - STALE_AFTER
+            query = db.query(JobRecord).filter(
+                JobRecord.status == 'running',
+                JobRecord.updated_at >= cutoff
+            )
+            if kinds is not None:
+                query = query.filter(JobRecord.kind.in_(kinds))
+            record = query.order_by(JobRecord.started_at.desc()).first()
+            return record.id if record else None
+        finally:
+            db.close()
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        db = SessionLocal()
+        try:
+            record = db.get(JobRecord, job_id)
+            return _record_to_dict(record) if record else None
+        finally:
+            db.close()
+
+    def cancel(self, job_id):
+        """Request cancellation; the running worker stops at the next entry boundary"""
+        job = self._jobs.get(job_id)
+        if job:
+            job.cancel()
+            job.flush()
+            return True
+        db = SessionLocal()
+        try:
+            record = db.get(JobRecord, job_id)
+            if record is None or record.status != 'running':
+                return False
+            record.cancel_requested = True
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def recent(self, limit=10):
+        db = SessionLocal()
+        try:
+            records = db.query(JobRecord).order_by(JobRecord.started_at.desc()).limit(limit).all()
+            return [_record_to_dict(record) for record in records]
+        finally:
+            db.close()
+
+job_manager = JobManager()
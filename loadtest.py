@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Load test for the dashboard, JSON endpoints and report downloads.
+
+Seeds a temporary database with a realistic number of articles, serves
+the app from a threaded WSGI server in this process (or targets --url),
+and drives a weighted mix of requests from --concurrency client threads.
+With --ingest, process_feeds runs in a loop at the same time against the
+mock feed server and stub Bedrock client from bench_ingest.py, so the
+numbers include contention with a live ingest.
+
+Reports throughput, p50/p90/p99 latency and error rate per endpoint.
+
+Usage:
+    python loadtest.py
+    python loadtest.py --articles 100000 --concurrency 32 --duration 60 --ingest
+    python loadtest.py --mix dashboard=80,rate=20 --json loadtest.json
+    python loadtest.py --url http://localhost:5000 --max-article-id 5000
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# Weighted request mix: name -> (method, path builder, json body builder)
+ENDPOINTS = {
+    'dashboard': ('GET', lambda rng, max_id: '/', None),
+    'rate': ('POST', lambda rng, max_id: f"/rate_article/{rng.randint(1, max_id)}",
+             lambda rng: {'feedback': rng.choice([1, -1, 0])}),
+    'summary': ('POST', lambda rng, max_id: f"/update_summary/{rng.randint(1, max_id)}",
+                lambda rng: {'summary': f"• Edited during load test {rng.random():.6f}"}),
+    'report_html': ('GET', lambda rng, max_id: '/generate_html', None),
+    'report_markdown': ('GET', lambda rng, max_id: '/generate_markdown', None),
+}
+DEFAULT_MIX = 'dashboard=60,rate=20,summary=5,report_html=10,report_markdown=5'
+
+CATEGORIES = [('Monetary Policy', '#007bff'), ('Banking', '#28a745'), ('Labor Market', '#ffc107'),
+              ('Inflation', '#dc3545'), ('Regulation', '#6f42c1')]
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def seed_database(articles, feeds=20, batch=5000):
+    """Insert synthetic feeds, categories and articles spread over the last day"""
+    from sqlalchemy import insert
+    from database import SessionLocal, Article, Feed, Category
+    from stats import refresh_article_stats
+
+    db = SessionLocal()
+    try:
+        db.add_all(Category(name=name, color=color, active=True) for name, color in CATEGORIES)
+        db.add_all(Feed(name=f"Load feed {n}", url=f"http://127.0.0.1:9/feed/{n}.xml", active=False)
+                   for n in range(feeds))
+        db.commit()
+        now = datetime.now(timezone.utc)
+        rng = random.Random(42)
+        for start in range(0, articles, batch):
+            rows = []
+            for i in range(start, min(start + batch, articles)):
+                name, color = CATEGORIES[i % len(CATEGORIES)]
+                created = now - timedelta(seconds=rng.randint(0, 86000))
+                rows.append(dict(
+                    title=f"Synthetic article {i} about {name.lower()}",
+                    url=f"http://example.com/load/{i}",
+                    content='Body text ' * 50,
+                    summary='\n'.join(f"• Bullet {b} for article {i}" for b in range(4)),
+                    author=f"Reporter {i % 37}",
+                    relevancy_score=75 + i % 25,
+                    feed_id=1 + i % feeds,
+                    published_date=created.replace(tzinfo=None),
+                    created_at=created,
+                    category_name=name,
+                    category_color=color,
+                    user_feedback=0,
+                ))
+            db.execute(insert(Article), rows)
+            db.commit()
+        refresh_article_stats(db)
+    finally:
+        db.close()
+
+def start_app_server():
+    from werkzeug.serving import make_server
+    from app import create_app
+    server = make_server('127.0.0.1', 0, create_app(start_scheduler=False), threaded=True)
+    # create_app() logs at INFO; per-request access logs would swamp the results
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def start_ingest(stop, entries_per_cycle, bedrock_ms):
+    """Run process_feeds in a loop against mock feeds that publish new links every cycle"""
+    from bench_ingest import FeedServer, FakeBedrockClient
+    from database import SessionLocal, Feed, Category
+    from services import NewsProcessor
+
+    feeds = 5
+    feed_server = FeedServer(feeds, max(1, entries_per_cycle // feeds), 600, 20)
+    feed_server.start()
+    db = SessionLocal()
+    try:
+        db.add_all(Feed(name=f"Ingest feed {n}", url=f"{feed_server.base_url}/feed/{n}.xml", active=True)
+                   for n in range(feeds))
+        category = db.query(Category).first()
+        category_name = category.name
+        db.commit()
+    finally:
+        db.close()
+
+    processor = NewsProcessor()
+    processor.analyze_delay = 0
+    processor.ai_service.bedrock_client = FakeBedrockClient(bedrock_ms, 0.6, category_name)
+    cycles = []
+
+    def loop():
+        while not stop.is_set():
+            feed_server.generation += 1
+            start = time.perf_counter()
+            processor.process_feeds()
+            cycles.append(time.perf_counter() - start)
+        feed_server.stop()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread, cycles
+
+def run_clients(base_url, mix, concurrency, duration, max_article_id, timeout):
+    import requests
+    from bench_ingest import _latency_summary
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    error_examples = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, body = ENDPOINTS[name]
+            start = time.perf_counter()
+            ok = False
+            try:
+                response = session.request(method, base_url + path(rng, max_article_id),
+                                            json=body(rng) if body else None, timeout=timeout)
+                response.content  # include the body transfer
+                ok = response.status_code < 400
+                problem = None if ok else f"HTTP {response.status_code}"
+            except Exception as e:
+                problem = str(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+                    error_examples.setdefault(name, problem)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    endpoints = {}
+    for name in names:
+        if not samples[name]:
+            continue
+        stats = _latency_summary(samples[name])
+        values = sorted(samples[name])
+        stats['p90_ms'] = round(values[min(len(values) - 1, int(0.9 * len(values)))] * 1000, 2)
+        stats['rps'] = round(len(values) / wall, 2)
+        stats['errors'] = errors[name]
+        stats['error_rate'] = round(errors[name] / len(values), 4)
+        if name in error_examples:
+            stats['first_error'] = error_examples[name]
+        endpoints[name] = stats
+    total = sum(len(values) for values in samples.values())
+    return {
+        'wall_s': round(wall, 2),
+        'requests': total,
+        'rps': round(total / wall, 2) if wall else None,
+        'errors': sum(errors.values()),
+        'endpoints': endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=100000, help='articles to seed')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted endpoints (default {DEFAULT_MIX})")
+    parser.add_argument('--ingest', action='store_true', help='run a simulated ingest loop during the test')
+    parser.add_argument('--ingest-entries', type=int, default=100, help='new entries per ingest cycle')
+    parser.add_argument('--bedrock-ms', type=float, default=100, help='stub Bedrock latency for --ingest')
+    parser.add_argument('--url', help='load an already running server instead (no seeding)')
+    parser.add_argument('--max-article-id', type=int, help='upper bound for article ids (default: --articles)')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+    if args.json:
+        # Relative to where the tool was started, not the temp dir it moves into
+        args.json = os.path.abspath(args.json)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        workdir = tempfile.mkdtemp(prefix='rss_load_')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+        # Reports and their cache go to the temp dir, not ./output
+        os.chdir(workdir)
+        print(f"Seeding {args.articles} articles in {workdir}...")
+        start = time.perf_counter()
+        seed_database(args.articles)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+        server, base_url = start_app_server()
+
+    stop = threading.Event()
+    ingest_thread, cycles = (None, [])
+    if args.ingest:
+        if args.url:
+            parser.error('--ingest needs the in-process server (omit --url)')
+        ingest_thread, cycles = start_ingest(stop, args.ingest_entries, args.bedrock_ms)
+
+    print(f"Driving {base_url} with {args.concurrency} clients for {args.duration:.0f}s"
+          f"{' during ingest' if args.ingest else ''}...")
+    results = run_clients(base_url, args.mix, args.concurrency, args.duration,
+                          args.max_article_id or args.articles, args.timeout)
+    stop.set()
+    if ingest_thread:
+        ingest_thread.join()
+        results['ingest_cycles'] = len(cycles)
+        results['ingest_cycle_s'] = [round(c, 2) for c in cycles]
+    if server:
+        server.shutdown()
+    results['config'] = {key: value for key, value in vars(args).items()}
+
+    print(f"\n{results['requests']} requests in {results['wall_s']}s ({results['rps']} req/s), {results['errors']} errors")
+    print(f"{'endpoint':<18} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, stats in results['endpoints'].items():
+        print(f"{name:<18} {stats['count']:>7} {stats['rps']:>8} {stats['p50_ms']:>9} {stats['p90_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['errors']:>7}")
+    if args.ingest:
+        print(f"Ingest cycles completed: {results['ingest_cycles']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
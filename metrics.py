@@ -0,0 +1,208 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+Counters, gauges and histograms keep their values in plain dicts keyed by
+label values, guarded by one lock per metric, so recording inside the
+ingest loops costs a dict lookup and an addition. /metrics (app.py)
+renders the registry of the process that serves the scrape; with several
+gunicorn workers, scrape each worker or run ingest in one process.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast DB commits through slow Bedrock calls and feed fetches
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Child bound to one set of label values; keep it around in hot loops"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        return _Child(self, tuple(str(value) for value in values))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class _Child:
+    __slots__ = ('metric', 'key')
+
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount=1):
+        self.metric._inc(self.key, amount)
+
+    def set(self, value):
+        self.metric._set(self.key, value)
+
+    def observe(self, value):
+        self.metric._observe(self.key, value)
+
+    def time(self):
+        return self.metric._time(self.key)
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self._inc((), amount)
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value):
+        self._set((), value)
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value):
+        self._observe((), value)
+
+    def time(self):
+        return self._time(())
+
+    def _observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def _time(self, key):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(key, time.perf_counter() - start)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state[0][:], state[1], state[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Ingest
+FEED_FETCH_SECONDS = registry.histogram('rss_feed_fetch_seconds', 'Feed download time', ['feed'])
+FEED_RESPONSES = registry.counter('rss_feed_responses_total', 'Feed fetches by HTTP status', ['status'])
+FEED_BYTES = registry.counter('rss_feed_bytes_total', 'Feed body bytes downloaded', ['feed'])
+ENTRIES_PARSED = registry.counter('rss_entries_parsed_total', 'Feed entries parsed')
+ENTRIES_QUEUED = registry.counter('rss_entries_queued_total', 'Entries added to the analyze queue')
+ENTRIES_SKIPPED = registry.counter('rss_entries_skipped_total', 'Entries skipped, by reason', ['reason'])
+ARTICLES_SAVED = registry.counter('rss_articles_saved_total', 'Relevant articles saved')
+STAGE_SECONDS = registry.histogram('rss_stage_seconds', 'Wall time of ingest stages', ['stage'])
+QUEUE_DEPTH = registry.gauge('rss_queue_depth', 'Rows in the analyze queue, by status', ['status'])
+PAGES_EXTRACTED = registry.counter('rss_pages_extracted_total', 'Article pages extracted, by source', ['source'])
+
+# Bedrock
+BEDROCK_SECONDS = registry.histogram('rss_bedrock_request_seconds', 'Bedrock invoke_model latency')
+BEDROCK_TOKENS = registry.counter('rss_bedrock_tokens_total', 'Bedrock tokens from response usage', ['direction'])
+BEDROCK_ERRORS = registry.counter('rss_bedrock_errors_total', 'Failed Bedrock analyses')
+BEDROCK_RETRIES = registry.counter('rss_bedrock_retries_total', 'Bedrock calls retried, by error class', ['reason'])
+BEDROCK_HEDGES = registry.counter('rss_bedrock_hedges_total', 'Hedged duplicate Bedrock calls', ['outcome'])
+BEDROCK_CONCURRENCY = registry.gauge('rss_bedrock_concurrency_limit', 'Current AIMD limit on concurrent Bedrock calls')
+PROMPT_TOKENS_SAVED = registry.counter('rss_prompt_tokens_saved_total',
+                                       'Estimated tokens saved by prompt compaction (input) and adaptive max_tokens', ['kind'])
+BEDROCK_MAX_TOKENS = registry.gauge('rss_bedrock_max_tokens', 'Current adaptive max_tokens for analysis calls')
+BEDROCK_FIRST_RESULT_SECONDS = registry.histogram('rss_bedrock_first_result_seconds',
+                                                'Time until an analysis relevancy score is known', ['mode'])
+BEDROCK_STREAMS_STOPPED = registry.counter('rss_bedrock_streams_stopped_total',
+                                           'Streamed analyses cut short by a low relevancy score')
+AI_OUTPUT_PARSES = registry.counter('rss_ai_output_parses_total', 'Analysis responses by parse outcome', ['outcome'])
+AI_FOLLOW_UPS = registry.counter('rss_ai_follow_ups_total', 'Fields re-requested after an unusable response', ['field'])
+
+# Storage and web
+DB_COMMIT_SECONDS = registry.histogram('rss_db_commit_seconds', 'Session commit latency')
+HTTP_REQUEST_SECONDS = registry.histogram('rss_http_request_seconds', 'Web request latency', ['endpoint'])
+HTTP_RESPONSES = registry.counter('rss_http_responses_total', 'Web responses by endpoint and status', ['endpoint', 'status'])
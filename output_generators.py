@@ -1,174 +1,431 @@
+import html
+import logging
 import os
-from datetime import datetime, date
-from database import get_db, Article, Category
-from sqlalchemy import and_
+import re
+import time
+from collections import namedtuple
 from datetime import datetime
-from sqlalchemy.orm import joinedload
-from database import SessionLocal, Article, Category
+from functools import lru_cache
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from database import Article, Feed
+from sqlalchemy import and_, func
+from database import SessionLocal
+from watermarks import load_watermark, after_watermark, save_watermark
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'reports')
+
+# format name: (template, file extension)
+REPORT_FORMATS = {
+    'markdown': ('report.md', 'md'),
+    'html': ('report.html', 'html'),
+    'text': ('report.txt', 'txt'),
+}
+
+ReportArticle = namedtuple('ReportArticle', 'title url source author published summary blocks category color')
+
+_environment = None
+
+def get_report_environment():
+    """Jinja environment for report templates; HTML is autoescaped, Markdown and text are not"""
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(['html']),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False
+        )
+    return _environment
+
+@lru_cache(maxsize=None)
+def report_macros(fmt):
+    """Compiled header/article/footer macros for a format, loaded once per process"""
+    template_name, _ = REPORT_FORMATS[fmt]
+    return get_report_environment().get_template(template_name).module
+
+def parse_summary(summary):
+    """Split an AI summary into (kind, text) blocks once, for every format to share"""
+    blocks = []
+    for line in (summary or '').split('\n'):
+        clean_line = line.strip()
+        if clean_line.startswith('**'):
+            blocks.append(('heading', clean_line.replace('**', '').replace(':', '')))
+        elif clean_line.startswith('•'):
+            blocks.append(('bullet', clean_line[1:].strip()))
+        elif clean_line.startswith('> "'):
+            blocks.append(('quote', clean_line[2:-1].strip()))
+        elif clean_line:
+            blocks.append(('paragraph', clean_line))
+    return blocks
+
+def build_report_article(article, feed_names):
+    # Feed titles often arrive with HTML entities; normalize before escaping
+    return ReportArticle(
+        title=html.unescape(article.title or ''),
+        url=article.url,
+        source=feed_names.get(article.feed_id, 'Unknown'),
+        author=html.unescape(article.author or 'Unknown'),
+        published=article.published_date.strftime('%Y-%m-%d %H:%M') if article.published_date else 'Unknown',
+        summary=article.summary,
+        blocks=parse_summary(article.summary),
+        category=article.category_name,
+        color=article.category_color or '#3498db'
+    )
+
+def prune_output_dir(output_dir, max_age_days=None, max_total_mb=None):
+    """Delete report files older than max_age_days, then the oldest until under max_total_mb"""
+    max_age_days = float(max_age_days if max_age_days is not None else os.getenv('REPORT_RETENTION_DAYS', '7'))
+    max_total_mb = float(max_total_mb if max_total_mb is not None else os.getenv('REPORT_RETENTION_MB', '200'))
+
+    files = []
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+    now = time.time()
+    cutoff = now - max_age_days * 86400
+    budget = max_total_mb * 1024 * 1024
+    removed = 0
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in sorted(files):
+        if mtime >= cutoff and total <= budget:
+            break
+        # In-progress cache writes are young, so they are only removed when over budget
+        try:
+            os.remove(path)
+            removed += 1
+            total -= size
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Pruned {removed} files from {output_dir}")
+    return removed
+
+def _slug(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-') or 'untitled'
+
+def _open_for_append(path, footer):
+    """Open a rolling digest for appending, first trimming the footer written by the last run.
+
+    Returns (file, trimmed).
+    """
+    footer_bytes = footer.encode('utf-8')
+    trimmed = False
+    if footer_bytes and os.path.exists(path):
+        with open(path, 'rb+') as raw:
+            end = raw.seek(0, os.SEEK_END)
+            if end >= len(footer_bytes):
+                raw.seek(end - len(footer_bytes))
+                if raw.read() == footer_bytes:
+                    raw.truncate(end - len(footer_bytes))
+                    trimmed = True
+    return open(path, 'a', encoding='utf-8'), trimmed
+
+class _RollingSection:
+    """One run's section of a rolling digest file (one format).
+
+    Nothing is written until the first article arrives, and abort() cuts
+    the file back to how the last run left it, so a run that finds no
+    rows or fails part way never leaves an empty or unterminated section.
+    """
+    def __init__(self, path, macros, meta):
+        self.path = path
+        self.macros = macros
+        self.meta = meta
+        self.footer = str(macros.footer(meta))
+        self.file = None
+    
+    def add(self, view):
+        if self.file is None:
+            self.file, self.trimmed = _open_for_append(self.path, self.footer)
+            self.start = os.path.getsize(self.path)
+            if self.start == 0:
+                self.file.write(str(self.macros.header(self.meta)))
+            self.file.write(str(self.macros.section(self.meta)))
+        self.file.write(str(self.macros.article(view)))
+    
+    def finish(self):
+        if self.file is not None:
+            self.file.write(self.footer)
+            self.file.close()
+    
+    def abort(self):
+        if self.file is None:
+            return
+        self.file.close()
+        if self.start == 0:
+            os.remove(self.path)
+            return
+        with open(self.path, 'rb+') as raw:
+            raw.truncate(self.start)
+            if self.trimmed:
+                raw.seek(self.start)
+                raw.write(self.footer.encode('utf-8'))
+
+class _DigestWriter:
+    """One digest (a file per format), buffered until its last article arrives.
+
+    Files are only opened in close(), so a scan over a thousand feed
+    digests holds one file open at a time instead of one per digest and
+    format.
+    """
+    def __init__(self, paths, macros, meta, max_articles):
+        self.paths = paths
+        self.macros = macros
+        self.meta = meta
+        self.max_articles = max_articles
+        self.count = 0
+        self.closed = False
+        self.chunks = {fmt: [str(macros[fmt].header(meta))] for fmt in paths}
+    
+    @property
+    def full(self):
+        return self.count >= self.max_articles
+    
+    @property
+    def complete(self):
+        """All the articles the header promised have been added"""
+        return self.full or 0 < self.meta['total'] <= self.count
+    
+    def add(self, view):
+        for fmt, chunks in self.chunks.items():
+            chunks.append(str(self.macros[fmt].article(view)))
+        self.count += 1
+    
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        os.makedirs(os.path.dirname(next(iter(self.paths.values()))), exist_ok=True)
+        for fmt, chunks in self.chunks.items():
+            chunks.append(str(self.macros[fmt].footer(self.meta)))
+            with open(self.paths[fmt], 'w', encoding='utf-8') as f:
+                f.writelines(chunks)
+        self.chunks = None
 
 class OutputGenerator:
+    """Renders article reports from the templates in templates/reports.
+
+    Rows are streamed from the date-filtered query with yield_per and each
+    row is rendered into every requested format before moving on, so one
+    pass over the table produces all formats and memory stays flat. The
+    iter_* methods yield text chunks for files or streaming HTTP responses.
+    """
+    batch_size = 500
+
     def __init__(self):
         self.output_dir = "output"
+    
+    def _output_path(self, extension, timestamp=None):
         os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"{self.output_dir}/rss_summary_{timestamp}.{extension}"
     
-
-    def generate_markdown(self, start_date=None, end_date=None):
-        #db = get_db()
+    def _filtered_query(self, db, start_date=None, end_date=None):
+        query = db.query(Article)
+        if start_date and end_date:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+            query = query.filter(and_(
+                Article.published_date >= start_dt,
+                Article.published_date <= end_dt
+            ))
+        return query
+    
+    def _stream_rows(self, query):
+        return query.order_by(Article.relevancy_score.desc(), Article.published_date.desc()).yield_per(self.batch_size)
+    
+    def _query_articles(self, db, start_date=None, end_date=None):
+        """Return (total, rows) for the report, with the date range applied in SQL"""
+        query = self._filtered_query(db, start_date, end_date)
+        return query.count(), self._stream_rows(query)
+    
+    def _feed_names(self, db):
+        return dict(db.query(Feed.id, Feed.name).all())
+    
+    def render(self, formats, start_date=None, end_date=None):
+        """Yield one tuple of chunks (in `formats` order) per header, article and footer"""
+        macros = [report_macros(fmt) for fmt in formats]
         db = SessionLocal()
         try:
-            query = db.query(Article)
-            
-            if start_date and end_date:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-                query = query.filter(and_(
-                    Article.published_date >= start_dt,
-                    Article.published_date <= end_dt
-                ))
-            
-            #articles = query.order_by(Article.published_date.desc()).all()
-
-            
-        
-            articles = db.query(Article).options(joinedload(Article.feed)).order_by(Article.relevancy_score.desc(), Article.published_date.desc()).all()
-
-            
-            content = f"# RSS News Summary\n\n"
-            content += f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-            if start_date and end_date:
-                content += f"Date Range: {start_date} to {end_date}\n\n"
-            content += f"Total Articles: {len(articles)}\n\n"
+            total, articles = self._query_articles(db, start_date, end_date)
+            feed_names = self._feed_names(db)
+            meta = {
+                'title': 'RSS News Summary',
+                'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'start_date': start_date,
+                'end_date': end_date,
+                'total': total
+            }
             
+            yield tuple(str(m.header(meta)) for m in macros)
             for article in articles:
-                content += f"### [{article.title}]({article.url})\n\n"
-                source_name = article.feed.name if article.feed else 'Unknown'
-                content += f"**Source:** {source_name} | **Author:** {article.author or 'Unknown'} | **Published:** {article.published_date.strftime('%Y-%m-%d %H:%M')}\n\n"
-                
-                if article.summary:
-                    content += f"{article.summary}\n\n"
-                
-                if hasattr(article, 'category_name') and article.category_name:
-                    content += f"**Category:** {article.category_name} | [Read More]({article.url})\n\n"
-                
-                content += "---\n\n"
-            
-            filename = f"{self.output_dir}/rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            return filename
+                view = build_report_article(article, feed_names)
+                yield tuple(str(m.article(view)) for m in macros)
+            yield tuple(str(m.footer(meta)) for m in macros)
         finally:
             db.close()
-    
 
-    def generate_html(self, start_date=None, end_date=None):
-        #db = get_db()
+    def iter_report(self, fmt, start_date=None, end_date=None):
+        for (chunk,) in self.render((fmt,), start_date, end_date):
+            yield chunk
+
+    def generate_reports(self, formats=('markdown', 'html'), start_date=None, end_date=None):
+        """Write every format from a single scan of the articles; returns {format: filename}"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filenames = {fmt: self._output_path(REPORT_FORMATS[fmt][1], timestamp) for fmt in formats}
+        files = [open(filenames[fmt], 'w', encoding='utf-8') for fmt in formats]
+        try:
+            for chunks in self.render(formats, start_date, end_date):
+                for f, chunk in zip(files, chunks):
+                    f.write(chunk)
+        finally:
+            for f in files:
+                f.close()
+        prune_output_dir(self.output_dir)
+        return filenames
+
+    def generate_digests(self, group_by=('category',), formats=('html',), max_articles=25,
+                         start_date=None, end_date=None):
+        """Write one digest per category and/or feed from a single scan of the articles.
+
+        Rows arrive in relevancy order and are routed to every digest they
+        belong to, so each digest holds its top `max_articles` articles and
+        N digests cost one table scan. Per-digest totals for the headers
+        come from GROUP BY counts; a digest is written out as soon as it has
+        them all, and the scan stops once every digest is written.
+        Returns {(group, key): {format: filename}}.
+        """
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        digest_dir = os.path.join(self.output_dir, 'digests', timestamp)
+        macros = {fmt: report_macros(fmt) for fmt in formats}
         db = SessionLocal()
+        writers = {}
         try:
-            query = db.query(Article)
-            
-            if start_date and end_date:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-                query = query.filter(and_(
-                    Article.published_date >= start_dt,
-                    Article.published_date <= end_dt
-                ))
+            query = self._filtered_query(db, start_date, end_date)
+            feed_names = self._feed_names(db)
             
-            #articles = query.order_by(Article.published_date.desc()).all()
-    
+            counts = {}
+            if 'category' in group_by:
+                for name, count in query.with_entities(Article.category_name, func.count(Article.id)).group_by(Article.category_name):
+                    key = ('category', name or 'Uncategorized')
+                    counts[key] = counts.get(key, 0) + count
+            if 'feed' in group_by:
+                for feed_id, count in query.with_entities(Article.feed_id, func.count(Article.id)).group_by(Article.feed_id):
+                    counts[('feed', feed_id)] = count
             
-    
-            articles = db.query(Article).options(joinedload(Article.feed)).order_by(Article.relevancy_score.desc(), Article.published_date.desc()).all()
+            remaining = sum(1 for count in counts.values() if count)
+            for article in self._stream_rows(query):
+                if not remaining:
+                    break
+                view = None
+                for group in group_by:
+                    key = (article.category_name or 'Uncategorized') if group == 'category' else article.feed_id
+                    writer = writers.get((group, key))
+                    if writer is None:
+                        label = key if group == 'category' else feed_names.get(key, 'Unknown')
+                        meta = {
+                            'title': f"{label} Digest",
+                            'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                            'start_date': start_date,
+                            'end_date': end_date,
+                            'total': min(counts.get((group, key), 0), max_articles)
+                        }
+                        name = f"category-{_slug(label)}" if group == 'category' else f"feed-{key}-{_slug(label)}"
+                        paths = {fmt: os.path.join(digest_dir, f"{name}.{REPORT_FORMATS[fmt][1]}") for fmt in formats}
+                        writer = writers[(group, key)] = _DigestWriter(paths, macros, meta, max_articles)
+                    if writer.closed:
+                        continue
+                    if view is None:
+                        view = build_report_article(article, feed_names)
+                    writer.add(view)
+                    if writer.complete:
+                        writer.close()
+                        remaining -= 1
+        finally:
+            for writer in writers.values():
+                writer.close()
+            db.close()
+        prune_output_dir(self.output_dir)
+        return {key: writer.paths for key, writer in writers.items()}
 
+    def generate_incremental(self, target='digest', formats=('markdown', 'html'), rolling=True):
+        """Render only articles added since this target's last digest.
+
+        The target's high-water mark (created_at, id) is read from
+        high_water_marks and advanced after the files are written, so each
+        run costs O(new articles); the last RSS_WATERMARK_SETTLE_SECONDS of
+        articles wait for the next run (see after_watermark). With rolling=True new articles are
+        appended as a timestamped section to output/digests/<target>_<YYYYMMDD>.*;
+        the footer is trimmed and rewritten so HTML stays well formed, and a
+        failed run puts the file back as it was (see _RollingSection).
+        Returns {format: filename}, or {} when there is nothing new.
+        """
+        mark_name = f"digest:{target}"
+        now = datetime.now()
+        macros = {fmt: report_macros(fmt) for fmt in formats}
+        db = SessionLocal()
+        try:
+            mark = load_watermark(db, mark_name)
+            query = after_watermark(db.query(Article), mark)
+            new_count = query.order_by(None).count()
+            if not new_count:
+                return {}
+            feed_names = self._feed_names(db)
             
-            html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>RSS News Summary</title>
-    <style>
-        body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 0; line-height: 1.6; color: #333; background-color: #f8f9fa; }}
-        .container {{ max-width: 900px; margin: 0 auto; padding: 40px 20px; background-color: #ffffff; box-shadow: 0 0 20px rgba(0,0,0,0.05); min-height: 100vh; }}
-        .header {{ border-bottom: 2px solid #2c3e50; padding-bottom: 20px; margin-bottom: 40px; text-align: center; }}
-        .header h1 {{ margin: 0; color: #2c3e50; font-size: 2.5em; }}
-        .header p {{ color: #7f8c8d; margin-top: 10px; }}
-        .article {{ background: #ffffff; padding: 30px; margin-bottom: 30px; border: 1px solid #e9ecef; border-radius: 8px; transition: transform 0.2s; }}
-        .article:hover {{ transform: translateY(-2px); box-shadow: 0 5px 15px rgba(0,0,0,0.05); }}
-        .article-title {{ font-size: 1.4em; font-weight: 600; margin: 0 0 15px 0; color: #2c3e50; }}
-        .article-title a {{ color: #2c3e50; text-decoration: none; }}
-        .article-title a:hover {{ color: #3498db; }}
-        .meta {{ color: #95a5a6; font-size: 0.9em; margin-bottom: 20px; text-transform: uppercase; letter-spacing: 0.5px; }}
-        .summary {{ margin-top: 20px; font-size: 1.05em; color: #444; }}
-        .summary h5 {{ color: #2c3e50; font-size: 1.1em; font-weight: 600; margin-top: 20px; margin-bottom: 10px; }}
-        .summary p {{ margin-bottom: 10px; }}
-        .summary blockquote {{ background: #f8f9fa; border-left: 4px solid #3498db; margin: 10px 0; padding: 15px; font-style: italic; color: #555; }}
-        .summary ul {{ margin: 0; padding-left: 20px; }}
-        .summary li {{ margin-bottom: 8px; }}
-        .category-row {{ display: flex; justify-content: space-between; align-items: center; margin-top: 25px; padding-top: 20px; border-top: 1px solid #f1f1f1; }}
-        .badge {{ padding: 6px 12px; border-radius: 20px; font-size: 0.85em; font-weight: 500; color: white; text-transform: uppercase; letter-spacing: 0.5px; }}
-        .read-more-btn {{ padding: 8px 20px; border-radius: 20px; font-size: 0.9em; color: white; text-decoration: none; border: none; transition: opacity 0.2s; }}
-        .read-more-btn:hover {{ opacity: 0.9; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-    <div class="header">
-        <h1>RSS News Summary</h1>
-        <p>Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        {f'<p>Date Range: {start_date} to {end_date}</p>' if start_date and end_date else ''}
-        <p>Total Articles: {len(articles)}</p>
-    </div>
-"""
-            
-            for article in articles:
-                source_name = article.feed.name if article.feed else 'Unknown'
-                html += f'    <div class="article">\n'
-                html += f'        <h3 class="article-title"><a href="{article.url}" target="_blank">{article.title}</a></h3>\n'
-                html += f'        <div class="meta">\n'
-                html += f'            Source: {source_name} | Author: {article.author or "Unknown"} | Published: {article.published_date.strftime("%Y-%m-%d %H:%M")}\n'
-                html += f'        </div>\n'
-                
-                if article.summary:
-                    html += f'        <div class="summary">\n'
-                    lines = article.summary.split('\n')
-                    for line in lines:
-                        clean_line = line.strip()
-                        if clean_line.startswith('**'):
-                            # Header
-                            text = clean_line.replace('**', '').replace(':', '')
-                            html += f'            <h5>{text}</h5>\n'
-                        elif clean_line.startswith('•'):
-                            # Bullet point
-                            text = clean_line[1:].strip()
-                            html += f'            <div style="display: flex; margin-bottom: 5px;"><span style="margin-right: 10px;">•</span><span>{text}</span></div>\n'
-                        elif clean_line.startswith('> "'):
-                            # Quote
-                            text = clean_line[2:-1].strip()
-                            html += f'            <blockquote>{text}</blockquote>\n'
-                        elif clean_line:
-                            # Paragraph
-                            html += f'            <p>{clean_line}</p>\n'
-                    html += f'        </div>\n'
-                
-                if hasattr(article, 'category_name') and article.category_name:
-                    color = getattr(article, 'category_color', '#3498db')
-                    html += f'        <div class="category-row">\n'
-                    html += f'            <span class="badge" style="background-color: {color};">{article.category_name}</span>\n'
-                    html += f'            <a href="{article.url}" target="_blank" class="read-more-btn" style="background-color: {color};">Read More</a>\n'
-                    html += f'        </div>\n'
-                
-                html += f'    </div>\n'
-            
-            html += """    </div>
-</body>
-</html>"""
+            digest_dir = os.path.join(self.output_dir, 'digests')
+            os.makedirs(digest_dir, exist_ok=True)
+            stamp = now.strftime('%Y%m%d') if rolling else now.strftime('%Y%m%d_%H%M%S')
+            meta = {
+                'title': f"{target.replace('_', ' ').title()} - {now.strftime('%Y-%m-%d')}",
+                'generated': now.strftime('%Y-%m-%d %H:%M:%S'),
+                'start_date': None,
+                'end_date': None,
+                'total': None,
+                'heading': f"{now.strftime('%H:%M')} update - {new_count} new article{'s' if new_count != 1 else ''}"
+            }
             
-            filename = f"{self.output_dir}/rss_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(html)
+            filenames = {fmt: os.path.join(digest_dir, f"{target}_{stamp}.{REPORT_FORMATS[fmt][1]}") for fmt in formats}
+            sections = [_RollingSection(filenames[fmt], macros[fmt], meta) for fmt in formats]
+            last = None
+            try:
+                for article in query.yield_per(self.batch_size):
+                    view = build_report_article(article, feed_names)
+                    for section in sections:
+                        section.add(view)
+                    last = article
+            except BaseException:
+                for section in sections:
+                    section.abort()
+                raise
+            for section in sections:
+                section.finish()
             
-            return filename
+            if last is None:
+                # The new rows were deleted between the count and the scan
+                return {}
+            save_watermark(db, mark_name, last.created_at, last.id)
+            db.commit()
+            return filenames
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    def iter_markdown(self, start_date=None, end_date=None):
+        return self.iter_report('markdown', start_date, end_date)
+
+    def iter_html(self, start_date=None, end_date=None):
+        return self.iter_report('html', start_date, end_date)
+
+    def generate_markdown(self, start_date=None, end_date=None):
+        return self.generate_reports(('markdown',), start_date, end_date)['markdown']
+
+    def generate_html(self, start_date=None, end_date=None):
+        return self.generate_reports(('html',), start_date, end_date)['html']
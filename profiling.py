@@ -0,0 +1,216 @@
+"""On-demand CPU and memory profiling of ingest runs.
+
+Turn it on from the Scheduler admin page (SystemConfig 'profile_mode') or
+with `python run_once.py --profile`. run_history.record_run then wraps the
+run in a RunProfiler and stores what it collects as run_artifacts rows of
+the processing run, downloadable from the admin page:
+
+- cprofile: deterministic cProfile of the thread that drives the run
+  (profile.prof for pstats/snakeviz, profile.txt top functions). Work done
+  in the fetch, extraction and analysis thread pools is only seen as
+  waiting.
+- sample: stacks of every thread sampled every RSS_PROFILE_INTERVAL_MS
+  (samples.folded for flamegraph.pl/speedscope, samples.txt summary).
+
+Both modes add memory.txt: tracemalloc snapshots at each stage boundary
+with the largest allocation sites and the growth since the last boundary.
+"""
+
+import cProfile
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from database import SessionLocal, SystemConfig
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CONFIG_KEY = 'profile_mode'
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Runs can overlap (fetch and analyze jobs), so tracemalloc is shared: the
+# first MemoryTracker to start turns it on and the last one to stop turns it off
+_tracing_lock = threading.Lock()
+_tracing_owners = 0
+_tracing_started = False
+
+def configured_profile_mode():
+    """Profiling mode saved from the admin page, or None when off"""
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, PROFILE_CONFIG_KEY)
+        return item.value if item and item.value in PROFILE_MODES else None
+    finally:
+        db.close()
+
+def save_profile_mode(mode):
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, PROFILE_CONFIG_KEY)
+        if item is None:
+            item = SystemConfig(key=PROFILE_CONFIG_KEY, description='Profile ingest runs: off, cprofile or sample')
+            db.add(item)
+        item.value = mode if mode in PROFILE_MODES else 'off'
+        db.commit()
+    finally:
+        db.close()
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Counts the call stacks of all threads, sampled from a background thread"""
+    def __init__(self, interval=None):
+        self.interval = interval or float(os.getenv('RSS_PROFILE_INTERVAL_MS', '5')) / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='rss-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Collapsed stacks, one 'thread;outer;...;inner count' line per stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=40):
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if frames:
+                own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms across all threads", '',
+                 'Self samples (where threads were):']
+        lines += [f"{count:>8}  {frame}" for frame, count in own.most_common(limit)]
+        lines += ['', 'Inclusive samples (function on the stack):']
+        lines += [f"{count:>8}  {frame}" for frame, count in inclusive.most_common(limit)]
+        return '\n'.join(lines) + '\n'
+
+class MemoryTracker:
+    """tracemalloc snapshots at stage boundaries"""
+    def __init__(self, top=15):
+        self.top = top
+        self.report = []
+        self._previous = None
+        self._started = False
+
+    def start(self):
+        global _tracing_owners, _tracing_started
+        with _tracing_lock:
+            # Leave tracing on if someone else (PYTHONTRACEMALLOC) started it
+            if _tracing_owners == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracing_started = True
+            _tracing_owners += 1
+            self._started = True
+
+    def stop(self):
+        global _tracing_owners, _tracing_started
+        if not self._started:
+            return
+        self._started = False
+        with _tracing_lock:
+            _tracing_owners -= 1
+            if _tracing_owners == 0 and _tracing_started:
+                tracemalloc.stop()
+                _tracing_started = False
+
+    def snapshot(self, label):
+        if not tracemalloc.is_tracing():
+            self.report.append(f"== {label}: tracemalloc was stopped outside the profiler\n")
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        self.report.append(f"== {label}: {current / 2**20:.1f} MiB traced, "
+                           f"peak {peak / 2**20:.1f} MiB since the previous boundary")
+        self.report.append('Largest allocation sites:')
+        self.report += [f"  {stat}" for stat in snapshot.statistics('lineno')[:self.top]]
+        if self._previous is not None:
+            self.report.append('Growth since the previous boundary:')
+            self.report += [f"  {stat}" for stat in snapshot.compare_to(self._previous, 'lineno')[:self.top]]
+        self.report.append('')
+        self._previous = snapshot
+
+class RunProfiler:
+    """Profiles one run; stop() returns the artifacts as (name, content_type, bytes)"""
+    def __init__(self, mode):
+        self.mode = mode
+        self.memory = MemoryTracker()
+        self._cprofile = None
+        self._sampler = None
+
+    def start(self):
+        self.memory.start()
+        self.memory.snapshot('start')
+        if self.mode == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            try:
+                self._cprofile.enable()
+            except ValueError as e:  # another profiler is active in this thread
+                logger.warning(f"cProfile unavailable, sampling instead: {e}")
+                self._cprofile, self.mode = None, 'sample'
+        if self.mode == 'sample':
+            self._sampler = SamplingProfiler()
+            self._sampler.start()
+
+    def stage(self, stage):
+        # Keep the snapshot's own cost out of the CPU profile
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.memory.snapshot(f"before {stage}")
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self):
+        artifacts = []
+        try:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+                self._cprofile.create_stats()
+                # Same format as pstats.Stats.dump_stats; dump before Stats() takes the stats over
+                artifacts.append(('profile.prof', 'application/octet-stream', marshal.dumps(self._cprofile.stats)))
+                out = io.StringIO()
+                pstats.Stats(self._cprofile, stream=out).sort_stats('cumulative').print_stats(60)
+                artifacts.append(('profile.txt', 'text/plain; charset=utf-8', out.getvalue().encode('utf-8')))
+            if self._sampler is not None:
+                self._sampler.stop()
+                artifacts.append(('samples.folded', 'text/plain; charset=utf-8', self._sampler.folded().encode('utf-8')))
+                artifacts.append(('samples.txt', 'text/plain; charset=utf-8', self._sampler.summary().encode('utf-8')))
+            self.memory.snapshot('end')
+        finally:
+            # Otherwise a failed stop would leave tracemalloc on for every later run
+            self.memory.stop()
+        artifacts.append(('memory.txt', 'text/plain; charset=utf-8', '\n'.join(self.memory.report).encode('utf-8')))
+        return artifacts
@@ -0,0 +1,246 @@
+"""Analysis prompts built to a token budget.
+
+Feed descriptions arrive as HTML (Google News items are mostly link
+markup) with sharing and "appeared first on" boilerplate, and extracted
+pages can run to many kilobytes. Instead of sending the first 2500
+characters as they are, PromptBuilder strips the markup and boilerplate,
+estimates tokens, and when the text is over budget keeps the most
+informative sentences in their original order. It also sizes max_tokens
+from the output lengths it has seen rather than a fixed 1200.
+Token estimates use a characters-per-token ratio calibrated against the
+input_tokens that Bedrock reports.
+
+The instructions and category list go in the system prompt, which stays
+identical until the categories change. On models that support prompt
+caching it is marked with cache_control, so repeat calls read it from the
+cache instead of paying full input price for it (see prompt_caching_enabled).
+"""
+
+import math
+import os
+import re
+import threading
+from collections import Counter, deque, namedtuple
+from feed_parsing import html_to_text
+from metrics import PROMPT_TOKENS_SAVED, BEDROCK_MAX_TOKENS
+
+# system: the cacheable prefix; text: the article message; tokens: estimated
+# size of both; saved_tokens: estimate against the old content[:2500] prompt
+Prompt = namedtuple('Prompt', 'system text max_tokens tokens saved_tokens')
+
+# System prompt: the instructions and category block are the same for every
+# article, so they form a stable prefix that Bedrock can cache
+ANALYSIS_INSTRUCTIONS = """Create an executive briefing from the article in the user message.
+Merge the key facts, direct quotes, and overall summary into a unified list of 4-5 bulleted statements.
+Include direct quotes as is inside the bullets where relevant.
+Avoid redundant information.
+Also extract the author name if available in the text.
+
+Match against Categories: {categories}
+
+Return JSON with, in this order:
+- "category": the single best matching category name from the list provided.
+- "relevancy_score": integer (0-100) representing how relevant the article is to that category.
+- "author": extracted author name (use provided Author if valid, otherwise try to extract from Content)
+- "bullets": list of summary bullets
+
+Return JSON:
+{{"category": "category_name", "relevancy_score": 85, "author": "Author Name", "bullets": ["Bullet 1", "Bullet 2", ...]}}"""
+
+ARTICLE_TEMPLATE = """Title: {title}
+Author: {author}
+Content: {content}"""
+
+# Bedrock model ids (substrings) that accept cache_control on the messages API
+PROMPT_CACHE_MODELS = ('claude-3-5-haiku', 'claude-3-7-sonnet', 'claude-sonnet-4', 'claude-opus-4', 'claude-haiku-4')
+
+# Characters of content the prompt used to carry
+LEGACY_CONTENT_CHARS = 2500
+
+_BOILERPLATE_RE = re.compile(
+    r"^(the post .* appeared first on .*|.*\bcontinue reading\b.*|read (the )?(full|more)\b.*|click here\b.*"
+    r"|(sign up|subscribe)\b.*(newsletter|subscribe|free).*|share (this|on)\b.*|follow us\b.*|advertisement"
+    r"|related( articles| stories| coverage)?:?.*|(©|\(c\)|copyright)\s.*|all rights reserved.*|view (full )?coverage"
+    r"|comments?|photo:.*|image:.*)$", re.I)
+_SENTENCE_RE = re.compile(r'(?<=[.!?])["”’)]?\s+(?=["“(]?[A-Z0-9])')
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]{3,}")
+_STOPWORDS = frozenset("""that this with from have will said says would could been were they their there
+which about after before other into more than what when where while also over such some them then these
+those your just like only most very year years""".split())
+
+def prompt_caching_enabled(model_id):
+    """RSS_PROMPT_CACHE: 'auto' (default) caches on models that support it, or true/false"""
+    setting = os.getenv('RSS_PROMPT_CACHE', 'auto').lower()
+    if setting == 'auto':
+        return any(name in model_id for name in PROMPT_CACHE_MODELS)
+    return setting not in ('0', 'false', 'no', 'off')
+
+def clean_content(content):
+    """Plain text of an entry's content, without markup, boilerplate lines or repeats"""
+    text = html_to_text(content) if '<' in content else content
+    lines, seen = [], set()
+    for line in text.splitlines():
+        line = ' '.join(line.split())
+        key = line.lower()
+        if not line or key in seen or _BOILERPLATE_RE.match(line):
+            continue
+        seen.add(key)
+        lines.append(line)
+    return '\n'.join(lines)
+
+def split_sentences(text):
+    """[(line number, sentence)] for the lines of text"""
+    return [(number, sentence) for number, line in enumerate(text.splitlines())
+            for sentence in _SENTENCE_RE.split(line) if sentence.strip()]
+
+def _terms(text):
+    return [word for word in (w.lower() for w in _WORD_RE.findall(text)) if word not in _STOPWORDS]
+
+def rank_sentences(sentences, title=''):
+    """Informativeness score per sentence: lead position, central and title terms, figures and quotes"""
+    term_sets = [set(_terms(sentence)) for _, sentence in sentences]
+    frequency = Counter(term for terms in term_sets for term in terms)
+    count = len(sentences)
+    # Terms that recur across a few sentences mark the story; ones in nearly every sentence are filler
+    weight = {term: df * math.log(count / df) for term, df in frequency.items() if df > 1}
+    centrality = [sum(weight.get(term, 0) for term in terms) / math.sqrt(len(terms) + 1) for terms in term_sets]
+    top = max(centrality, default=0) or 1
+    title_terms = set(_terms(title))
+    scores = []
+    for index, (_, sentence) in enumerate(sentences):
+        score = 4.0 * centrality[index] / top
+        score += 1.5 * len(term_sets[index] & title_terms)
+        score += 3.0 / (index + 1)  # news leads carry the story
+        if re.search(r'\d', sentence):
+            score += 1.0
+        if re.search(r'["“].{12,}["”]', sentence):
+            score += 1.5  # the prompt asks for direct quotes
+        if len(sentence.split()) < 5:
+            score -= 2.0
+        scores.append(score)
+    return scores
+
+def _similar(a, b):
+    return bool(a and b) and len(a & b) / len(a | b) > 0.6
+
+class PromptBuilder:
+    """Builds analysis prompts and learns token ratio and output lengths from responses"""
+    def __init__(self, content_tokens=None, max_tokens_ceiling=None, max_tokens_floor=None, cache_prefix=False):
+        self.content_tokens = content_tokens or int(os.getenv('RSS_PROMPT_CONTENT_TOKENS', '600'))
+        self.max_tokens_ceiling = max_tokens_ceiling or int(os.getenv('RSS_MAX_TOKENS_CEILING', '1200'))
+        self.max_tokens_floor = max_tokens_floor or int(os.getenv('RSS_MAX_TOKENS_FLOOR', '300'))
+        self.headroom = 1.3
+        self.min_samples = 20
+        self.chars_per_token = 4.0
+        self.cache_prefix = cache_prefix
+        self.frozen = False
+        self.system_builds = 0
+        self._system = None  # (category names, system prompt)
+        self._outputs = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def freeze(self):
+        """Stop learning from responses, so the same article always builds the same request.
+
+        Used while an archive is attached: archived Bedrock calls are keyed
+        on the request body, which would otherwise depend on how many
+        answers happened to be observed before each prompt was built.
+        """
+        with self._lock:
+            self.frozen = True
+            self.chars_per_token = 4.0
+            self._outputs.clear()
+
+    def estimate_tokens(self, text):
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def compact(self, content, title='', budget=None):
+        """Cleaned content, cut down to the budget (tokens) by keeping the best sentences"""
+        budget = budget or self.content_tokens
+        text = clean_content(content or '')
+        if self.estimate_tokens(text) <= budget:
+            return text
+        sentences = split_sentences(text)
+        scores = rank_sentences(sentences, title)
+        chosen, kept_terms, used = set(), [], 0
+        for index in sorted(range(len(sentences)), key=lambda i: -scores[i]):
+            cost = self.estimate_tokens(sentences[index][1]) + 1
+            terms = set(_terms(sentences[index][1]))
+            if used + cost > budget or any(_similar(terms, kept) for kept in kept_terms):
+                continue
+            chosen.add(index)
+            kept_terms.append(terms)
+            used += cost
+        lines = {}
+        for index in sorted(chosen):
+            number, sentence = sentences[index]
+            lines.setdefault(number, []).append(sentence)
+        return '\n'.join(' '.join(parts) for parts in lines.values())
+
+    def max_tokens(self):
+        """Output cap: observed p99 plus headroom, between the floor and the ceiling"""
+        with self._lock:
+            if len(self._outputs) < self.min_samples:
+                return self.max_tokens_ceiling
+            outputs = sorted(self._outputs)
+        p99 = outputs[min(len(outputs) - 1, int(0.99 * len(outputs)))]
+        size = int(math.ceil(p99 * self.headroom / 50) * 50)
+        return max(self.max_tokens_floor, min(self.max_tokens_ceiling, size))
+
+    def system_prompt(self, categories):
+        """Instructions and category block, rebuilt only when the category names change.
+
+        Names are sorted so the prefix stays byte-identical across runs,
+        whatever order the Category rows come back in.
+        """
+        key = tuple(sorted(categories))
+        with self._lock:
+            if self._system is None or self._system[0] != key:
+                self._system = (key, ANALYSIS_INSTRUCTIONS.format(categories=', '.join(key)))
+                self.system_builds += 1
+            return self._system[1]
+
+    def build(self, title, author, content, categories):
+        """Prompt for analyze_article; categories are names"""
+        system = self.system_prompt(categories)
+        fields = {'title': title, 'author': author}
+        text = ARTICLE_TEMPLATE.format(content=self.compact(content, title), **fields)
+        legacy_chars = (len(system) + len(ARTICLE_TEMPLATE.format(content='', **fields))
+                        + len((content or '')[:LEGACY_CONTENT_CHARS]))
+        tokens = self.estimate_tokens(system) + self.estimate_tokens(text)
+        saved = max(0, math.ceil(legacy_chars / self.chars_per_token) - tokens)
+        max_tokens = self.max_tokens()
+        PROMPT_TOKENS_SAVED.labels('input').inc(saved)
+        PROMPT_TOKENS_SAVED.labels('max_tokens').inc(self.max_tokens_ceiling - max_tokens)
+        BEDROCK_MAX_TOKENS.set(max_tokens)
+        return Prompt(system, text, max_tokens, tokens, saved)
+
+    def payload(self, prompt):
+        """invoke_model body; the system prefix carries cache_control when caching is on"""
+        system = {"type": "text", "text": prompt.system}
+        if self.cache_prefix:
+            system["cache_control"] = {"type": "ephemeral"}
+        return {
+            "max_tokens": prompt.max_tokens,
+            "anthropic_version": "bedrock-2023-05-31",
+            "system": [system],
+            "messages": [{"role": "user", "content": prompt.text}]
+        }
+
+    def observe(self, prompt, usage, stop_reason=None):
+        """Learn from a response's usage; a truncated answer counts as longer than it got"""
+        # With caching, input_tokens only counts what followed the cached prefix
+        input_tokens = sum(usage.get(key, 0) for key in ('input_tokens', 'cache_read_input_tokens',
+                                                          'cache_creation_input_tokens'))
+        output_tokens = usage.get('output_tokens')
+        with self._lock:
+            if self.frozen:
+                return
+            if input_tokens:
+                # Slow moving average; the message framing adds a few tokens either way
+                ratio = (len(prompt.system) + len(prompt.text)) / input_tokens
+                self.chars_per_token = 0.9 * self.chars_per_token + 0.1 * ratio
+            if output_tokens:
+                if stop_reason == 'max_tokens':
+                    output_tokens = max(output_tokens, prompt.max_tokens) * 1.5
+                self._outputs.append(output_tokens)
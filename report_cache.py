@@ -0,0 +1,84 @@
+import hashlib
+import os
+import uuid
+from sqlalchemy import func
+from database import SessionLocal, Article, Feed, SystemConfig
+from output_generators import REPORT_FORMATS, TEMPLATE_DIR, prune_output_dir
+
+CONTENT_REVISION_KEY = 'report_content_revision'
+
+def bump_content_revision(db):
+    """Invalidate cached reports after edits that keep article ids and counts unchanged"""
+    item = db.get(SystemConfig, CONTENT_REVISION_KEY)
+    if item is None:
+        item = SystemConfig(key=CONTENT_REVISION_KEY, value='0',
+                            description='Incremented when report content changes in place')
+        db.add(item)
+    item.value = str(int(item.value or 0) + 1)
+
+def data_version(db):
+    """Cheap fingerprint of everything a report depends on"""
+    count, max_id, latest = db.query(func.count(Article.id), func.max(Article.id), func.max(Article.created_at)).one()
+    feeds = db.query(func.count(Feed.id), func.max(Feed.id)).one()
+    revision = db.get(SystemConfig, CONTENT_REVISION_KEY)
+    return f"{count}:{max_id}:{latest}:{feeds[0]}:{feeds[1]}:{revision.value if revision else 0}"
+
+def _templates_version():
+    return ':'.join(str(int(os.path.getmtime(os.path.join(TEMPLATE_DIR, name))))
+                    for name, _ in sorted(REPORT_FORMATS.values()))
+
+class ReportCache:
+    """Serves reports keyed by (format, date range, data version) from output/cache.
+
+    An unchanged dataset is answered straight from the cached file; a miss
+    streams the report to the client while writing it to the cache.
+    """
+    def __init__(self, output_generator, cache_dir=None):
+        self.output_generator = output_generator
+        self.cache_dir = os.path.abspath(cache_dir or os.path.join(output_generator.output_dir, 'cache'))
+
+    def key(self, fmt, start_date=None, end_date=None):
+        db = SessionLocal()
+        try:
+            version = data_version(db)
+        finally:
+            db.close()
+        raw = f"{fmt}|{start_date}|{end_date}|{version}|{_templates_version()}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+    def path_for(self, fmt, key):
+        return os.path.join(self.cache_dir, f"report_{key}.{REPORT_FORMATS[fmt][1]}")
+
+    def open_report(self, fmt, start_date=None, end_date=None):
+        """Return (cached_path, None) on a hit or (None, chunk iterator) on a miss"""
+        path = self.path_for(fmt, self.key(fmt, start_date, end_date))
+        if os.path.exists(path):
+            os.utime(path)  # keep recently served reports ahead of retention
+            return path, None
+        return None, self._stream_and_store(fmt, path, start_date, end_date)
+
+    def get_or_create(self, fmt, start_date=None, end_date=None):
+        """Return the path of the cached report, rendering it if needed"""
+        path = self.path_for(fmt, self.key(fmt, start_date, end_date))
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        for _ in self._stream_and_store(fmt, path, start_date, end_date):
+            pass
+        return path
+
+    def _stream_and_store(self, fmt, path, start_date, end_date):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        completed = False
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for chunk in self.output_generator.iter_report(fmt, start_date, end_date):
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        prune_output_dir(self.output_generator.output_dir)
@@ -0,0 +1,272 @@
+"""Resilient Bedrock calls: error classification, retries, adaptive concurrency and hedging.
+
+ResilientInvoker wraps invoke_model for AIService. Throttling and
+transient errors (5xx, timeouts, dropped connections) are retried with
+full-jitter exponential backoff until RSS_BEDROCK_MAX_ATTEMPTS or the
+RSS_BEDROCK_DEADLINE_SECONDS budget runs out; anything else (validation,
+access denied, a body that is not JSON) fails at once. In-flight calls are
+capped by an AIMD limiter: the cap grows by about one per window of
+successful calls and halves when Bedrock throttles. With
+RSS_BEDROCK_HEDGE_PERCENTILE set (e.g. 95), a call still running after that
+percentile of recent latencies gets a duplicate request, if the limiter
+has a free slot, and whichever answers first wins. Hedging trades tokens
+for tail latency, so it is off by default.
+
+invoke_stream() does the same for invoke_model_with_response_stream,
+minus hedging: each event goes to a consumer that can end the stream
+early. A failed attempt is retried from the start, after the consumer
+has been reset.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from metrics import BEDROCK_SECONDS, BEDROCK_RETRIES, BEDROCK_HEDGES, BEDROCK_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+THROTTLE, TRANSIENT, FATAL = 'throttle', 'transient', 'fatal'
+
+THROTTLE_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceQuotaExceededException',
+                  'Throttling', 'RequestLimitExceeded', 'throttlingException'}
+TRANSIENT_CODES = {'ServiceUnavailableException', 'InternalServerException', 'ModelTimeoutException',
+                   'ModelNotReadyException', 'InternalFailure', 'ServiceUnavailable', 'RequestTimeout',
+                   'RequestTimeoutException',
+                   # errors raised mid-stream by invoke_model_with_response_stream (EventStreamError)
+                   'internalServerException', 'modelStreamErrorException', 'modelTimeoutException',
+                   'serviceUnavailableException'}
+# botocore exception class names; matched by name so botocore is not imported here
+TRANSIENT_EXCEPTIONS = {'EndpointConnectionError', 'ConnectTimeoutError', 'ReadTimeoutError',
+                        'ConnectionClosedError', 'IncompleteReadError', 'ResponseStreamingError'}
+
+# Result of ResilientInvoker.invoke; calls counts retries and hedged duplicates
+InvokeResult = namedtuple('InvokeResult', 'body calls')
+
+def classify_error(exc):
+    """THROTTLE, TRANSIENT (worth retrying) or FATAL"""
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):  # botocore ClientError
+        code = (response.get('Error') or {}).get('Code', '')
+        status = (response.get('ResponseMetadata') or {}).get('HTTPStatusCode') or 0
+        if code in THROTTLE_CODES or status == 429:
+            return THROTTLE
+        if code in TRANSIENT_CODES or status >= 500:
+            return TRANSIENT
+        return FATAL
+    if any(cls.__name__ in TRANSIENT_EXCEPTIONS for cls in type(exc).__mro__):
+        return TRANSIENT
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    return FATAL
+
+class AIMDLimiter:
+    """Concurrency cap with additive increase and multiplicative decrease"""
+    def __init__(self, initial=None, minimum=1, maximum=None, decrease=0.5):
+        self.maximum = maximum or int(os.getenv('RSS_BEDROCK_MAX_CONCURRENCY', '16'))
+        self.minimum = minimum
+        self.limit = float(min(self.maximum, initial or int(os.getenv('RSS_BEDROCK_CONCURRENCY', '4'))))
+        self.decrease = decrease
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+        BEDROCK_CONCURRENCY.set(self.limit)
+
+    def acquire(self, blocking=True):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self):
+        with self._cond:
+            # +1/limit per success is about +1 per full window of calls
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+        BEDROCK_CONCURRENCY.set(self.limit)
+
+    def on_throttle(self, started):
+        """started: time.monotonic() when the throttled call was sent"""
+        with self._cond:
+            # Calls sent before the last decrease were sent at the old limit;
+            # count that burst as one signal
+            if started < self._last_decrease:
+                return
+            self._last_decrease = time.monotonic()
+            self.limit = max(self.minimum, self.limit * self.decrease)
+        BEDROCK_CONCURRENCY.set(self.limit)
+        logger.info(f"Bedrock throttled; concurrency limit now {int(self.limit)}")
+
+class ResilientInvoker:
+    """invoke_model with retries, a deadline, an AIMD limiter and optional hedging"""
+    def __init__(self, get_client, limiter=None, max_attempts=None, deadline=None, base_delay=None,
+                 max_delay=None, hedge_percentile=None, sleep=time.sleep, rng=None):
+        self.get_client = get_client  # callable, so AIService.bedrock_client can be swapped
+        self.limiter = limiter or AIMDLimiter()
+        self.max_attempts = max_attempts or int(os.getenv('RSS_BEDROCK_MAX_ATTEMPTS', '5'))
+        self.deadline = deadline or float(os.getenv('RSS_BEDROCK_DEADLINE_SECONDS', '120'))
+        self.base_delay = base_delay or float(os.getenv('RSS_BEDROCK_BACKOFF_BASE', '0.5'))
+        self.max_delay = max_delay or float(os.getenv('RSS_BEDROCK_BACKOFF_MAX', '20'))
+        if hedge_percentile is None:
+            hedge_percentile = float(os.getenv('RSS_BEDROCK_HEDGE_PERCENTILE', '0'))
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = 20
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self._latencies = deque(maxlen=200)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def invoke(self, **kwargs):
+        """Return InvokeResult(parsed response body, calls made).
+
+        The last error is re-raised once it is fatal, attempts are used up or
+        the next backoff would cross the deadline; it carries the number of
+        calls made as bedrock_calls.
+        """
+        return self._invoke(kwargs)
+
+    def invoke_stream(self, consumer, **kwargs):
+        """Stream the response into consumer; returns InvokeResult(consumer, calls made).
+
+        consumer.reset() runs before each attempt, and consumer.feed(event)
+        gets each decoded chunk; a true return value closes the stream.
+        Errors are handled as in invoke().
+        """
+        return self._invoke(kwargs, consumer)
+
+    def _invoke(self, kwargs, consumer=None):
+        deadline = time.monotonic() + self.deadline
+        calls = 0
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if consumer is not None:
+                    with self.limiter.slot():
+                        return InvokeResult(self._invoke_once(kwargs, consumer), calls + 1)
+                body, made = self._call(kwargs, deadline)
+                return InvokeResult(body, calls + made)
+            except Exception as e:
+                calls += getattr(e, 'bedrock_calls', 1)
+                kind = classify_error(e)
+                delay = self._backoff(attempt, kind)
+                if kind == FATAL or attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    e.bedrock_calls = calls
+                    raise
+                BEDROCK_RETRIES.labels(kind).inc()
+                logger.warning(f"Bedrock {kind} error (attempt {attempt}/{self.max_attempts}), "
+                               f"retrying in {delay:.1f}s: {e}")
+                self.sleep(delay)
+
+    def _backoff(self, attempt, kind):
+        # Full jitter; throttling starts from a longer base so the limiter can settle
+        base = self.base_delay * (2 if kind == THROTTLE else 1)
+        return self.rng.uniform(0, min(self.max_delay, base * 2 ** (attempt - 1)))
+
+    def _invoke_once(self, kwargs, consumer=None):
+        start = time.monotonic()
+        try:
+            with BEDROCK_SECONDS.time():
+                if consumer is None:
+                    response = self.get_client().invoke_model(**kwargs)
+                    body = json.loads(response['body'].read())
+                else:
+                    consumer.reset()
+                    response = self.get_client().invoke_model_with_response_stream(**kwargs)
+                    body = self._consume(response['body'], consumer)
+        except Exception as e:
+            if classify_error(e) == THROTTLE:
+                self.limiter.on_throttle(start)
+            raise
+        if consumer is None:  # streams can end early, so they say little about hedging delays
+            self._latencies.append(time.monotonic() - start)
+        self.limiter.on_success()
+        return body
+
+    def _consume(self, stream, consumer):
+        try:
+            for event in stream:
+                chunk = event.get('chunk')
+                if chunk and consumer.feed(json.loads(chunk['bytes'])):
+                    break
+        finally:
+            # Closing the connection is what stops generation on an abandoned stream
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        return consumer
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or warming up"""
+        if not self.hedge_percentile or len(self._latencies) < self.hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(self.hedge_percentile / 100 * len(latencies)))]
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=2 * self.limiter.maximum,
+                                                thread_name_prefix='rss-bedrock-hedge')
+            return self._pool
+
+    def _call(self, kwargs, deadline):
+        """One attempt, possibly hedged; returns (body, calls made)"""
+        delay = self.hedge_delay()
+        if delay is None:
+            with self.limiter.slot():
+                return self._invoke_once(kwargs), 1
+
+        self.limiter.acquire()
+        primary = self._executor().submit(self._invoke_once, kwargs)
+        primary.add_done_callback(lambda future: self.limiter.release())
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.limiter.acquire(blocking=False):
+            return self._result(primary, deadline), 1
+
+        BEDROCK_HEDGES.labels('launched').inc()
+        hedge = self._executor().submit(self._invoke_once, kwargs)
+        hedge.add_done_callback(lambda future: self.limiter.release())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        BEDROCK_HEDGES.labels('won').inc()
+                    return future.result(), 2
+                error = error or future.exception()
+        error = error or TimeoutError(f"Bedrock call exceeded its {self.deadline:.0f}s deadline")
+        error.bedrock_calls = 2
+        raise error
+
+    def _result(self, future, deadline):
+        try:
+            return future.result(timeout=max(0, deadline - time.monotonic()))
+        except TimeoutError as e:
+            if future.done():  # the call itself timed out
+                raise
+            raise TimeoutError(f"Bedrock call exceeded its {self.deadline:.0f}s deadline") from e
@@ -0,0 +1,213 @@
+"""Run history: one processing_runs row per ingest run.
+
+RunRecorder sits between NewsProcessor and the caller's progress sink
+(a jobs.Job or services.NullProgress). It forwards every call, and on the
+way through it times the stages, keeps per-feed fetch numbers and sums the
+counters, including Bedrock calls and the token usage reported by each
+response. record_run() saves the result when the run ends, with any
+profiling artifacts (see profiling.py).
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from database import SessionLocal, ProcessingRun, RunArtifact, Feed, Category
+from profiling import RunProfiler, PROFILE_MODES, configured_profile_mode
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens; the defaults are on-demand Claude 3 Haiku prices
+INPUT_COST_PER_MTOK = float(os.getenv('BEDROCK_INPUT_COST_PER_MTOK', '0.25'))
+OUTPUT_COST_PER_MTOK = float(os.getenv('BEDROCK_OUTPUT_COST_PER_MTOK', '1.25'))
+# Prompt cache reads and writes are billed at 0.1x and 1.25x the input price
+CACHE_READ_COST_PER_MTOK = float(os.getenv('BEDROCK_CACHE_READ_COST_PER_MTOK', str(INPUT_COST_PER_MTOK * 0.1)))
+CACHE_WRITE_COST_PER_MTOK = float(os.getenv('BEDROCK_CACHE_WRITE_COST_PER_MTOK', str(INPUT_COST_PER_MTOK * 1.25)))
+
+# Progress counters that add up to ProcessingRun.failures
+FAILURE_COUNTERS = ('feed_failures', 'extract_failures', 'analysis_failures')
+
+def estimate_cost(input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    return (input_tokens * INPUT_COST_PER_MTOK + output_tokens * OUTPUT_COST_PER_MTOK
+            + cache_read_tokens * CACHE_READ_COST_PER_MTOK + cache_write_tokens * CACHE_WRITE_COST_PER_MTOK) / 1_000_000
+
+class RunRecorder:
+    """Progress sink that accounts one run and forwards to another sink"""
+    def __init__(self, kind, progress, profiler=None):
+        self.kind = kind
+        self.progress = progress
+        self.profiler = profiler
+        self.started_at = datetime.now(timezone.utc)
+        self.counts = {}
+        self.stage_seconds = {}
+        self.feed_stats = {}
+        self._start = time.perf_counter()
+        self._stage = None
+        self._stage_start = None
+        self._lock = threading.Lock()
+
+    def _close_stage(self):
+        if self._stage is not None:
+            elapsed = time.perf_counter() - self._stage_start
+            self.stage_seconds[self._stage] = round(self.stage_seconds.get(self._stage, 0) + elapsed, 3)
+            self._stage = None
+
+    # Progress interface (see services.NullProgress)
+    def set_stage(self, stage):
+        self._close_stage()
+        if self.profiler is not None:
+            self.profiler.stage(stage)
+        self._stage, self._stage_start = stage, time.perf_counter()
+        self.progress.set_stage(stage)
+
+    def set_total_feeds(self, total):
+        self.progress.set_total_feeds(total)
+
+    def feed_done(self):
+        self.progress.feed_done()
+
+    def record_feed(self, feed, seconds, entries, queued, error=None):
+        self.feed_stats[str(feed.id)] = {
+            'name': feed.name,
+            'seconds': round(seconds, 3),
+            'entries': entries,
+            'queued': queued,
+            'error': str(error) if error else None,
+        }
+        self.progress.record_feed(feed, seconds, entries, queued, error)
+
+    def set_total_items(self, total):
+        self.progress.set_total_items(total)
+
+    def item_done(self):
+        self.progress.item_done()
+
+    def incr(self, counter, amount=1):
+        with self._lock:
+            self.counts[counter] = self.counts.get(counter, 0) + amount
+        self.progress.incr(counter, amount)
+
+    def preview(self, title, fields):
+        self.progress.preview(title, fields)
+
+    def is_cancelled(self):
+        return self.progress.is_cancelled()
+
+    def save(self, status, result, artifacts=()):
+        """Write the run to processing_runs, and artifacts ((name, content_type, data)) to run_artifacts"""
+        self._close_stage()
+        count = lambda name: self.counts.get(name, 0)
+        db = SessionLocal()
+        try:
+            run = ProcessingRun(
+                kind=self.kind,
+                status=status,
+                result=result if isinstance(result, str) else repr(result),
+                started_at=self.started_at,
+                finished_at=datetime.now(timezone.utc),
+                duration_seconds=round(time.perf_counter() - self._start, 3),
+                active_feeds=db.query(Feed).filter(Feed.active == True).count(),
+                active_categories=db.query(Category).filter(Category.active == True).count(),
+                entries_fetched=count('fetched'),
+                entries_queued=count('queued'),
+                entries_analyzed=count('analyzed'),
+                articles_saved=count('saved'),
+                bedrock_calls=count('bedrock_calls'),
+                input_tokens=count('input_tokens'),
+                output_tokens=count('output_tokens'),
+                estimated_cost=round(estimate_cost(count('input_tokens'), count('output_tokens'),
+                                                   count('prompt_cache_read_tokens'),
+                                                   count('prompt_cache_write_tokens')), 6),
+                cache_hits=count('cache_hits'),
+                failures=sum(count(name) for name in FAILURE_COUNTERS),
+                stage_seconds=dict(self.stage_seconds),
+                feed_stats=dict(self.feed_stats),
+                counts=dict(self.counts),
+            )
+            db.add(run)
+            db.flush()
+            db.add_all(RunArtifact(run_id=run.id, name=name, content_type=content_type, data=data)
+                       for name, content_type, data in artifacts)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving {self.kind} run: {e}")
+        finally:
+            db.close()
+
+def record_run(kind, func, progress, profile=None):
+    """Call func(progress=recorder) and save the run; returns func's result.
+
+    profile ('cprofile' or 'sample') profiles the run; by default the mode
+    saved from the admin page is used.
+    """
+    mode = profile or configured_profile_mode()
+    profiler = RunProfiler(mode) if mode in PROFILE_MODES else None
+    recorder = RunRecorder(kind, progress, profiler)
+    status, result = 'failed', None
+    if profiler is not None:
+        profiler.start()
+    try:
+        result = func(progress=recorder)
+        if recorder.is_cancelled():
+            status = 'cancelled'
+        elif not (isinstance(result, str) and result.startswith('Error')):
+            status = 'completed'
+        return result
+    except Exception as e:
+        result = f"Error: {e}"
+        raise
+    finally:
+        artifacts = ()
+        if profiler is not None:
+            try:
+                artifacts = profiler.stop()
+            except Exception as e:
+                # Losing the profile must not lose the run
+                logger.error(f"Error stopping the {kind} run profiler: {e}")
+        recorder.save(status, result, artifacts)
+
+def recent_runs(db, limit=20):
+    return db.query(ProcessingRun).order_by(ProcessingRun.started_at.desc()).limit(limit).all()
+
+def artifact_names(db, run_ids):
+    """{run_id: [artifact names]} for the given runs"""
+    names = {}
+    query = db.query(RunArtifact.run_id, RunArtifact.name).filter(RunArtifact.run_id.in_(run_ids))
+    for run_id, name in query.order_by(RunArtifact.id):
+        names.setdefault(run_id, []).append(name)
+    return names
+
+def daily_trends(db, days=14):
+    """Per-day totals and averages of recorded runs, newest day first"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    trends = {}
+    for run in db.query(ProcessingRun).filter(ProcessingRun.started_at >= since):
+        day = trends.setdefault(run.started_at.date().isoformat(), {
+            'day': run.started_at.date().isoformat(), 'runs': 0, 'seconds': 0.0, 'entries': 0, 'saved': 0,
+            'bedrock_calls': 0, 'tokens': 0, 'cost': 0.0, 'failures': 0, 'max_feeds': 0, 'max_categories': 0,
+        })
+        day['runs'] += 1
+        day['seconds'] += run.duration_seconds or 0
+        day['entries'] += run.entries_fetched or 0
+        day['saved'] += run.articles_saved or 0
+        day['bedrock_calls'] += run.bedrock_calls or 0
+        day['tokens'] += (run.input_tokens or 0) + (run.output_tokens or 0)
+        day['cost'] += run.estimated_cost or 0
+        day['failures'] += run.failures or 0
+        day['max_feeds'] = max(day['max_feeds'], run.active_feeds or 0)
+        day['max_categories'] = max(day['max_categories'], run.active_categories or 0)
+    for day in trends.values():
+        day['avg_seconds'] = day['seconds'] / day['runs']
+        day['cost_per_article'] = day['cost'] / day['saved'] if day['saved'] else None
+    return sorted(trends.values(), key=lambda day: day['day'], reverse=True)
+
+def prune_runs(db, days=None):
+    """Delete run history older than RSS_RUN_HISTORY_DAYS (default 90)"""
+    days = days or int(os.getenv('RSS_RUN_HISTORY_DAYS', '90'))
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    old_runs = db.query(ProcessingRun).filter(ProcessingRun.started_at < cutoff)
+    old_ids = old_runs.with_entities(ProcessingRun.id).scalar_subquery()
+    db.query(RunArtifact).filter(RunArtifact.run_id.in_(old_ids)).delete(synchronize_session=False)
+    return old_runs.delete()
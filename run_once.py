@@ -1,16 +1,47 @@
 #!/usr/bin/env python3
-"""Run RSS summary once immediately"""
+"""Run RSS summary once immediately
+
+With --record DIR the feeds, article pages and Bedrock responses used by
+the run are saved to an archive; --replay DIR re-runs from that archive
+without network access (point DATABASE_URL at a scratch database).
+--profile saves a CPU profile and per-stage memory snapshots with the
+run; download them from the Scheduler admin page.
+"""
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from scheduler import rss_scheduler
+import argparse
+import logging
+from scheduler import get_scheduler
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='DIR', help='record network traffic to an archive')
+    group.add_argument('--replay', metavar='DIR', help='replay a recorded archive instead of the network')
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=('cprofile', 'sample'),
+                        help='profile the run: cprofile (default) or sample (all threads)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    rss_scheduler = get_scheduler()
+    archive = None
+    if args.record or args.replay:
+        from archive import FetchArchive, attach_archive
+        archive = FetchArchive(args.record or args.replay, 'record' if args.record else 'replay')
+        attach_archive(rss_scheduler.news_processor, archive)
+    if args.profile:
+        rss_scheduler.news_processor.profile_mode = args.profile
+
     print("Running RSS summary once (immediate execution)...")
-    rss_scheduler.run_once_now()
+    try:
+        rss_scheduler.run_once_now()
+    finally:
+        if archive:
+            archive.close()
     print("RSS summary execution completed!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
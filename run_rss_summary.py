@@ -5,9 +5,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from services import NewsProcessor
 from output_generators import OutputGenerator
-import time
+import argparse
+import logging
 
-def run_full_summary():
+def run_full_summary(full=False):
     try:
         print("Starting RSS Summary Process")
         
@@ -20,16 +21,20 @@ def run_full_summary():
         result = news_processor.process_feeds()
         print(f"Processing result: {result}")
         
-        # Wait a moment for processing to complete
-        time.sleep(2)
+        if full:
+            # Full report of every stored article (one pass for both formats)
+            print("Generating full Markdown and HTML summaries...")
+            files = output_generator.generate_reports(('markdown', 'html'))
+        else:
+            # Append only articles added since the previous run to today's digest
+            print("Appending new articles to today's digest...")
+            files = output_generator.generate_incremental('rss_summary', ('markdown', 'html'))
+            if not files:
+                print("No new articles since the last digest")
+                return None, None
         
-        # Generate outputs
-        print("Generating Markdown summary...")
-        md_file = output_generator.generate_markdown()
+        md_file, html_file = files['markdown'], files['html']
         print(f"Markdown file: {md_file}")
-        
-        print("Generating HTML summary...")
-        html_file = output_generator.generate_html()
         print(f"HTML file: {html_file}")
         
         print("RSS Summary Complete")
@@ -39,4 +44,8 @@ def run_full_summary():
         return None, None
 
 if __name__ == "__main__":
-    run_full_summary()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fetch feeds and write the RSS summary")
+    parser.add_argument('--full', action='store_true', help='write a full report instead of the incremental digest')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_full_summary(full=args.full)
\ No newline at end of file
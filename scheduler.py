@@ -1,47 +1,251 @@
 import os
+import json
 import logging
+import threading
+import time
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.executors.pool import ThreadPoolExecutor
 import pytz
+from database import SessionLocal, SystemConfig
 from services import NewsProcessor
+from output_generators import OutputGenerator, prune_output_dir
+from stats import refresh_article_stats
+from sharding import live_workers
+from jobs import job_manager
+from run_history import record_run
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class SchedulerLock:
+    """Non-blocking file lock that elects the one process allowed to run scheduled jobs.
+
+    The OS releases the lock when the holding process exits, so a crashed
+    leader never leaves a stale lock behind.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+    
+    def acquire(self):
+        """Try to take the lock; returns True if this process is now the leader"""
+        if self._file:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+    
+    def release(self):
+        if self._file:
+            # Clear the pid first so holder_pid() never reports a former leader
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+    
+    @property
+    def held(self):
+        return self._file is not None
+    
+    def _unlocked(self):
+        """True if no process holds the lock (a leader that crashed leaves its pid behind)"""
+        if self._file or not fcntl:
+            return False
+        try:
+            with open(self.path, 'a+') as probe:
+                fcntl.flock(probe.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(probe.fileno(), fcntl.LOCK_UN)
+            return True
+        except OSError:
+            return False
+    
+    def holder_pid(self):
+        """PID of the current leader, if any"""
+        try:
+            with open(self.path) as f:
+                content = f.read().strip()
+            if not content or self._unlocked():
+                return None
+            return int(content)
+        except (OSError, ValueError):
+            return None
+
+# Job kinds that run the whole pipeline (see app.py); they exclude fetch and analyze runs
+FULL_RUN_KINDS = ('scheduled', 'run_now', 'refresh_news')
+
+# APScheduler job ids, names and the environment variables holding their interval in minutes.
+# A value of 0 disables the job.
+INTERVAL_JOBS = {
+    'analyze': ('Analyze Queue Drain', 'RSS_ANALYZE_INTERVAL_MINUTES', 30),
+    'cleanup': ('Retention Cleanup', 'RSS_CLEANUP_INTERVAL_MINUTES', 60),
+    'stats': ('Stats Refresh', 'RSS_STATS_INTERVAL_MINUTES', 60),
+    'digest': ('Incremental Digest', 'RSS_DIGEST_INTERVAL_MINUTES', 60),
+}
+
+WEEKDAYS = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+
 class RSSScheduler:
+    """Runs fetch, analysis, cleanup, stats and digest jobs on independent cadences.
+
+    Every job is coalesced (a backlog of missed runs fires once), limited to
+    one instance, and given a misfire grace period, so a slow stage delays
+    only its own next run.
+    """
     def __init__(self):
-        executors = {'default': ThreadPoolExecutor(20)}
-        self.scheduler = BackgroundScheduler(executors=executors, timezone=pytz.timezone('US/Pacific'))
+        self.scheduler = self._new_scheduler()
         self.news_processor = NewsProcessor()
+        self.output_generator = OutputGenerator()
+        self.misfire_grace_time = int(os.getenv('RSS_MISFIRE_GRACE_SECONDS', '900'))
         self.is_running = False
+        self.cron = None  # cron fields of the fetch job, compared with the saved schedule
+    
+    def _new_scheduler(self):
+        # One thread per job is enough: max_instances=1 prevents overlap within a job
+        executors = {'default': ThreadPoolExecutor(len(INTERVAL_JOBS) + 1)}
+        return BackgroundScheduler(executors=executors, timezone=pytz.timezone('US/Pacific'))
+    
+    def _add_job(self, job_id, name, func, trigger):
+        self.scheduler.add_job(
+            func=func,
+            trigger=trigger,
+            id=job_id,
+            name=name,
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=self.misfire_grace_time
+        )
     
     def run_rss_summary(self):
-        """Execute RSS summary processing"""
+        """Execute the full pipeline (cleanup, fetch, analyze) as one job"""
         try:
             logger.info(f"Starting scheduled RSS summary at {datetime.now()}")
-            result = self.news_processor.process_feeds()
+            result = job_manager.run('scheduled', self.news_processor.process_feeds)
             logger.info(f"Scheduled RSS summary completed: {result}")
         except Exception as e:
             logger.error(f"Error in scheduled RSS summary: {e}")
     
+    def _sharded_workers(self):
+        """Live ingest workers (worker.py); when any run, they own fetching and analysis"""
+        db = SessionLocal()
+        try:
+            return live_workers(db)
+        finally:
+            db.close()
+    
+    def run_fetch(self):
+        """Fetch feeds into the analyze queue, then wake the analyze job"""
+        workers = self._sharded_workers()
+        if workers:
+            logger.info(f"Skipping scheduled fetch: feeds are sharded across {len(workers)} workers")
+            return
+        def fetch(progress):
+            queued, total_entries, _ = self.news_processor.fetch_feeds(progress)
+            return f"Queued {queued} of {total_entries} entries"
+        try:
+            result = job_manager.run('fetch', lambda progress: record_run('fetch', fetch, progress),
+                                     conflicts=('fetch',) + FULL_RUN_KINDS)
+            logger.info(f"Scheduled fetch completed: {result}")
+            if self.scheduler.get_job('analyze') and self.news_processor.pending_count():
+                self.scheduler.modify_job('analyze', next_run_time=datetime.now(self.scheduler.timezone))
+        except Exception as e:
+            logger.error(f"Error in scheduled fetch: {e}")
+    
+    def run_analyze(self):
+        """Drain the analyze queue"""
+        def analyze(progress):
+            saved, analyzed, _ = self.news_processor.analyze_pending(progress)
+            if saved:
+                self.news_processor.refresh_stats(progress)
+            return f"Saved {saved} relevant articles from {analyzed} analyzed entries"
+        try:
+            if not self.news_processor.pending_count() or self._sharded_workers():
+                return
+            result = job_manager.run('analyze', lambda progress: record_run('analyze', analyze, progress),
+                                     conflicts=('analyze',) + FULL_RUN_KINDS)
+            logger.info(f"Scheduled analysis completed: {result}")
+        except Exception as e:
+            logger.error(f"Error in scheduled analysis: {e}")
+    
+    def run_cleanup(self):
+        """Apply retention to articles, the analyze queue and generated reports"""
+        try:
+            count = self.news_processor.cleanup_old_articles()
+            prune_output_dir(self.output_generator.output_dir)
+            logger.info(f"Scheduled cleanup removed {count} articles")
+        except Exception as e:
+            logger.error(f"Error in scheduled cleanup: {e}")
+    
+    def run_stats(self):
+        try:
+            refresh_article_stats()
+        except Exception as e:
+            logger.error(f"Error in scheduled stats refresh: {e}")
+    
+    def run_digest(self):
+        """Append articles saved since the last run to today's digest"""
+        try:
+            files = self.output_generator.generate_incremental('scheduled')
+            if files:
+                logger.info(f"Scheduled digest updated: {', '.join(files.values())}")
+        except Exception as e:
+            logger.error(f"Error in scheduled digest: {e}")
+    
     def schedule_cron(self, minute='0', hour='9', day='*', month='*', day_of_week='*'):
-        """Schedule RSS summary using cron-like syntax"""
-        self.scheduler.add_job(
-            func=self.run_rss_summary,
-            trigger=CronTrigger(
+        """Schedule the feed fetch using cron-like syntax"""
+        self._add_job(
+            'fetch',
+            'Feed Fetch',
+            self.run_fetch,
+            CronTrigger(
                 minute=minute,
                 hour=hour,
                 day=day,
                 month=month,
-                day_of_week=day_of_week
-            ),
-            id='rss_summary_cron',
-            name='RSS Summary Cron Job',
-            replace_existing=True
+                day_of_week=day_of_week,
+                timezone=self.scheduler.timezone
+            )
         )
-        logger.info(f"Scheduled RSS summary with cron: {minute} {hour} {day} {month} {day_of_week}")
+        self.cron = dict(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week)
+        logger.info(f"Scheduled feed fetch with cron: {minute} {hour} {day} {month} {day_of_week}")
+    
+    def schedule_daily(self, hour=9, minute=0):
+        self.schedule_cron(minute=str(minute), hour=str(hour))
+    
+    def schedule_intervals(self, intervals=None):
+        """Schedule the analyze, cleanup, stats and digest jobs ({job_id: minutes})"""
+        intervals = intervals or _intervals_from_env()
+        for job_id, (name, _, _) in INTERVAL_JOBS.items():
+            minutes = intervals.get(job_id, 0)
+            if minutes > 0:
+                self._add_job(job_id, name, getattr(self, f"run_{job_id}"), IntervalTrigger(minutes=minutes, timezone=self.scheduler.timezone))
+                logger.info(f"Scheduled {name.lower()} every {minutes} minutes")
+            elif self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
     
     def start(self):
         """Start the scheduler"""
@@ -51,36 +255,196 @@ class RSSScheduler:
             logger.info("RSS Scheduler started")
     
     def stop(self):
-        """Stop the scheduler"""
+        """Stop the scheduler and give up leadership (see set_scheduler_enabled to keep it stopped)"""
         if self.is_running:
             self.scheduler.shutdown()
+            # A shut-down BackgroundScheduler cannot restart its executor; keep a fresh one for the next start
+            self.scheduler = self._new_scheduler()
             self.is_running = False
+            scheduler_lock.release()
             logger.info("RSS Scheduler stopped")
     
     def get_next_run_time(self):
-        """Get next scheduled run time"""
-        job = self.scheduler.get_job('rss_summary_cron')
+        """Get next scheduled feed fetch time"""
+        job = self.scheduler.get_job('fetch')
         return job.next_run_time if job else None
     
+    def get_jobs(self):
+        """Scheduled jobs as (id, name, next_run_time), soonest first"""
+        jobs = [(job.id, job.name, job.next_run_time) for job in self.scheduler.get_jobs()]
+        return sorted(jobs, key=lambda job: (job[2] is None, job[2] or datetime.min))
+    
     def run_once_now(self):
         """Run RSS summary immediately (one-time execution)"""
         logger.info("Running RSS summary once (immediate execution)")
         self.run_rss_summary()
 
-# Global scheduler instance
-rss_scheduler = RSSScheduler()
+# Global scheduler instance, built on first use so importing this module is cheap
+_rss_scheduler = None
 
-def init_scheduler():
-    """Initialize scheduler with default settings"""
-    # Default cron schedule: daily at 9 AM PT
-    minute = os.getenv('RSS_SCHEDULE_MINUTE', '0')
-    hour = os.getenv('RSS_SCHEDULE_HOUR', '9')
-    day = os.getenv('RSS_SCHEDULE_DAY', '*')
-    month = os.getenv('RSS_SCHEDULE_MONTH', '*')
-    day_of_week = os.getenv('RSS_SCHEDULE_DOW', '*')
-    
-    rss_scheduler.schedule_cron(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week)
+def get_scheduler():
+    """Return the process-wide RSSScheduler, creating it on first call"""
+    global _rss_scheduler
+    if _rss_scheduler is None:
+        _rss_scheduler = RSSScheduler()
+    return _rss_scheduler
+
+def __getattr__(name):
+    # Backwards compatible ``from scheduler import rss_scheduler``
+    if name == 'rss_scheduler':
+        return get_scheduler()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SCHEDULE_CONFIG_KEY = 'fetch_schedule'
+ENABLED_CONFIG_KEY = 'scheduler_enabled'
+
+def _schedule_from_env():
+    """Default fetch cron schedule (daily at 9 AM PT) overridable via environment"""
+    return dict(
+        minute=os.getenv('RSS_SCHEDULE_MINUTE', '0'),
+        hour=os.getenv('RSS_SCHEDULE_HOUR', '9'),
+        day=os.getenv('RSS_SCHEDULE_DAY', '*'),
+        month=os.getenv('RSS_SCHEDULE_MONTH', '*'),
+        day_of_week=os.getenv('RSS_SCHEDULE_DOW', '*')
+    )
+
+def _intervals_from_env():
+    return {job_id: int(os.getenv(env_var, str(default)))
+            for job_id, (_, env_var, default) in INTERVAL_JOBS.items()}
+
+def load_schedule():
+    """Fetch schedule saved from the admin page, falling back to the environment"""
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, SCHEDULE_CONFIG_KEY)
+        return json.loads(item.value) if item and item.value else _schedule_from_env()
+    finally:
+        db.close()
+
+def save_schedule(schedule):
+    """Persist the fetch schedule; a leader in another worker applies it within RSS_SCHEDULER_LOCK_RETRY seconds"""
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, SCHEDULE_CONFIG_KEY)
+        if item is None:
+            item = SystemConfig(key=SCHEDULE_CONFIG_KEY, description='Cron fields for the scheduled feed fetch')
+            db.add(item)
+        item.value = json.dumps(schedule)
+        db.commit()
+    finally:
+        db.close()
+
+def scheduler_enabled():
+    """False once the scheduler was stopped from the admin page, in whichever worker"""
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, ENABLED_CONFIG_KEY)
+        return item is None or item.value != 'false'
+    finally:
+        db.close()
+
+def save_scheduler_enabled(enabled):
+    db = SessionLocal()
+    try:
+        item = db.get(SystemConfig, ENABLED_CONFIG_KEY)
+        if item is None:
+            item = SystemConfig(key=ENABLED_CONFIG_KEY, description='Scheduled jobs on (true) or stopped (false)')
+            db.add(item)
+        item.value = 'true' if enabled else 'false'
+        db.commit()
+    finally:
+        db.close()
+
+def schedule_from_form(frequency, time_value='09:00', interval='6', weekday='1'):
+    """Translate the admin page's schedule form into cron fields"""
+    hour, minute = (int(part) for part in time_value.split(':'))
+    schedule = dict(minute=str(minute), hour=str(hour), day='*', month='*', day_of_week='*')
+    if frequency == 'hourly':
+        schedule.update(minute='0', hour=f"*/{int(interval)}")
+    elif frequency == 'weekdays':
+        schedule['day_of_week'] = 'mon-fri'
+    elif frequency == 'weekly':
+        schedule['day_of_week'] = WEEKDAYS[int(weekday)]
+    elif frequency != 'daily':
+        raise ValueError(f"Unknown frequency: {frequency}")
+    return schedule
+
+scheduler_lock = SchedulerLock(os.getenv('RSS_SCHEDULER_LOCK', 'scheduler.lock'))
+_election_thread = None
+
+def _start_as_leader():
+    """Start scheduling in this process, which holds the lock; returns False if scheduling is stopped"""
+    if not scheduler_enabled():
+        scheduler_lock.release()
+        return False
+    schedule = load_schedule()
+    rss_scheduler = get_scheduler()
+    rss_scheduler.schedule_cron(**schedule)
+    rss_scheduler.schedule_intervals()
     rss_scheduler.start()
+    logger.info(f"Scheduler initialized in process {os.getpid()} with cron: "
+                f"{schedule['minute']} {schedule['hour']} {schedule['day']} {schedule['month']} {schedule['day_of_week']} PT")
+    return True
+
+def _sync_leadership():
+    """Follow the saved settings: step down when stopped, apply a changed fetch schedule,
+    take the lock when it is free and scheduling is enabled"""
+    rss_scheduler = get_scheduler()
+    enabled = scheduler_enabled()
+    if rss_scheduler.is_running:
+        if not enabled:
+            logger.info(f"Scheduler stopped from the admin page; process {os.getpid()} stepping down")
+            rss_scheduler.stop()
+            return
+        # The schedule may have been saved by a worker that is not the leader
+        schedule = load_schedule()
+        if schedule != rss_scheduler.cron:
+            rss_scheduler.schedule_cron(**schedule)
+    elif enabled and scheduler_lock.acquire():
+        if _start_as_leader():
+            logger.info(f"Process {os.getpid()} took over scheduler leadership")
+
+def _wait_for_leadership(retry_seconds):
+    """Election loop run by every process: take over if the leader exits, and follow the admin page"""
+    while True:
+        time.sleep(retry_seconds)
+        try:
+            _sync_leadership()
+        except Exception as e:
+            logger.error(f"Error in scheduler election: {e}")
+
+def set_scheduler_enabled(enabled):
+    """Start or stop scheduled jobs across all workers.
+
+    The flag is saved first, so standby workers do not take over a stopped
+    scheduler; the leader, wherever it runs, follows it within
+    RSS_SCHEDULER_LOCK_RETRY seconds, or at once when it is this process.
+    """
+    save_scheduler_enabled(enabled)
+    _sync_leadership()
+    return get_scheduler()
+
+def init_scheduler():
+    """Initialize the scheduler in exactly one process.
+
+    Every web worker may call this; only the process that wins the
+    scheduler lock starts the BackgroundScheduler, and not while it is
+    stopped from the admin page. Every process keeps a lightweight election
+    thread that retries the lock, so scheduling moves to another worker if
+    the leader dies.
+    """
+    global _election_thread
+    if os.getenv('RSS_SCHEDULER_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        logger.info("Scheduler disabled via RSS_SCHEDULER_ENABLED")
+        return get_scheduler()
     
-    logger.info(f"Scheduler initialized with cron: {minute} {hour} {day} {month} {day_of_week} PT")
-    return rss_scheduler
\ No newline at end of file
+    if scheduler_lock.acquire():
+        if not _start_as_leader():
+            logger.info("Scheduler stopped from the admin page; standing by")
+    else:
+        logger.info(f"Scheduler already running in process {scheduler_lock.holder_pid()}; standing by")
+    if _election_thread is None:
+        retry_seconds = int(os.getenv('RSS_SCHEDULER_LOCK_RETRY', '60'))
+        _election_thread = threading.Thread(target=_wait_for_leadership, args=(retry_seconds,), daemon=True)
+        _election_thread.start()
+    return get_scheduler()
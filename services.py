@@ -9,308 +9,747 @@ except ImportError:
             return html.escape(s, quote=quote)
     sys.modules['cgi'] = cgi
 
-import feedparser
+import os
 import requests
-from bs4 import BeautifulSoup
-import boto3
 import json
 import time
 import logging
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 from datetime import datetime, timedelta
-from database import get_db, Article, Feed, Topic, Category
+from database import get_db, Article, Feed, Topic, Category, PendingEntry, ExtractedPage
+from sqlalchemy.exc import IntegrityError
+from stats import refresh_article_stats
+from feed_parsing import parse_feed, parse_pool
+from extraction import ContentExtractor
+from run_history import record_run, prune_runs
+from resilience import ResilientInvoker
+from ai_output import parse_analysis, StreamingAnalysis, REQUIRED_FIELDS
+from prompts import PromptBuilder, prompt_caching_enabled
+from metrics import (FEED_FETCH_SECONDS, FEED_RESPONSES, FEED_BYTES, ENTRIES_PARSED, ENTRIES_QUEUED,
+                     ENTRIES_SKIPPED, ARTICLES_SAVED, STAGE_SECONDS, BEDROCK_TOKENS, BEDROCK_ERRORS,
+                     AI_OUTPUT_PARSES, AI_FOLLOW_UPS, BEDROCK_FIRST_RESULT_SECONDS, BEDROCK_STREAMS_STOPPED)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One feed's result from RSSFetcher.fetch_many; seconds is the download time
+FeedFetch = namedtuple('FeedFetch', 'feed entries seconds error')
+# Category fields the prompt needs, detached from the session for analysis threads
+CategoryInfo = namedtuple('CategoryInfo', 'name description color')
+
+# Articles scoring below this for their best category are not saved
+RELEVANCY_THRESHOLD = 75
+
 class RSSFetcher:
-    def __init__(self):
+    """Downloads feeds on a pooled HTTP session and parses them in a process pool.
+
+    Downloads are I/O bound and run on threads (RSS_FETCH_WORKERS); parsing
+    is CPU bound and is handed to feed_parsing.parse_pool as raw bytes.
+    """
+    def __init__(self, workers=None, timeout=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.workers = workers or int(os.getenv('RSS_FETCH_WORKERS', '8'))
+        self.timeout = timeout or float(os.getenv('RSS_FETCH_TIMEOUT', '30'))
+        self.archive = None  # archive.FetchArchive when recording or replaying
+        self._session = None
+    
+    @property
+    def session(self):
+        """Shared requests.Session so connections are reused across feeds"""
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(self.headers)
+            self._session = session
+        return self._session
+    
+    def fetch_raw(self, feed_url, access_key=None):
+        """Return the raw feed body (local paths and file:// URLs are read from disk)"""
+        if self.archive is not None and self.archive.replaying:
+            return self.archive.load('feed', feed_url)
+        raw = self._fetch_live(feed_url, access_key)
+        if self.archive is not None:
+            self.archive.store('feed', feed_url, raw)
+        return raw
+    
+    def _fetch_live(self, feed_url, access_key=None):
+        parsed = urlparse(feed_url)
+        if parsed.scheme in ('', 'file'):
+            with open(parsed.path if parsed.scheme else feed_url, 'rb') as f:
+                return f.read()
+        request_headers = {}
+        if access_key:
+            request_headers['Authorization'] = access_key
+            # Also try adding as API-Key header just in case
+            request_headers['API-Key'] = access_key
+        start = time.perf_counter()
+        try:
+            response = self.session.get(feed_url, headers=request_headers, timeout=self.timeout)
+        except requests.RequestException:
+            FEED_RESPONSES.labels('error').inc()
+            raise
+        finally:
+            FEED_FETCH_SECONDS.labels(feed_url).observe(time.perf_counter() - start)
+        FEED_RESPONSES.labels(response.status_code).inc()
+        FEED_BYTES.labels(feed_url).inc(len(response.content))
+        response.raise_for_status()
+        return response.content
+    
+    def _download_and_parse(self, feed_url, access_key=None):
+        raw = self.fetch_raw(feed_url, access_key)
+        return parse_pool.submit(parse_feed, raw, feed_url)
     
     def fetch_feed(self, feed_url, access_key=None):
         try:
-            request_headers = self.headers.copy()
-            if access_key:
-                request_headers['Authorization'] = access_key
-                # Also try adding as API-Key header just in case
-                request_headers['API-Key'] = access_key
-                
-            # Use requests to fetch first if we have custom headers
-            if access_key:
-                response = requests.get(feed_url, headers=request_headers)
-                response.raise_for_status()
-                feed = feedparser.parse(response.content)
-            else:
-                feed = feedparser.parse(feed_url)
-            return feed.entries
+            return self._download_and_parse(feed_url, access_key).result()
         except Exception as e:
             logger.error(f"Error fetching feed {feed_url}: {e}")
             return []
     
+    def _timed_download(self, feed):
+        """Return (parse future, download seconds, error) for one feed"""
+        start = time.perf_counter()
+        try:
+            future, error = self._download_and_parse(feed.url, feed.access_key), None
+        except Exception as e:
+            future, error = None, e
+        return future, time.perf_counter() - start, error
+    
+    def fetch_many(self, feeds):
+        """Yield a FeedFetch as each feed is downloaded and parsed.
+
+        Feeds are downloaded concurrently and parsed in the process pool, so
+        results arrive in completion order. A failed feed yields no entries
+        and its error. Closing the generator early cancels downloads that
+        have not started.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='rss-fetch') as executor:
+            futures = {executor.submit(self._timed_download, feed): feed for feed in feeds}
+            try:
+                for future in as_completed(futures):
+                    feed = futures[future]
+                    parse_future, seconds, error = future.result()
+                    entries = []
+                    if error is None:
+                        try:
+                            entries = parse_future.result()
+                        except Exception as e:
+                            error = e
+                    if error is not None:
+                        logger.error(f"Error fetching feed {feed.url}: {error}")
+                    yield FeedFetch(feed, entries, seconds, error)
+            finally:
+                for future in futures:
+                    future.cancel()
+    
     def get_article_content(self, entry):
-        return getattr(entry, 'description', '') or getattr(entry, 'summary', '')
+        return entry.content
 
 class AIService:
     def __init__(self, api_key=None):
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-        self.model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+        self._bedrock_client = None
+        self.model_id = os.getenv('BEDROCK_MODEL_ID', "anthropic.claude-3-haiku-20240307-v1:0")
+        # Retries, throttling backoff, concurrency limit and hedging (resilience.py)
+        self.invoker = ResilientInvoker(lambda: self.bedrock_client)
+        # Budgeted prompt content, adaptive max_tokens and the cached system prefix (prompts.py)
+        self.prompts = PromptBuilder(cache_prefix=prompt_caching_enabled(self.model_id))
+        # Stream answers, so low scores end generation early and bullets show up as they arrive
+        self.stream = os.getenv('RSS_BEDROCK_STREAM', 'false').lower() in ('1', 'true', 'yes')
     
-    def analyze_article(self, title, author, content, url, categories):
-        categories_list = [cat.name for cat in categories]
-        categories_text = ", ".join(categories_list)
-        
-        prompt = f"""Create an executive briefing from this article.
-Merge the key facts, direct quotes, and overall summary into a unified list of 4-5 bulleted statements.
-Include direct quotes as is inside the bullets where relevant.
-Avoid redundant information.
-Also extract the author name if available in the text.
-
-Title: {title}
-Author: {author}
-Content: {content[:2500]}
-
-Match against Categories: {categories_text}
-
-Return JSON with:
-- "bullets": list of summary bullets
-- "category": the single best matching category name from the list provided.
-- "relevancy_score": integer (0-100) representing how relevant the article is to that category.
-- "author": extracted author name (use provided Author if valid, otherwise try to extract from Content)
+    @property
+    def bedrock_client(self):
+        """Bedrock runtime client, created on first use (boto3 is slow to import)"""
+        if self._bedrock_client is None:
+            import boto3
+            self._bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
+        return self._bedrock_client
+    
+    @bedrock_client.setter
+    def bedrock_client(self, client):
+        self._bedrock_client = client
+    
+    def analyze_article(self, title, author, content, url, categories, on_update=None):
+        """Summarize and score an article against the categories.
 
-Return JSON:
-{{"bullets": ["Bullet 1", "Bullet 2", ...], "category": "category_name", "relevancy_score": 85, "author": "Author Name"}}"""
+        When streaming, on_update(fields) gets the category, score and
+        complete bullets as they arrive, and an article scoring below
+        RELEVANCY_THRESHOLD comes back without a summary as soon as its
+        score is known.
+        """
+        categories_list = [cat.name for cat in categories]
+        prompt = self.prompts.build(title, author, content, categories_list)
         
+        usage = {}
+        calls = 0
+        start = time.perf_counter()
         try:
-            payload = {
-                "max_tokens": 1200,
-                "anthropic_version": "bedrock-2023-05-31",
-                "messages": [{"role": "user", "content": prompt}]
+            request = {
+                "modelId": self.model_id,
+                "contentType": 'application/json',
+                "accept": 'application/json',
+                "body": json.dumps(self.prompts.payload(prompt)).encode('utf-8')
             }
-            response = self.bedrock_client.invoke_model(
-                modelId=self.model_id,
-                contentType='application/json',
-                accept='application/json',
-                body=json.dumps(payload).encode('utf-8')
-            )
-            response_body = json.loads(response['body'].read())
+            if self.stream:
+                stream = StreamingAnalysis(categories_list, RELEVANCY_THRESHOLD, on_update)
+                _, calls = self.invoker.invoke_stream(stream, **request)
+                response_body = stream.body()
+                if stream.first_result_seconds is not None:
+                    BEDROCK_FIRST_RESULT_SECONDS.labels('stream').observe(stream.first_result_seconds)
+            else:
+                response_body, calls = self.invoker.invoke(**request)
+                BEDROCK_FIRST_RESULT_SECONDS.labels('blocking').observe(time.perf_counter() - start)
+            usage = self._count_usage(response_body, {})
+            
+            if response_body.get('stop_reason') == 'stopped_early':
+                # Below the threshold: the bullets would be thrown away, so they were never generated
+                BEDROCK_STREAMS_STOPPED.inc()
+                self.prompts.observe(prompt, {k: v for k, v in usage.items() if k != 'output_tokens'})
+                return self._rejection(stream.fields, usage, calls, start, prompt)
+            self.prompts.observe(prompt, usage, response_body.get('stop_reason'))
             response_text = response_body['content'][0]['text']
-            result = json.loads(response_text)
+            parsed = parse_analysis(response_text, categories_list)
+            AI_OUTPUT_PARSES.labels(parsed.outcome).inc()
+            if parsed.outcome != 'clean':
+                logger.info(f"Analysis JSON for {url} was {parsed.outcome} "
+                            f"(stop_reason {response_body.get('stop_reason')}); missing {parsed.missing}")
+            result = parsed.fields
+            # Follow up for what decides keeping the article first; bullets only matter if it is kept
+            deciding = [name for name in parsed.missing if name != "bullets"]
+            if deciding and not self._rejected(result):
+                recovered, follow_up_calls = self._follow_up(title, content, categories_list, result, deciding, usage)
+                calls += follow_up_calls
+                result.update(recovered)
+            if "bullets" in parsed.missing and "relevancy_score" in result and not self._rejected(result):
+                recovered, follow_up_calls = self._follow_up(title, content, categories_list, result, ["bullets"], usage)
+                calls += follow_up_calls
+                result.update(recovered)
+            if self._rejected(result) and parsed.missing:
+                return self._rejection(result, usage, calls, start, prompt)
             
-            if isinstance(result, dict):
-                bullets = result.get("bullets", [])
-                if isinstance(bullets, list):
-                    # Clean up redundant bullets and remove duplicates
-                    cleaned_bullets = []
-                    seen_content = set()
-                    for b in bullets:
-                        # Remove existing bullet char if present
-                        clean_b = b.strip()
-                        if clean_b.startswith('•'):
-                            clean_b = clean_b[1:].strip()
-                        elif clean_b.startswith('-'):
-                            clean_b = clean_b[1:].strip()
-                        
-                        # Check for duplicates using normalized text
-                        normalized = clean_b.lower().replace('"', '').replace("'", '').strip()
-                        if normalized and normalized not in seen_content:
-                            seen_content.add(normalized)
-                            cleaned_bullets.append(clean_b)
+            if all(name in result for name in REQUIRED_FIELDS):
+                # Clean up redundant bullets and remove duplicates
+                cleaned_bullets = []
+                seen_content = set()
+                for b in result["bullets"]:
+                    # Remove existing bullet char if present
+                    clean_b = b.strip()
+                    if clean_b.startswith('•'):
+                        clean_b = clean_b[1:].strip()
+                    elif clean_b.startswith('-'):
+                        clean_b = clean_b[1:].strip()
                     
-                    full_summary = "\n".join([f"• {b}" for b in cleaned_bullets])
-                else:
-                    full_summary = str(bullets)
+                    # Check for duplicates using normalized text
+                    normalized = clean_b.lower().replace('"', '').replace("'", '').strip()
+                    if normalized and normalized not in seen_content:
+                        seen_content.add(normalized)
+                        cleaned_bullets.append(clean_b)
+                
+                full_summary = "\n".join([f"• {b}" for b in cleaned_bullets])
 
                 return {
                     "summary": full_summary,
                     "quotes": "", 
-                    "category": result.get("category", ""),
-                    "relevancy_score": result.get("relevancy_score", 0),
-                    "author": result.get("author", "")
+                    "category": result["category"],
+                    "relevancy_score": result["relevancy_score"],
+                    "author": result.get("author", ""),
+                    "usage": usage,
+                    "calls": calls,
+                    "seconds": time.perf_counter() - start,
+                    "tokens_saved": prompt.saved_tokens
                 }
+            logger.error(f"AI analysis for {url} is missing {[n for n in REQUIRED_FIELDS if n not in result]}")
         except Exception as e:
             logger.error(f"AI analysis error: {e}")
-        return {"summary": "Analysis failed", "quotes": "", "category": "", "relevancy_score": 0}
+            calls = calls or getattr(e, 'bedrock_calls', 0)
+        BEDROCK_ERRORS.inc()
+        return {"summary": "Analysis failed", "quotes": "", "category": "", "relevancy_score": 0,
+                "usage": usage, "calls": calls, "seconds": time.perf_counter() - start,
+                "tokens_saved": prompt.saved_tokens}
+    
+    @staticmethod
+    def _rejected(fields):
+        """The score is known and below RELEVANCY_THRESHOLD, so NewsProcessor will discard the article"""
+        return fields.get("relevancy_score", RELEVANCY_THRESHOLD) < RELEVANCY_THRESHOLD
+    
+    def _rejection(self, fields, usage, calls, start, prompt):
+        """Analysis for an article below the threshold: score and category only, no summary"""
+        return {
+            "summary": "",
+            "quotes": "",
+            "category": fields.get("category", ""),
+            "relevancy_score": fields["relevancy_score"],
+            "author": "",
+            "usage": usage,
+            "calls": calls,
+            "seconds": time.perf_counter() - start,
+            "tokens_saved": prompt.saved_tokens
+        }
+    
+    def _count_usage(self, response_body, usage):
+        """Add a response's token usage to the usage dict and the token counters"""
+        reported = response_body.get('usage') or {}
+        for key, direction in (('input_tokens', 'input'), ('output_tokens', 'output'),
+                               ('cache_read_input_tokens', 'cache_read'), ('cache_creation_input_tokens', 'cache_write')):
+            if key in reported:
+                usage[key] = usage.get(key, 0) + reported[key]
+                BEDROCK_TOKENS.labels(direction).inc(reported[key])
+        return usage
+    
+    def _follow_up(self, title, content, categories_list, known, missing, usage):
+        """Ask only for the fields the first response lost; returns (recovered fields, calls).
+
+        Category and score need a few dozen output tokens; only lost bullets
+        pay for a summary again. The assistant turn is prefilled with "{" so
+        the answer is bare JSON.
+        """
+        asks = {
+            "bullets": '"bullets": list of 4-5 summary bullets, including direct quotes where relevant',
+            "category": f'"category": the single best matching category name from: {", ".join(categories_list)}',
+            "relevancy_score": '"relevancy_score": integer (0-100), how relevant the article is to that category',
+        }
+        context = f'The category is {known["category"]}.\n' if "category" in known else ""
+        budget = self.prompts.content_tokens if "bullets" in missing else 200
+        prompt = f"""Title: {title}
+Content: {self.prompts.compact(content, title, budget)}
+
+{context}Return JSON with only these keys:
+""" + "\n".join(f"- {asks[name]}" for name in missing)
+        payload = {
+            "max_tokens": 600 if "bullets" in missing else 60,
+            "anthropic_version": "bedrock-2023-05-31",
+            "messages": [{"role": "user", "content": prompt}, {"role": "assistant", "content": "{"}]
+        }
+        for name in missing:
+            AI_FOLLOW_UPS.labels(name).inc()
+        try:
+            response_body, calls = self.invoker.invoke(
+                modelId=self.model_id,
+                contentType='application/json',
+                accept='application/json',
+                body=json.dumps(payload).encode('utf-8')
+            )
+        except Exception as e:
+            logger.error(f"AI follow-up error: {e}")
+            return {}, getattr(e, 'bedrock_calls', 0)
+        self._count_usage(response_body, usage)
+        parsed = parse_analysis("{" + response_body['content'][0]['text'], categories_list)
+        return {name: parsed.fields[name] for name in missing if name in parsed.fields}, calls
+
+class NullProgress:
+    """Progress sink used when process_feeds runs outside a job (see jobs.Job)"""
+    def set_stage(self, stage):
+        pass
+    
+    def set_total_feeds(self, total):
+        pass
+    
+    def feed_done(self):
+        pass
+    
+    def record_feed(self, feed, seconds, entries, queued, error=None):
+        pass
+    
+    def set_total_items(self, total):
+        pass
+    
+    def item_done(self):
+        pass
+    
+    def incr(self, counter, amount=1):
+        pass
+    
+    def preview(self, title, fields):
+        pass
+    
+    def is_cancelled(self):
+        return False
+
+# Analysis attempts before a queued entry is dropped
+MAX_ANALYZE_ATTEMPTS = 3
 
 class NewsProcessor:
+    """Fetches feeds into the pending_entries queue and analyzes the queue into articles.
+
+    fetch_feeds() and analyze_pending() can run on separate schedules (see
+    scheduler.py); process_feeds() runs cleanup, fetch and analysis back to
+    back for manual refreshes.
+    """
     def __init__(self, api_key=None):
         self.rss_fetcher = RSSFetcher()
+        self.content_extractor = ContentExtractor(self.rss_fetcher)
         self.ai_service = AIService(api_key)
         self.processing = False
+        self.clock = datetime.now  # replaced by archive replay with the recording's start time
+        self.analyze_delay = 0  # optional pause before each Bedrock call; throttling is handled by ai_service.invoker
+        self.profile_mode = None  # 'cprofile' or 'sample' to profile process_feeds (run_once.py --profile)
     
     def cleanup_old_articles(self):
+        stage_start = time.perf_counter()
         db = get_db()
         try:
-            cutoff_time = datetime.now() - timedelta(hours=24)
+            cutoff_time = self.clock() - timedelta(hours=24)
             old_articles = db.query(Article).filter(Article.created_at < cutoff_time).all()
             count = len(old_articles)
             for article in old_articles:
                 db.delete(article)
+            # Queue rows (including rejected ones kept for de-duplication) age out too
+            db.query(PendingEntry).filter(PendingEntry.created_at < cutoff_time).delete()
+            db.query(ExtractedPage).filter(ExtractedPage.fetched_at < self.clock() - timedelta(days=7)).delete()
+            prune_runs(db)
             db.commit()
             if count > 0:
                 print(f"Cleaned up {count} articles older than 24 hours")
             return count
         finally:
             db.close()
+            STAGE_SECONDS.labels('cleanup').observe(time.perf_counter() - stage_start)
     
     def clear_all_articles(self):
         db = get_db()
         try:
             count = db.query(Article).count()
             db.query(Article).delete()
+            db.query(PendingEntry).delete()
             db.commit()
+            refresh_article_stats(db)
             print(f"Cleared all {count} articles from database")
             return count
         finally:
             db.close()
     
-    def process_feeds(self):
-        if self.processing:
-            return "Already processing"
-        
-        self.processing = True
+    def _skip(self, progress, reason):
+        progress.incr('skipped')
+        ENTRIES_SKIPPED.labels(reason).inc()
+    
+    def pending_count(self):
+        db = get_db()
         try:
-            self.cleanup_old_articles()
-            
-            db = get_db()
-            feeds = db.query(Feed).filter(Feed.active == True).all()
-            categories = db.query(Category).filter(Category.active == True).all()
-            
-            if not categories:
-                return "No active categories found"
-            
-            cutoff_time = datetime.now() - timedelta(hours=24)
-            processed_count = 0
+            return db.query(PendingEntry).filter(PendingEntry.status == 'pending').count()
+        finally:
+            db.close()
+    
+    def fetch_feeds(self, progress=None, feed_ids=None):
+        """Fetch active feeds (only feed_ids, if given) and queue new, recent entries for analysis.
+
+        Returns (queued, total_entries, cancelled).
+        """
+        progress = progress or NullProgress()
+        stage_start = time.perf_counter()
+        db = get_db()
+        try:
+            query = db.query(Feed).filter(Feed.active == True)
+            if feed_ids is not None:
+                query = query.filter(Feed.id.in_(feed_ids))
+            feeds = query.all()
+            cutoff_time = self.clock() - timedelta(hours=24)
+            queued = 0
             total_entries = 0
+            seen_urls = set()
+            progress.set_total_feeds(len(feeds))
             
-            print(f"\n=== Starting news processing ===")
             print(f"Active feeds: {len(feeds)}")
-            print(f"Active categories: {len(categories)}")
             
-            processed_urls = set()
-            
-            for feed in feeds:
+            progress.set_stage('fetching')
+            fetched = self.rss_fetcher.fetch_many(feeds)
+            for feed, entries, seconds, error in fetched:
+                if progress.is_cancelled():
+                    fetched.close()
+                    return queued, total_entries, True
                 print(f"\nProcessing feed: {feed.name}")
-                entries = self.rss_fetcher.fetch_feed(feed.url, feed.access_key)
                 print(f"Found {len(entries)} entries in feed")
                 total_entries += len(entries)
+                progress.incr('fetched', len(entries))
+                ENTRIES_PARSED.inc(len(entries))
+                if error is not None:
+                    progress.incr('feed_failures')
+                feed_queued = queued
                 
                 for entry in entries:
                     try:
-                        entry_link = getattr(entry, 'link', '')
-                        entry_title = getattr(entry, 'title', 'Untitled')
-                        
-                        # Type-safe author extraction
-                        entry_author = ''
-                        if hasattr(entry, 'author'):
-                            entry_author = str(entry.author)
-                        elif 'authors' in entry and entry.authors:
-                            entry_author = str(entry.authors[0].get('name', ''))
-                        elif 'dc_creator' in entry:
-                            entry_author = str(entry.dc_creator)
-                        elif 'author_detail' in entry and hasattr(entry.author_detail, 'name'):
-                            entry_author = str(entry.author_detail.name)
-                        
-                        published_date = datetime.now()
-                        if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                            try:
-                                published_date = datetime(*entry.published_parsed[:6])
-                            except:
-                                pass
-                        
-                        if published_date < cutoff_time:
+                        entry_link = entry.link
+                        published_date = entry.published
+                        if published_date < cutoff_time or not entry_link or entry_link in seen_urls:
+                            self._skip(progress, 'too_old' if published_date < cutoff_time else
+                                       'duplicate' if entry_link else 'no_link')
                             continue
+                        seen_urls.add(entry_link)
                         
-                        if not entry_link or entry_link in processed_urls:
-                            continue
-                        
-                        processed_urls.add(entry_link)
-                        print(f"Processing: {entry_title[:60]}...")
-                        
-                        existing = db.query(Article).filter(Article.url == entry_link).first()
-                        if existing:
-                            print(f"  -> Already exists, skipping")
+                        if (db.query(Article.id).filter(Article.url == entry_link).first() or
+                                db.query(PendingEntry.id).filter(PendingEntry.url == entry_link).first()):
+                            self._skip(progress, 'already_seen')
                             continue
                         
                         content = self.rss_fetcher.get_article_content(entry)
                         if not content:
+                            self._skip(progress, 'no_content')
                             continue
                         
-                        print(f"  -> Analyzing with AI...")
-                        time.sleep(1)
-                        analysis = self.ai_service.analyze_article(entry_title, entry_author, content, entry_link, categories)
-                        
-                        # Skip articles with failed analysis
-                        if analysis.get("summary", "") == "Analysis failed":
-                            print(f"  -> Skipping due to AI analysis failure")
-                            continue
-                        
-                        category_name = analysis.get("category", "")
-                        relevancy_score = int(analysis.get("relevancy_score", 0))
-                        ai_author = analysis.get("author", "")
-                        
-                        # Use AI extracted author if original was missing/unknown and AI found one
-                        if (not entry_author or entry_author.lower() in ['unknown', '']) and ai_author and ai_author.lower() != "unknown":
-                            entry_author = ai_author
-                            print(f"  -> Extracted author via AI: {entry_author}")
-                        
-                        print(f"  -> Category: {category_name} (Score: {relevancy_score})")
-
-                        # Filter articles with low relevancy score
-                        if relevancy_score < 75:
-                            print(f"  -> Skipping: Low relevancy score ({relevancy_score} < 75)")
-                            # We can choose to either not save it, or save it as uncategorized.
-                            # "filter articles that are not relevant to the categories" implies discarding or not mapping.
-                            # User said: "do not map an article to any category if it's relevancy score is less than 75%."
-                            # Usually this means we can leave category_name empty if we still want it, 
-                            # or if "filter articles" means exclude, we skip.
-                            # Given "filter articles" is a strong term, I will skip saving them effectively acting as a filter.
-                            # However, if it's general news, maybe we want it? 
-                            # Let's interpret strict filtering: If not relevant enough to ANY category, discard.
-                            # Wait, the prompt asks for "the single best matching category". 
-                            # If even the best matching is < 75, then it's not relevant to our interests defined by categories.
-                            continue
-                        
-                        category = next((c for c in categories if c.name == category_name), None)
-                        
-                        # If category name returned by AI doesn't match our DB (hallucination), treat as uncategorized or skip?
-                        # If we have a high score but invalid category name, it's weird.
-                        # Using default behavior: if category not found but score is high, maybe fallback?
-                        # But simpler is to rely on AI returning valid category from the list we gave.
-                        
-                        final_category_name = category.name if category else None
-                        final_category_color = category.color if category else None
-                            
-                        article = Article(
-                            title=entry_title,
+                        db.add(PendingEntry(
                             url=entry_link,
+                            title=entry.title,
+                            author=entry.author,
                             content=content,
-                            summary=analysis.get("summary", ""),
-                            author=entry_author,
                             feed_id=feed.id,
-                            published_date=published_date,
-                            category_name=final_category_name,
-                            category_color=final_category_color,
-                            relevancy_score=relevancy_score
-                        )
-                        
-                        db.add(article)
+                            published_date=published_date
+                        ))
+                        queued += 1
+                        progress.incr('queued')
+                        ENTRIES_QUEUED.inc()
+                    except Exception as entry_error:
+                        logger.error(f"Error queueing entry: {entry_error}")
+                        self._skip(progress, 'error')
+                
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker queued the same URL while shards were rebalancing
+                    db.rollback()
+                    logger.warning(f"Entries from {feed.name} were already queued by another worker")
+                progress.record_feed(feed, seconds, len(entries), queued - feed_queued, error)
+                progress.feed_done()
+            
+            print(f"Queued {queued} new entries for analysis")
+            return queued, total_entries, False
+        finally:
+            db.close()
+            STAGE_SECONDS.labels('fetch').observe(time.perf_counter() - stage_start)
+    
+    def _analyze_entry(self, title, author, content, url, categories, on_update=None):
+        if self.analyze_delay:
+            time.sleep(self.analyze_delay)
+        return self.ai_service.analyze_article(title, author, content, url, categories, on_update)
+    
+    def _analyses(self, db, pending, categories, progress):
+        """Yield (entry, analysis future) in queue order, keeping Bedrock calls in flight ahead.
+
+        Calls run on a thread pool, as many at once as the invoker's AIMD
+        limiter allows. Workers get plain values because every commit
+        expires the session's objects. The future is None for entries that
+        are already stored as articles. Closing the generator cancels calls
+        that have not started. Streamed fields go to progress.preview.
+        """
+        ahead = self.ai_service.invoker.limiter.maximum
+        executor = ThreadPoolExecutor(max_workers=ahead, thread_name_prefix='rss-analyze')
+        window = deque()
+        entries = iter(pending)
+        try:
+            while True:
+                while len(window) < ahead:
+                    entry = next(entries, None)
+                    if entry is None:
+                        break
+                    future = None
+                    if not db.query(Article.id).filter(Article.url == entry.url).first():
+                        on_update = lambda fields, title=entry.title: progress.preview(title, fields)
+                        future = executor.submit(self._analyze_entry, entry.title, entry.author,
+                                                 entry.content, entry.url, categories, on_update)
+                    window.append((entry, future))
+                if not window:
+                    return
+                yield window.popleft()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def analyze_pending(self, progress=None, limit=None, feed_ids=None):
+        """Analyze queued entries (from feed_ids, if given) and save the relevant ones as articles.
+
+        Returns (saved, analyzed, cancelled). Entries whose analysis fails
+        stay queued for a later run, up to MAX_ANALYZE_ATTEMPTS.
+        """
+        progress = progress or NullProgress()
+        stage_start = None
+        db = get_db()
+        try:
+            categories = db.query(Category).filter(Category.active == True).all()
+            if not categories:
+                return 0, 0, False
+            
+            query = db.query(PendingEntry).filter(PendingEntry.status == 'pending').order_by(PendingEntry.id)
+            if feed_ids is not None:
+                query = query.filter(PendingEntry.feed_id.in_(feed_ids))
+            if limit:
+                query = query.limit(limit)
+            pending = query.all()
+            progress.set_total_items(len(pending))
+            
+            progress.set_stage('extracting')
+            with STAGE_SECONDS.labels('extract').time():
+                replaced = self.content_extractor.enrich(pending, progress)
+                if replaced:
+                    db.commit()
+                    print(f"Replaced {replaced} short descriptions with full article text")
+            if progress.is_cancelled():
+                return 0, 0, True
+            
+            progress.set_stage('analyzing')
+            stage_start = time.perf_counter()
+            print(f"Analyzing {len(pending)} queued entries")
+            
+            saved_count = 0
+            analyzed_count = 0
+            category_info = [CategoryInfo(c.name, c.description, c.color) for c in categories]
+            analyses = self._analyses(db, pending, category_info, progress)
+            for entry, future in analyses:
+                if progress.is_cancelled():
+                    analyses.close()
+                    return saved_count, analyzed_count, True
+                try:
+                    if future is None:
+                        db.delete(entry)
                         db.commit()
-                        processed_count += 1
-                        print(f"  -> ✓ Article saved! Category: {category.name} ({processed_count} total)")
+                        self._skip(progress, 'already_saved')
+                        continue
                     
-                    except Exception as entry_error:
-                        logger.error(f"Error processing entry: {entry_error}")
+                    title = entry.title
+                    print(f"Processing: {title[:60]}...")
+                    analysis = future.result()
+                    analyzed_count += 1
+                    progress.incr('analyzed')
+                    usage = analysis.get("usage") or {}
+                    progress.incr('bedrock_calls', analysis.get("calls", 1))
+                    progress.incr('input_tokens', usage.get('input_tokens', 0))
+                    progress.incr('output_tokens', usage.get('output_tokens', 0))
+                    progress.incr('prompt_cache_read_tokens', usage.get('cache_read_input_tokens', 0))
+                    progress.incr('prompt_cache_write_tokens', usage.get('cache_creation_input_tokens', 0))
+                    progress.incr('prompt_tokens_saved', analysis.get("tokens_saved", 0))
+                    progress.incr('bedrock_ms', int(analysis.get("seconds", 0) * 1000))
+                    
+                    # Skip articles with failed analysis
+                    if analysis.get("summary", "") == "Analysis failed":
+                        print(f"  -> Skipping due to AI analysis failure")
+                        entry.attempts = (entry.attempts or 0) + 1
+                        if entry.attempts >= MAX_ANALYZE_ATTEMPTS:
+                            db.delete(entry)
+                        db.commit()
+                        progress.incr('analysis_failures')
+                        progress.preview(title, {'status': 'failed'})
+                        self._skip(progress, 'analysis_failed')
+                        continue
+                    
+                    category_name = analysis.get("category", "")
+                    relevancy_score = int(analysis.get("relevancy_score", 0))
+                    ai_author = analysis.get("author", "")
+                    entry_author = entry.author
+                    
+                    # Use AI extracted author if original was missing/unknown and AI found one
+                    if (not entry_author or entry_author.lower() in ['unknown', '']) and ai_author and ai_author.lower() != "unknown":
+                        entry_author = ai_author
+                        print(f"  -> Extracted author via AI: {entry_author}")
+                    
+                    print(f"  -> Category: {category_name} (Score: {relevancy_score})")
+
+                    # Filter articles with low relevancy score
+                    if relevancy_score < RELEVANCY_THRESHOLD:
+                        print(f"  -> Skipping: Low relevancy score ({relevancy_score} < {RELEVANCY_THRESHOLD})")
+                        # User said: "do not map an article to any category if it's relevancy score is less than 75%."
+                        # If even the best matching category is < 75, the article is not relevant to our
+                        # interests, so it is discarded. The queue row is kept as 'rejected' so the next
+                        # fetch does not queue (and pay to analyze) the same entry again.
+                        entry.status = 'rejected'
+                        db.commit()
+                        progress.preview(title, {'status': 'rejected', 'relevancy_score': relevancy_score})
+                        self._skip(progress, 'low_relevancy')
                         continue
+                    
+                    category = next((c for c in categories if c.name == category_name), None)
+                    
+                    # If category name returned by AI doesn't match our DB (hallucination), treat as uncategorized or skip?
+                    # If we have a high score but invalid category name, it's weird.
+                    # Using default behavior: if category not found but score is high, maybe fallback?
+                    # But simpler is to rely on AI returning valid category from the list we gave.
+                    
+                    final_category_name = category.name if category else None
+                    final_category_color = category.color if category else None
+                        
+                    article = Article(
+                        title=entry.title,
+                        url=entry.url,
+                        content=entry.content,
+                        summary=analysis.get("summary", ""),
+                        author=entry_author,
+                        feed_id=entry.feed_id,
+                        published_date=entry.published_date,
+                        category_name=final_category_name,
+                        category_color=final_category_color,
+                        relevancy_score=relevancy_score
+                    )
+                    
+                    db.add(article)
+                    db.delete(entry)
+                    db.commit()
+                    saved_count += 1
+                    progress.incr('saved')
+                    progress.preview(title, {'status': 'saved', 'category': final_category_name,
+                                             'relevancy_score': relevancy_score})
+                    ARTICLES_SAVED.inc()
+                    print(f"  -> ✓ Article saved! Category: {final_category_name} ({saved_count} total)")
+                
+                except Exception as entry_error:
+                    db.rollback()
+                    logger.error(f"Error processing entry: {entry_error}")
+                    self._skip(progress, 'error')
+                finally:
+                    progress.item_done()
             
+            return saved_count, analyzed_count, False
+        finally:
             db.close()
+            if stage_start is not None:
+                STAGE_SECONDS.labels('analyze').observe(time.perf_counter() - stage_start)
+    
+    def refresh_stats(self, progress=None):
+        progress = progress or NullProgress()
+        progress.set_stage('stats')
+        try:
+            with STAGE_SECONDS.labels('stats').time():
+                refresh_article_stats()
+        except Exception as stats_error:
+            logger.error(f"Error refreshing article stats: {stats_error}")
+    
+    def process_feeds(self, progress=None):
+        """Cleanup, fetch and analyze in one run (manual refresh and run_once)"""
+        if self.processing:
+            return "Already processing"
+        
+        self.processing = True
+        try:
+            return record_run('full', self._run_pipeline, progress or NullProgress(), self.profile_mode)
+        finally:
+            self.processing = False
+    
+    def _run_pipeline(self, progress):
+        try:
+            progress.set_stage('cleanup')
+            self.cleanup_old_articles()
+            
+            db = get_db()
+            try:
+                has_categories = db.query(Category).filter(Category.active == True).count() > 0
+            finally:
+                db.close()
+            if not has_categories:
+                return "No active categories found"
+            
+            print(f"\n=== Starting news processing ===")
+            queued, total_entries, cancelled = self.fetch_feeds(progress)
+            processed_count = 0
+            if not cancelled:
+                processed_count, _, cancelled = self.analyze_pending(progress)
+            
+            self.refresh_stats(progress)
+            
             print(f"\n=== Processing complete ===")
             print(f"Total entries processed: {total_entries}")
             print(f"Relevant articles saved: {processed_count}")
+            if cancelled:
+                return f"Cancelled after saving {processed_count} relevant articles from {total_entries} entries"
             return f"Processed {processed_count} relevant articles from {total_entries} entries"
             
         except Exception as e:
             logger.error(f"Processing error: {e}")
             return f"Error: {e}"
-        finally:
-            self.processing = False
\ No newline at end of file
@@ -0,0 +1,114 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from database import SessionLocal, WorkerLease
+
+logger = logging.getLogger(__name__)
+
+# A worker whose heartbeat is older than this is treated as dead
+LEASE_TTL_SECONDS = int(os.getenv('RSS_WORKER_LEASE_TTL', '60'))
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent hash ring mapping feed ids to worker ids.
+
+    Each worker gets `replicas` points on the ring, so when a worker joins
+    or leaves only the feeds between its points move (about 1/N of them).
+    """
+    def __init__(self, workers, replicas=64):
+        self.workers = sorted(workers)
+        self._points = sorted((_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(replicas))
+        self._keys = [point for point, _ in self._points]
+
+    def owner(self, key):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._points)
+        return self._points[index][1]
+
+    def shard(self, keys, worker_id):
+        """Subset of keys owned by worker_id"""
+        return [key for key in keys if self.owner(key) == worker_id]
+
+def live_workers(db, ttl=None):
+    """Ids of workers whose lease is fresh"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl or LEASE_TTL_SECONDS)
+    rows = db.query(WorkerLease.worker_id).filter(WorkerLease.heartbeat_at >= cutoff).all()
+    return [worker_id for worker_id, in rows]
+
+def reap_expired_leases(db, ttl=None):
+    """Delete leases of workers that stopped heartbeating; the caller commits"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl or LEASE_TTL_SECONDS)
+    return db.query(WorkerLease).filter(WorkerLease.heartbeat_at < cutoff).delete()
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkerLeaseKeeper:
+    """Holds a worker's lease row and refreshes it from a background thread.
+
+    The heartbeat runs independently of the ingest loop so a long fetch or
+    analysis cycle does not make the worker look dead to its peers.
+    """
+    def __init__(self, worker_id=None, ttl=None):
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl or LEASE_TTL_SECONDS
+        self._stop = threading.Event()
+        self._thread = None
+
+    def heartbeat(self, shard_size=None):
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            lease = db.get(WorkerLease, self.worker_id)
+            if lease is None:
+                lease = WorkerLease(worker_id=self.worker_id, hostname=socket.gethostname(),
+                                    pid=os.getpid(), started_at=now)
+                db.add(lease)
+            lease.heartbeat_at = now
+            if shard_size is not None:
+                lease.shard_size = shard_size
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Heartbeat failed for worker {self.worker_id}: {e}")
+        finally:
+            db.close()
+
+    def start(self):
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.heartbeat()
+
+    def stop(self):
+        """Stop heartbeating and drop the lease so peers rebalance immediately"""
+        self._stop.set()
+        db = SessionLocal()
+        try:
+            db.query(WorkerLease).filter(WorkerLease.worker_id == self.worker_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def assigned_feed_ids(self, feed_ids):
+        """Feeds this worker owns under the current membership"""
+        db = SessionLocal()
+        try:
+            reap_expired_leases(db, self.ttl)
+            db.commit()
+            workers = live_workers(db, self.ttl)
+        finally:
+            db.close()
+        if self.worker_id not in workers:
+            workers.append(self.worker_id)
+        return HashRing(workers).shard(feed_ids, self.worker_id)
@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import func
+from database import SessionLocal, Article, Feed, ArticleStat
+
+logger = logging.getLogger(__name__)
+
+def compute_article_stats(db):
+    """Aggregate article counts and average scores with GROUP BY queries"""
+    rows = []
+
+    total, avg_score, latest = db.query(
+        func.count(Article.id),
+        func.avg(Article.relevancy_score),
+        func.max(Article.created_at)
+    ).one()
+    rows.append(dict(scope='total', key='all', label='All Articles',
+                     article_count=total, avg_score=avg_score, latest_created_at=latest))
+
+    by_category = db.query(
+        Article.category_name,
+        func.count(Article.id),
+        func.avg(Article.relevancy_score),
+        func.max(Article.created_at)
+    ).filter(Article.category_name.isnot(None)).group_by(Article.category_name)
+    for name, count, avg, latest in by_category:
+        rows.append(dict(scope='category', key=name, label=name,
+                         article_count=count, avg_score=avg, latest_created_at=latest))
+
+    by_feed = db.query(
+        Article.feed_id,
+        Feed.name,
+        func.count(Article.id),
+        func.avg(Article.relevancy_score),
+        func.max(Article.created_at)
+    ).outerjoin(Feed, Feed.id == Article.feed_id).group_by(Article.feed_id, Feed.name)
+    for feed_id, feed_name, count, avg, latest in by_feed:
+        rows.append(dict(scope='feed', key=str(feed_id), label=feed_name or 'Unknown',
+                         article_count=count, avg_score=avg, latest_created_at=latest))
+
+    day = func.date(Article.created_at)
+    by_day = db.query(
+        day,
+        func.count(Article.id),
+        func.avg(Article.relevancy_score),
+        func.max(Article.created_at)
+    ).group_by(day)
+    for day_value, count, avg, latest in by_day:
+        rows.append(dict(scope='day', key=str(day_value), label=str(day_value),
+                         article_count=count, avg_score=avg, latest_created_at=latest))
+
+    return rows
+
+def refresh_article_stats(db=None):
+    """Recompute the article_stats table in a single transaction"""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        rows = compute_article_stats(db)
+        refreshed_at = datetime.now(timezone.utc)
+        db.query(ArticleStat).delete()
+        db.bulk_insert_mappings(ArticleStat, [dict(row, refreshed_at=refreshed_at) for row in rows])
+        db.commit()
+        logger.info(f"Refreshed article stats ({len(rows)} rows)")
+        return len(rows)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+def get_article_stats(db, scope):
+    """Return precomputed stats for a scope as {key: ArticleStat}"""
+    stats = db.query(ArticleStat).filter(ArticleStat.scope == scope).all()
+    if not stats and db.query(ArticleStat).first() is None:
+        # Table has never been populated (fresh install); build it once.
+        refresh_article_stats(db)
+        stats = db.query(ArticleStat).filter(ArticleStat.scope == scope).all()
+    return {stat.key: stat for stat in stats}
+
+def get_total_stat(db):
+    """Return the 'total' stats row, or None when there are no articles"""
+    return get_article_stats(db, 'total').get('all')
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Test tolerant parsing and repair of analysis responses.
+
+Covers fenced and preambled JSON, trailing commas, output truncated at
+max_tokens, non-JSON salvage and schema checks, then runs analyze_article
+against a stub client to check that a follow-up call asks only for the
+fields that were lost. StreamingClient replays answers as
+invoke_model_with_response_stream events to check early stopping, live
+bullets and a retry after a mid-stream error.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import json
+
+CATEGORIES = ['Economy', 'Technology']
+
+def test_clean_and_wrapped():
+    print("Testing clean, fenced and preambled JSON...")
+    from ai_output import parse_analysis
+    good = '{"bullets": ["A", "B"], "category": "Economy", "relevancy_score": 85, "author": "Jo"}'
+    parsed = parse_analysis(good, CATEGORIES)
+    assert parsed.outcome == 'clean' and not parsed.missing
+    assert parsed.fields == {'bullets': ['A', 'B'], 'category': 'Economy', 'relevancy_score': 85, 'author': 'Jo'}
+
+    for text in (f"```json\n{good}\n```", f"Here is the briefing:\n\n{good}\n\nLet me know if you need more.",
+                 f"Sure! ```\n{good}```"):
+        parsed = parse_analysis(text, CATEGORIES)
+        assert parsed.outcome == 'clean' and not parsed.missing, (text, parsed)
+    print("Wrapped JSON OK")
+
+def test_repairs():
+    print("Testing repair of damaged JSON...")
+    from ai_output import parse_analysis
+    parsed = parse_analysis('{"bullets": ["A", "B",], "category": "Economy", "relevancy_score": 80,}', CATEGORIES)
+    assert parsed.outcome == 'repaired' and not parsed.missing and parsed.fields['bullets'] == ['A', 'B']
+
+    # Braces and commas inside strings are not structure
+    parsed = parse_analysis('{"bullets": ["Growth, {they said}, ]slowed"], "category": "economy", '
+                            '"relevancy_score": "90%",}', CATEGORIES)
+    assert parsed.fields['bullets'] == ['Growth, {they said}, ]slowed'], parsed
+    assert parsed.fields['category'] == 'Economy' and parsed.fields['relevancy_score'] == 90
+
+    # Truncated at max_tokens: complete bullets survive, the cut one is dropped
+    parsed = parse_analysis('{"category": "Technology", "relevancy_score": 88, "bullets": ["First point.", '
+                            '"Second point.", "Third po', CATEGORIES)
+    assert parsed.outcome == 'repaired' and not parsed.missing, parsed
+    assert parsed.fields['bullets'] == ['First point.', 'Second point.']
+
+    parsed = parse_analysis('{"bullets": ["Only one."], "categ', CATEGORIES)
+    assert parsed.fields['bullets'] == ['Only one.'] and parsed.missing == ['category', 'relevancy_score'], parsed
+
+    parsed = parse_analysis('{"bullets": ["Only one."], "category": "Econ', CATEGORIES)
+    assert parsed.missing == ['category', 'relevancy_score'], parsed
+    print("Repairs OK")
+
+def test_salvage_and_schema():
+    print("Testing salvage and schema checks...")
+    from ai_output import parse_analysis
+    parsed = parse_analysis('category: "Economy"\nrelevancy_score: 77\n- Prices rose.\n- Rates held.', CATEGORIES)
+    assert parsed.outcome == 'salvaged' and not parsed.missing, parsed
+    assert parsed.fields['bullets'] == ['Prices rose.', 'Rates held.']
+
+    parsed = parse_analysis("I'm sorry, I can't help with that.", CATEGORIES)
+    assert parsed.outcome == 'unparsed' and parsed.missing == ['bullets', 'category', 'relevancy_score']
+
+    parsed = parse_analysis('{"bullets": [], "category": "Sports", "relevancy_score": true, "author": null}', CATEGORIES)
+    assert parsed.missing == ['bullets', 'category', 'relevancy_score'] and parsed.fields['author'] == ''
+
+    parsed = parse_analysis('{"bullets": "One\\nTwo", "category": "Economy", "relevancy_score": 140}', CATEGORIES)
+    assert parsed.fields['bullets'] == ['One', 'Two'] and parsed.fields['relevancy_score'] == 100
+    print("Salvage OK")
+
+class ScriptedClient:
+    """Returns the scripted response texts in order and records each payload"""
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.payloads = []
+
+    def invoke_model(self, **kwargs):
+        self.payloads.append(json.loads(kwargs['body']))
+        body = {'content': [{'type': 'text', 'text': self.texts.pop(0)}],
+                'usage': {'input_tokens': 100, 'output_tokens': 10}, 'stop_reason': 'end_turn'}
+        return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+def test_follow_up():
+    print("Testing follow-up calls for unrecoverable fields...")
+    from collections import namedtuple
+    from services import AIService
+    Cat = namedtuple('Cat', 'name description color')
+    categories = [Cat(name, '', '') for name in CATEGORIES]
+
+    ai = AIService()
+    ai.bedrock_client = ScriptedClient('{"bullets": ["A"], "category": "Economy", "relevancy_score": 91,}')
+    analysis = ai.analyze_article('Title', 'Author', 'Body', 'http://example.com/a', categories)
+    assert analysis['calls'] == 1 and analysis['summary'] == '• A' and analysis['relevancy_score'] == 91
+
+    client = ScriptedClient('```json\n{"bullets": ["A", "B"], "category": "Weather", "relevancy_score": 8',
+                            '"category": "Technology", "relevancy_score": 82}')
+    ai.bedrock_client = client
+    analysis = ai.analyze_article('Title', 'Author', 'Body ' * 1000, 'http://example.com/b', categories)
+    follow_up = client.payloads[1]
+    assert analysis['calls'] == 2 and analysis['category'] == 'Technology' and analysis['relevancy_score'] == 82
+    assert analysis['summary'] == '• A\n• B' and analysis['usage'] == {'input_tokens': 200, 'output_tokens': 20}
+    assert follow_up['max_tokens'] == 60 and follow_up['messages'][-1] == {'role': 'assistant', 'content': '{'}
+    assert '"bullets"' not in follow_up['messages'][0]['content']
+    print(f"  follow-up asked for category and score only, max_tokens {follow_up['max_tokens']}")
+
+    # A salvaged score below the threshold settles it: no follow-up for the lost bullets
+    client = ScriptedClient('{"category": "Economy", "relevancy_score": 30, "bullets": ["Cut off mid-sen')
+    ai.bedrock_client = client
+    analysis = ai.analyze_article('Title', 'Author', 'Body', 'http://example.com/d', categories)
+    assert analysis['calls'] == 1 and analysis['relevancy_score'] == 30 and analysis['summary'] == '', analysis
+
+    # Everything lost: score and category first, bullets only once the score keeps the article
+    client = ScriptedClient('{"bull', '"category": "Economy", "relevancy_score": 40}')
+    ai.bedrock_client = client
+    analysis = ai.analyze_article('Title', 'Author', 'Body', 'http://example.com/e', categories)
+    assert analysis['calls'] == 2 and analysis['relevancy_score'] == 40 and analysis['summary'] == ''
+    assert '"bullets"' not in client.payloads[1]['messages'][0]['content']
+
+    client = ScriptedClient('{"bull', '"category": "Economy", "relevancy_score": 90}', '"bullets": ["Kept."]}')
+    ai.bedrock_client = client
+    analysis = ai.analyze_article('Title', 'Author', 'Body', 'http://example.com/f', categories)
+    assert analysis['calls'] == 3 and analysis['summary'] == '• Kept.', analysis
+    assert client.payloads[2]['max_tokens'] == 600 and 'The category is Economy' in client.payloads[2]['messages'][0]['content']
+    print("  low scores skip the follow-up; bullets are asked for only when the article is kept")
+
+    ai.bedrock_client = ScriptedClient('No JSON here', 'still nothing')
+    analysis = ai.analyze_article('Title', 'Author', 'Body', 'http://example.com/c', categories)
+    assert analysis['summary'] == 'Analysis failed' and analysis['calls'] == 2
+    print("Follow-up OK")
+
+class StreamError(Exception):
+    """Shaped like the EventStreamError botocore raises mid-stream"""
+    def __init__(self, code):
+        super().__init__(f"An error occurred ({code})")
+        self.response = {'Error': {'Code': code}}
+
+class StreamingClient:
+    """Streams the scripted answers in 5-character deltas; fail_after breaks the first stream"""
+    def __init__(self, *texts, fail_after=None):
+        self.texts = list(texts)
+        self.fail_after = fail_after
+        self.streams = 0
+        self.sent = []  # deltas sent per stream, counting only those read
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.streams += 1
+        self.sent.append(0)
+        fail_after, self.fail_after = self.fail_after, None
+        # A broken stream is retried, so its answer is streamed again
+        text = self.texts[0] if fail_after is not None else self.texts.pop(0)
+        return {'body': self._events(text, fail_after)}
+
+    def _events(self, text, fail_after):
+        def event(data):
+            return {'chunk': {'bytes': json.dumps(data).encode('utf-8')}}
+        yield event({'type': 'message_start', 'message': {'usage': {'input_tokens': 100, 'output_tokens': 1}}})
+        for index in range(0, len(text), 5):
+            if fail_after is not None and index >= fail_after:
+                raise StreamError('modelStreamErrorException')
+            self.sent[-1] += 1
+            yield event({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': text[index:index + 5]}})
+        yield event({'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}, 'usage': {'output_tokens': len(text) // 4}})
+        yield event({'type': 'message_stop'})
+
+def test_streaming():
+    print("Testing streamed analyses...")
+    from collections import namedtuple
+    from services import AIService
+    Cat = namedtuple('Cat', 'name description color')
+    categories = [Cat(name, '', '') for name in CATEGORIES]
+    relevant = json.dumps({'category': 'Technology', 'relevancy_score': 88, 'author': 'Jo',
+                           'bullets': ['Chips got faster.', 'Prices "fell", analysts said.', 'Supply held.']})
+    rejected = json.dumps({'category': 'Economy', 'relevancy_score': 20, 'author': '',
+                           'bullets': ['Not worth reading.', 'Nor this.']})
+
+    ai = AIService()
+    ai.stream = True
+    updates = []
+    ai.bedrock_client = client = StreamingClient(relevant, fail_after=40)
+    analysis = ai.analyze_article('Title', 'Jo', 'Body', 'http://example.com/a', categories, updates.append)
+    assert client.streams == 2 and analysis['calls'] == 2, "a mid-stream error must restart the answer"
+    assert analysis['summary'] == '• Chips got faster.\n• Prices "fell", analysts said.\n• Supply held.', analysis
+    assert analysis['relevancy_score'] == 88 and analysis['author'] == 'Jo'
+    assert updates[0] == {'category': 'Technology'}, updates[0]
+    assert [len(u.get('bullets', ())) for u in updates][-3:] == [1, 2, 3], updates
+    assert updates[-1]['bullets'][1] == 'Prices "fell", analysts said.'
+
+    ai.bedrock_client = client = StreamingClient(rejected)
+    analysis = ai.analyze_article('Title', '', 'Body', 'http://example.com/b', categories)
+    total = -(-len(rejected) // 5)
+    assert analysis['relevancy_score'] == 20 and analysis['summary'] == '' and analysis['category'] == 'Economy'
+    assert client.sent[0] < total / 2, (client.sent, total)
+    assert 0 < analysis['usage']['output_tokens'] < len(rejected) // 4, analysis['usage']
+    print(f"  low score stopped the stream after {client.sent[0]} of {total} deltas")
+    print("Streaming OK")
+
+if __name__ == "__main__":
+    test_clean_and_wrapped()
+    test_repairs()
+    test_salvage_and_schema()
+    test_follow_up()
+    test_streaming()
+    print("\nAll AI output tests passed!")
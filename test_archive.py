@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Test recording and replaying ingest traffic (archive.py).
+
+Records a NewsProcessor run against a local HTTP server and a stub
+Bedrock client, then replays it with the server stopped and no Bedrock
+client at all, and checks that the replay saves the same articles.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import json
+import tempfile
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+workdir = tempfile.mkdtemp(prefix='rss_archive_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+ITEMS = 4
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """A feed with short descriptions, and article pages long enough to be extracted"""
+    def do_GET(self):
+        port = self.server.server_address[1]
+        if self.path == '/feed.xml':
+            now = format_datetime(datetime.now(timezone.utc))
+            items = ''.join(f"<item><title>Item {i}</title><link>http://127.0.0.1:{port}/story/{i}</link>"
+                            f"<description>Short {i}</description><pubDate>{now}</pubDate></item>" for i in range(ITEMS))
+            body, content_type = f"<rss version='2.0'><channel><title>Local</title>{items}</channel></rss>", 'application/rss+xml'
+        else:
+            paragraphs = ''.join(f"<p>Paragraph {j} of {self.path}, with enough words to be kept as text.</p>" for j in range(15))
+            body, content_type = f"<html><body><article>{paragraphs}</article></body></html>", 'text/html'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+class StubBedrock:
+    """Scores an article by whether its prompt carries the extracted page text"""
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        prompt = json.loads(kwargs['body'])['messages'][0]['content']
+        answer = {'bullets': [f"Call {self.calls}"], 'category': 'Tech',
+                  'relevancy_score': 90 if 'Paragraph' in prompt else 10, 'author': ''}
+        return {'body': io.BytesIO(json.dumps({'content': [{'text': json.dumps(answer)}]}).encode('utf-8'))}
+
+def saved_articles():
+    from database import SessionLocal, Article
+    db = SessionLocal()
+    try:
+        return sorted((a.title, a.summary, a.relevancy_score, a.category_name) for a in db.query(Article))
+    finally:
+        db.close()
+
+def test_blob_store():
+    print("Testing the archive store...")
+    from archive import FetchArchive, ArchiveMiss
+    path = os.path.join(workdir, 'store')
+    archive = FetchArchive(path, 'record')
+    archive.store('feed', 'http://a/feed', b'same bytes')
+    archive.store('page', 'http://a/page', b'same bytes')
+    archive.close()
+    blobs = [name for _, _, names in os.walk(os.path.join(path, 'blobs')) for name in names]
+    assert len(blobs) == 1, "identical responses share one blob"
+
+    replay = FetchArchive(path, 'replay')
+    assert replay.started_at == archive.started_at
+    assert replay.load('page', 'http://a/page') == b'same bytes'
+    try:
+        replay.load('page', 'http://a/missing')
+        assert False, "an unrecorded request must not fall through to the network"
+    except ArchiveMiss:
+        pass
+    print("Archive store OK")
+
+def test_record_replay_round_trip():
+    print("Testing record and replay of an ingest run...")
+    from archive import FetchArchive, attach_archive
+    from database import SessionLocal, Category, Feed
+    from services import NewsProcessor
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    db = SessionLocal()
+    db.add(Feed(name='Local', url=f"http://127.0.0.1:{server.server_address[1]}/feed.xml", active=True))
+    db.add(Category(name='Tech', color='#000000', active=True))
+    db.commit()
+    db.close()
+
+    path = os.path.join(workdir, 'run')
+    processor = NewsProcessor()
+    processor.ai_service.bedrock_client = StubBedrock()
+    processor.analyze_delay = 0
+    archive = FetchArchive(path, 'record')
+    attach_archive(processor, archive)
+    processor.process_feeds()
+    archive.close()
+    server.shutdown()
+    server.server_close()
+    recorded = saved_articles()
+    assert len(recorded) == ITEMS, recorded
+    assert all(score == 90 for _, _, score, _ in recorded), "page text was extracted before analysis"
+
+    processor.clear_all_articles()
+    processor = NewsProcessor()
+    processor.ai_service.bedrock_client = None  # any live Bedrock call would fail
+    archive = FetchArchive(path, 'replay')
+    attach_archive(processor, archive)
+    processor.process_feeds()
+    archive.close()
+    assert saved_articles() == recorded, "the replay reproduces the recorded run"
+    print("Round trip OK")
+
+if __name__ == "__main__":
+    test_blob_store()
+    test_record_replay_round_trip()
+    print("\nAll archive tests passed!")
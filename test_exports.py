@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Test article exports (exporters.ArticleExporter).
+
+Seeds a throwaway SQLite database and checks that incremental exports
+resume exactly after their high-water mark, including rows that share a
+created_at, and that a failed run neither moves the mark nor leaves a
+file behind.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import csv
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+workdir = tempfile.mkdtemp(prefix='rss_exports_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+os.environ.pop('RSS_WATERMARK_SETTLE_SECONDS', None)
+
+def add_articles(first, count, age=timedelta(minutes=5), created_at=None):
+    """Insert articles first..first+count-1, all with the same created_at (naive UTC); returns it"""
+    from database import SessionLocal, Article
+    created_at = created_at or datetime.now(timezone.utc).replace(tzinfo=None) - age
+    db = SessionLocal()
+    for i in range(first, first + count):
+        db.add(Article(title=f"Article {i}", url=f"http://example.com/{i}", relevancy_score=5, created_at=created_at))
+    db.commit()
+    db.close()
+    return created_at
+
+def exporter():
+    from exporters import ArticleExporter
+    exp = ArticleExporter(output_dir=os.path.join(workdir, 'exports'))
+    exp.batch_size = 2
+    return exp
+
+def read_titles(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['title'] for line in f]
+
+def test_incremental_resume():
+    print("Testing incremental export resume...")
+    first_created_at = add_articles(0, 5)
+    path, count = exporter().export('jsonl', path=os.path.join(workdir, 'run1.jsonl'), incremental=True)
+    assert count == 5 and read_titles(path) == [f"Article {i}" for i in range(5)]
+    assert exporter().export('jsonl', incremental=True) == (None, 0), "nothing new"
+
+    # Same created_at as the first batch: the id breaks the tie
+    add_articles(5, 3, created_at=first_created_at)
+    add_articles(8, 1, age=timedelta(seconds=5))  # still inside the settle window
+    path, count = exporter().export('jsonl', path=os.path.join(workdir, 'run2.jsonl'), incremental=True)
+    assert read_titles(path) == ['Article 5', 'Article 6', 'Article 7'], read_titles(path)
+
+    # Marks are per export name
+    path, count = exporter().export('jsonl', path=os.path.join(workdir, 'other.jsonl'), incremental=True, name='other')
+    assert count == 8
+    print("Resume OK")
+
+def test_failed_export_keeps_mark():
+    print("Testing a failed incremental export...")
+    import exporters
+    add_articles(100, 5, age=timedelta(minutes=3))
+    target = os.path.join(workdir, 'failed.jsonl')
+    write_batch = exporters.JsonlWriter.write_batch
+    batches = []
+    def failing(self, rows):
+        batches.append(rows)
+        if len(batches) > 1:
+            raise OSError("disk full")
+        write_batch(self, rows)
+    exporters.JsonlWriter.write_batch = failing
+    try:
+        exporter().export('jsonl', path=target, incremental=True)
+        assert False, "the write error should propagate"
+    except OSError:
+        pass
+    finally:
+        exporters.JsonlWriter.write_batch = write_batch
+    assert not os.path.exists(target) and not os.path.exists(f"{target}.tmp")
+
+    path, count = exporter().export('jsonl', path=target, incremental=True)
+    assert read_titles(path) == [f"Article {i}" for i in range(100, 105)], "the retry resumes from the old mark"
+    print("Failed export OK")
+
+def test_full_csv_export():
+    print("Testing a full CSV export...")
+    path, count = exporter().export('csv', path=os.path.join(workdir, 'all.csv'))
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert count == len(rows) == 14
+    assert 'content' not in rows[0]
+    print("CSV OK")
+
+if __name__ == "__main__":
+    test_incremental_resume()
+    test_failed_export_keeps_mark()
+    test_full_csv_export()
+    print("\nAll export tests passed!")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Test full-text extraction (extraction.ContentExtractor).
+
+Pages come from a stub HTTP session, so no network access is needed;
+parsing still goes through the process pool. Covers the page cache,
+ETag revalidation (304), the stale-text fallback when a refetch fails
+and stopping between batches when the job is cancelled.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+workdir = tempfile.mkdtemp(prefix='rss_extract_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+def page(body):
+    return f"<html><body><nav>Menu</nav><article><p>{body} {'words ' * 20}</p></article></body></html>"
+
+class StubResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {'Content-Type': 'text/html; charset=utf-8', **(headers or {})}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class StubSession:
+    """Answers from a {url: callable(headers) -> StubResponse} table and records each request"""
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self.lock:
+            self.requests.append((url, dict(headers or {})))
+        return self.pages[url](headers or {})
+
+class StubFetcher:
+    timeout = 5
+
+    def __init__(self):
+        self.session = StubSession()
+
+class CountingProgress:
+    def __init__(self):
+        self.counts = {}
+        self.cancelled = threading.Event()
+
+    def incr(self, counter, amount=1):
+        self.counts[counter] = self.counts.get(counter, 0) + amount
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+def age_cache(url, hours):
+    from database import SessionLocal, ExtractedPage
+    db = SessionLocal()
+    row = db.get(ExtractedPage, url)
+    row.fetched_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+    db.commit()
+    fetched_at = row.fetched_at
+    db.close()
+    return fetched_at
+
+def cached_row(url):
+    from database import SessionLocal, ExtractedPage
+    db = SessionLocal()
+    try:
+        row = db.get(ExtractedPage, url)
+        return (row.text, row.etag, row.fetched_at) if row else None
+    finally:
+        db.close()
+
+def test_cache_and_revalidation():
+    print("Testing the page cache and ETag revalidation...")
+    from extraction import ContentExtractor
+    fetcher = StubFetcher()
+    extractor = ContentExtractor(fetcher)
+    url = 'http://example.com/story'
+    fetcher.session.pages[url] = lambda headers: StubResponse(200, page('Original story'), {'ETag': '"v1"'})
+
+    texts = extractor.extract([url])
+    assert texts[url].startswith('Original story') and 'Menu' not in texts[url]
+    assert cached_row(url)[1] == '"v1"'
+
+    # Fresh cache: no request at all
+    progress = CountingProgress()
+    assert extractor.extract([url], progress) == texts
+    assert len(fetcher.session.requests) == 1 and progress.counts['cache_hits'] == 1
+
+    # Expired: revalidated with the ETag, and a 304 keeps the cached text
+    old = age_cache(url, 48)
+    fetcher.session.pages[url] = lambda headers: StubResponse(304 if headers.get('If-None-Match') == '"v1"' else 200,
+                                                               page('Should not be parsed'))
+    assert extractor.extract([url]) == texts
+    assert fetcher.session.requests[-1][1]['If-None-Match'] == '"v1"'
+    text, etag, fetched_at = cached_row(url)
+    assert text == texts[url] and etag == '"v1"' and fetched_at > old, "a 304 renews the cache entry"
+    print("Cache and 304 OK")
+
+def test_stale_fallback():
+    print("Testing the stale fallback...")
+    from extraction import ContentExtractor
+    fetcher = StubFetcher()
+    extractor = ContentExtractor(fetcher)
+    url = 'http://example.com/flaky'
+    fetcher.session.pages[url] = lambda headers: StubResponse(200, page('Cached text'))
+    texts = extractor.extract([url])
+    old = age_cache(url, 48)
+
+    def down(headers):
+        raise ConnectionError("host unreachable")
+    fetcher.session.pages[url] = down
+    progress = CountingProgress()
+    assert extractor.extract([url], progress) == texts, "stale text beats none"
+    assert progress.counts['extract_failures'] == 1
+    assert cached_row(url)[2] == old, "fetched_at is left alone so the next run retries"
+
+    # Without a cached copy a failure just leaves the URL out
+    fetcher.session.pages['http://example.com/new'] = lambda headers: StubResponse(500)
+    assert extractor.extract(['http://example.com/new']) == {}
+    print("Stale fallback OK")
+
+def test_cancel_between_batches():
+    print("Testing cancellation between batches...")
+    from extraction import ContentExtractor
+    fetcher = StubFetcher()
+    extractor = ContentExtractor(fetcher)
+    extractor.batch_size = 2
+    progress = CountingProgress()
+    urls = [f"http://example.com/batch/{i}" for i in range(6)]
+    def cancel_on_request(headers):
+        progress.cancelled.set()  # the job is cancelled while the first batch is in flight
+        return StubResponse(200, page('Batch page'))
+    for url in urls:
+        fetcher.session.pages[url] = cancel_on_request
+
+    texts = extractor.extract(urls, progress)
+    assert len(fetcher.session.requests) == 2, fetcher.session.requests
+    assert sorted(texts) == urls[:2], "pages already fetched are still returned and cached"
+    assert cached_row(urls[1]) is not None and cached_row(urls[2]) is None
+    print("Cancellation OK")
+
+if __name__ == "__main__":
+    test_cache_and_revalidation()
+    test_stale_fallback()
+    test_cancel_between_batches()
+    print("\nAll extraction tests passed!")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Test incremental digests (OutputGenerator.generate_incremental).
+
+Seeds a throwaway SQLite database and checks that articles younger than
+the settle window wait for a later run, that the high-water mark picks
+up exactly where the last run stopped, and that a run which fails part
+way leaves the rolling digest and the mark as they were.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+workdir = tempfile.mkdtemp(prefix='rss_incremental_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+os.environ.pop('RSS_WATERMARK_SETTLE_SECONDS', None)
+
+def add_articles(names, age):
+    """Insert articles created `age` ago (created_at is naive UTC)"""
+    from database import SessionLocal, Article
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None) - age
+    db = SessionLocal()
+    for name in names:
+        db.add(Article(title=name, url=f"http://example.com/{name}", summary=f"About {name}",
+                       relevancy_score=5, created_at=created_at))
+    db.commit()
+    db.close()
+
+def generator():
+    from output_generators import OutputGenerator
+    gen = OutputGenerator()
+    gen.output_dir = os.path.join(workdir, 'output')
+    return gen
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def mark():
+    from database import SessionLocal
+    from watermarks import load_watermark
+    db = SessionLocal()
+    try:
+        row = load_watermark(db, 'digest:test')
+        return (row.last_created_at, row.last_article_id) if row else None
+    finally:
+        db.close()
+
+def test_settle_window_and_resume():
+    print("Testing the settle window and watermark resume...")
+    from database import SessionLocal, Article
+    add_articles(['settled-1', 'settled-2'], timedelta(minutes=5))
+    add_articles(['fresh-1'], timedelta(seconds=5))
+
+    files = generator().generate_incremental('test', formats=('html',))
+    html = read(files['html'])
+    assert 'settled-1' in html and 'settled-2' in html
+    assert 'fresh-1' not in html, "articles inside the settle window wait for the next run"
+    assert '2 new articles' in html
+    first_mark = mark()
+
+    assert generator().generate_incremental('test', formats=('html',)) == {}
+    assert mark() == first_mark
+
+    # Once settled, the fresh article lands in a second section of the same file
+    db = SessionLocal()
+    db.query(Article).filter(Article.title == 'fresh-1').update(
+        {Article.created_at: datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=2)})
+    db.commit()
+    db.close()
+    files = generator().generate_incremental('test', formats=('html',))
+    html = read(files['html'])
+    assert html.count('>settled-1<') == 1 and html.count('>fresh-1<') == 1
+    assert '1 new article' in html
+    assert html.count('</html>') == 1 and html.rstrip().endswith('</html>'), "one footer, at the end"
+    assert mark() != first_mark
+    print("Settle window OK")
+
+def test_failed_run_restores_digest():
+    print("Testing a run that fails part way...")
+    import output_generators
+    add_articles(['doomed-1', 'doomed-2'], timedelta(seconds=90))  # after the mark, already settled
+    path = os.path.join(workdir, 'output', 'digests', f"test_{datetime.now().strftime('%Y%m%d')}.html")
+    before, before_mark = read(path), mark()
+
+    build = output_generators.build_report_article
+    calls = []
+    def failing(article, feed_names):
+        calls.append(article.title)
+        if len(calls) > 1:
+            raise RuntimeError("render failed")
+        return build(article, feed_names)
+    output_generators.build_report_article = failing
+    try:
+        generator().generate_incremental('test', formats=('html',))
+        assert False, "the render error should propagate"
+    except RuntimeError:
+        pass
+    finally:
+        output_generators.build_report_article = build
+    assert read(path) == before, "the partial section is removed and the old footer put back"
+    assert mark() == before_mark
+
+    files = generator().generate_incremental('test', formats=('html',))
+    html = read(files['html'])
+    assert html.count('>doomed-1<') == 1 and html.count('>doomed-2<') == 1
+    assert html.count('</html>') == 1
+    print("Failed run OK")
+
+if __name__ == "__main__":
+    test_settle_window_and_resume()
+    test_failed_run_restores_digest()
+    print("\nAll incremental digest tests passed!")
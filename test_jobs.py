@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Test background jobs shared through the jobs table (jobs.py).
+
+Each JobManager stands in for one web worker; they share a temporary
+SQLite database. The checks cover conflicting submits (including a race
+between workers), a cancel requested from another worker, the stale
+cutoff for crashed jobs and the heartbeat that keeps quiet jobs fresh.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+workdir = tempfile.mkdtemp(prefix='rss_jobs_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+def blocking(release):
+    """Job body that reports progress until released or cancelled"""
+    def func(progress):
+        while not release.is_set() and not progress.is_cancelled():
+            progress.item_done()  # flushes, which picks up cancels from other workers
+            time.sleep(0.02)
+        return 'done'
+    return func
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_submit_conflicts():
+    print("Testing conflicting submits across workers...")
+    from jobs import JobManager
+    worker_a, worker_b = JobManager(), JobManager()
+    release = threading.Event()
+    job_id, started = worker_a.submit('run_now', blocking(release))
+    assert started
+    assert worker_b.submit('refresh_news', blocking(release)) == (job_id, False), "another worker must see the job"
+    assert worker_a.submit('run_now', blocking(release)) == (job_id, False)
+    other, started = worker_b.submit('stats', blocking(release), conflicts=('stats',))
+    assert started and other != job_id, "only the listed kinds conflict"
+    release.set()
+    wait_for(lambda: worker_a.get(job_id)['status'] == 'completed' and worker_b.get(other)['status'] == 'completed')
+
+    # Workers racing for the same kind: exactly one claim wins
+    release = threading.Event()
+    managers = [JobManager() for _ in range(8)]
+    results = []
+    barrier = threading.Barrier(len(managers))
+    def race(manager):
+        barrier.wait()
+        results.append(manager.submit('fetch', blocking(release), conflicts=('fetch',)))
+    threads = [threading.Thread(target=race, args=(manager,)) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [job_id for job_id, started in results if started]
+    assert len(winners) == 1, results
+    assert all(job_id == winners[0] for job_id, _ in results), results
+    release.set()
+    wait_for(lambda: managers[0].find_running() is None)
+    print(f"  {len(managers)} workers raced, 1 started job {winners[0]}")
+    print("Submit conflicts OK")
+
+def test_cancel_across_workers():
+    print("Testing cancel from another worker...")
+    from database import SessionLocal, JobRecord
+    from jobs import JobManager, Job
+    worker_a, worker_b = JobManager(), JobManager()
+    job_id, started = worker_a.submit('run_now', blocking(threading.Event()))
+    assert started
+    assert worker_b.cancel(job_id)
+    wait_for(lambda: worker_a.get(job_id)['status'] == 'cancelled')
+    assert worker_b.get(job_id)['cancel_requested']
+
+    # A snapshot written after another worker's cancel must not clear it
+    job = Job('fetch')
+    assert job.claim()
+    db = SessionLocal()
+    db.get(JobRecord, job.id).cancel_requested = True
+    db.commit()
+    db.close()
+    job.flush()
+    db = SessionLocal()
+    assert db.get(JobRecord, job.id).cancel_requested and job.is_cancelled()
+    db.close()
+    job.status = 'cancelled'
+    job.flush()
+    print("Cancel OK")
+
+def test_stale_cutoff_and_heartbeat():
+    print("Testing the stale cutoff and heartbeat...")
+    from database import SessionLocal, JobRecord
+    from jobs import JobManager, Job, STALE_AFTER, HEARTBEAT_SECONDS
+    assert STALE_AFTER.total_seconds() >= 10 * HEARTBEAT_SECONDS
+    manager = JobManager()
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    db.add(JobRecord(id='crashed', kind='run_now', status='running', started_at=now - STALE_AFTER * 2,
+                     updated_at=now - STALE_AFTER - timedelta(minutes=1)))
+    db.commit()
+    assert manager.find_running() is None, "a job silent for longer than STALE_AFTER is dead"
+    db.get(JobRecord, 'crashed').updated_at = now - timedelta(minutes=1)
+    db.commit()
+    assert manager.find_running() == 'crashed'
+    assert manager.submit('run_now', blocking(threading.Event()))[1] is False
+    db.get(JobRecord, 'crashed').status = 'failed'
+    db.commit()
+    db.close()
+
+    # No progress events at all: the heartbeat alone keeps updated_at moving
+    job = Job('analyze')
+    assert job.claim()
+    job.start_heartbeat(interval=0.05)
+    db = SessionLocal()
+    first = db.get(JobRecord, job.id).updated_at
+    db.close()
+    time.sleep(0.3)
+    job.stop_heartbeat()
+    db = SessionLocal()
+    assert db.get(JobRecord, job.id).updated_at > first
+    db.close()
+    job.status = 'completed'
+    job.flush()
+    print("Stale cutoff OK")
+
+if __name__ == "__main__":
+    test_submit_conflicts()
+    test_cancel_across_workers()
+    test_stale_cutoff_and_heartbeat()
+    print("\nAll job tests passed!")
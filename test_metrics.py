@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test the Prometheus text rendering of the metrics registry (metrics.py)"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import Registry
+
+def samples(text):
+    """{sample name with labels: value} for the non-comment lines of an exposition"""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = value
+    return result
+
+def test_histogram_buckets():
+    print("Testing histogram buckets...")
+    registry = Registry()
+    latency = registry.histogram('test_seconds', 'Test latency', ['stage'], buckets=(1.0, 0.1, 0.5))
+    stage = latency.labels('fetch')
+    for value in (0.05, 0.1, 0.3, 0.5, 2.0):
+        stage.observe(value)
+    text = registry.render()
+    lines = text.splitlines()
+    assert lines[:2] == ['# HELP test_seconds Test latency', '# TYPE test_seconds histogram']
+    values = samples(text)
+    # Cumulative counts, in ascending bound order; a value equal to a bound falls in that bucket
+    buckets = [(name, value) for name, value in values.items() if name.startswith('test_seconds_bucket')]
+    assert buckets == [
+        ('test_seconds_bucket{stage="fetch",le="0.1"}', '2'),
+        ('test_seconds_bucket{stage="fetch",le="0.5"}', '4'),
+        ('test_seconds_bucket{stage="fetch",le="1.0"}', '4'),
+        ('test_seconds_bucket{stage="fetch",le="+Inf"}', '5'),
+    ], buckets
+    assert values['test_seconds_count{stage="fetch"}'] == '5'
+    assert abs(float(values['test_seconds_sum{stage="fetch"}']) - 2.95) < 1e-9
+
+    plain = registry.histogram('test_plain_seconds', 'No labels', buckets=(1,))
+    plain.observe(3)
+    values = samples(registry.render())
+    assert values['test_plain_seconds_bucket{le="1"}'] == '0'
+    assert values['test_plain_seconds_bucket{le="+Inf"}'] == '1'
+    assert values['test_plain_seconds_count'] == '1'
+    print("Histogram OK")
+
+def test_label_escaping():
+    print("Testing label escaping...")
+    registry = Registry()
+    errors = registry.counter('test_errors_total', 'Errors', ['reason'])
+    errors.labels('say "hi"\\now\nthen').inc()
+    errors.labels(404).inc(2)
+    values = samples(registry.render())
+    assert values['test_errors_total{reason="say \\"hi\\"\\\\now\\nthen"}'] == '1', values
+    assert values['test_errors_total{reason="404"}'] == '2', "label values are strings"
+    assert len(registry.render().splitlines()) == 4, "an escaped newline never splits a sample"
+
+    try:
+        errors.labels('a', 'b')
+        assert False, "wrong label count should be rejected"
+    except ValueError:
+        pass
+    assert registry.counter('test_errors_total', 'Errors', ['reason']) is errors, "registration is idempotent"
+    print("Label escaping OK")
+
+if __name__ == "__main__":
+    test_histogram_buckets()
+    test_label_escaping()
+    print("\nAll metrics tests passed!")
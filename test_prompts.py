@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Test prompt compaction, adaptive max_tokens and prefix caching (prompts.py).
+
+CachingStubClient stands in for bedrock-runtime with prompt caching: a
+system block marked with cache_control is written to its cache on first
+sight and read from it afterwards. Usage is reported the way Bedrock does:
+input_tokens for the uncached part, cache_creation_input_tokens and
+cache_read_input_tokens for the prefix.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import json
+from collections import namedtuple
+
+LEAD = "Officials said on Tuesday that inflation fell to 3.1% in March, the lowest level in two years."
+QUOTE = '"We are confident the trend will continue through the summer," the central bank governor said.'
+
+def long_article():
+    filler = [f"Filler sentence number {i} talks about nothing in particular at all today." for i in range(200)]
+    paragraphs = [LEAD] + filler + [
+        "Economists expect inflation to ease further as energy prices decline and wage growth slows.",
+        QUOTE,
+        "The post Inflation cools appeared first on Example News.",
+    ]
+    return "<p>" + "</p><p>".join(paragraphs) + "</p><p>Share this:</p>"
+
+def test_clean_content():
+    print("Testing markup and boilerplate removal...")
+    from prompts import clean_content
+    html = ('<ol><li><a href="https://news.google.com/rss/articles/CBMiWkFVX3lx?oc=5">Netflix to buy Warner Bros '
+            'for $72bn</a>&nbsp;&nbsp;<font color="#6f6f6f">BBC</font></li></ol>'
+            '<p>Read more</p><p>The post Netflix deal appeared first on Example.</p>')
+    text = clean_content(html)
+    assert text == "Netflix to buy Warner Bros for $72bn BBC", repr(text)
+    assert clean_content("Plain   text\n\nPlain text\nSecond line") == "Plain text\nSecond line"
+    print("Clean content OK")
+
+def test_compaction():
+    print("Testing sentence selection within a token budget...")
+    from prompts import PromptBuilder
+    builder = PromptBuilder(content_tokens=110)
+    text = builder.compact(long_article(), 'Inflation falls to 3.1%')
+    assert builder.estimate_tokens(text) <= 110, text
+    assert text.startswith(LEAD) and QUOTE in text, text
+    assert text.count("Filler sentence") <= 1 and "appeared first" not in text, text
+
+    short = "<p>Short item with <b>bold</b> text.</p>"
+    assert builder.compact(short) == "Short item with bold text."
+
+    prompt = builder.build('Inflation falls', 'Reporter', long_article(), ['Economy', 'Technology'])
+    assert 'Match against Categories: Economy, Technology' in prompt.system
+    assert prompt.text.startswith('Title: Inflation falls') and 'Categories' not in prompt.text
+    assert prompt.saved_tokens > 400 and prompt.max_tokens == 1200, prompt[2:]
+    print(f"  prompt ~{prompt.tokens} tokens, ~{prompt.saved_tokens} saved against content[:2500]")
+    print("Compaction OK")
+
+def test_adaptive_max_tokens():
+    print("Testing adaptive max_tokens...")
+    from prompts import PromptBuilder
+    builder = PromptBuilder()
+    prompt = builder.build('Title', '', 'Body text.', ['Economy'])
+    for tokens in range(180, 280, 5):
+        builder.observe(prompt, {'input_tokens': (len(prompt.system) + len(prompt.text)) // 3, 'output_tokens': tokens}, 'end_turn')
+    assert abs(builder.chars_per_token - 3.0) < 0.5, builder.chars_per_token
+    sized = builder.max_tokens()
+    assert sized == 400, sized  # p99 275 * 1.3, rounded up to 50
+    print(f"  after 20 answers of 180-275 tokens: max_tokens {sized}")
+
+    truncated = builder.build('Title', '', 'Body text.', ['Economy'])
+    for _ in range(3):
+        builder.observe(truncated, {'input_tokens': 100, 'output_tokens': truncated.max_tokens}, 'max_tokens')
+    assert builder.max_tokens() > sized, "truncated answers must raise the cap"
+    print(f"  after truncated answers: max_tokens {builder.max_tokens()}")
+    print("Adaptive max_tokens OK")
+
+class CachingStubClient:
+    """invoke_model stand-in that caches cache_control system blocks and counts prefix tokens"""
+    def __init__(self):
+        self.cache = set()
+        self.cached_tokens = 0
+        self.uncached_prefix_tokens = 0
+        self.written_tokens = 0
+
+    def invoke_model(self, **kwargs):
+        payload = json.loads(kwargs['body'])
+        prefix = ''.join(block['text'] for block in payload.get('system', []))
+        cacheable = any('cache_control' in block for block in payload.get('system', []))
+        prefix_tokens = len(prefix) // 4
+        usage = {'input_tokens': sum(len(m['content']) for m in payload['messages']) // 4, 'output_tokens': 40}
+        if cacheable and prefix in self.cache:
+            usage['cache_read_input_tokens'] = prefix_tokens
+            self.cached_tokens += prefix_tokens
+        elif cacheable:
+            self.cache.add(prefix)
+            usage['cache_creation_input_tokens'] = prefix_tokens
+            self.written_tokens += prefix_tokens
+        else:
+            usage['input_tokens'] += prefix_tokens
+            self.uncached_prefix_tokens += prefix_tokens
+        text = json.dumps({'bullets': ['One.', 'Two.'], 'category': 'Economy', 'relevancy_score': 90, 'author': ''})
+        body = {'content': [{'type': 'text', 'text': text}], 'usage': usage, 'stop_reason': 'end_turn'}
+        return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+def test_prefix_caching():
+    print("Testing the cached system prefix...")
+    from prompts import prompt_caching_enabled
+    from services import AIService
+    assert prompt_caching_enabled('anthropic.claude-3-5-haiku-20241022-v1:0')
+    assert not prompt_caching_enabled('anthropic.claude-3-haiku-20240307-v1:0')
+
+    Cat = namedtuple('Cat', 'name description color')
+    categories = [Cat('Technology', '', ''), Cat('Economy', '', '')]
+    ai = AIService()
+    ai.prompts.cache_prefix = True
+    client = ai.bedrock_client = CachingStubClient()
+    usage = {}
+    for n in range(10):
+        analysis = ai.analyze_article(f'Story {n}', '', f'<p>Body of story {n}.</p>', f'http://example.com/{n}',
+                                      categories if n % 2 else list(reversed(categories)))
+        for key, value in analysis['usage'].items():
+            usage[key] = usage.get(key, 0) + value
+    assert ai.prompts.system_builds == 1, "row order alone must not rebuild the prefix"
+    assert client.written_tokens and client.cached_tokens == 9 * client.written_tokens
+    assert usage['cache_read_input_tokens'] == client.cached_tokens and client.uncached_prefix_tokens == 0
+    print(f"  10 calls: prefix written once ({client.written_tokens} tokens), {client.cached_tokens} tokens read from cache")
+
+    categories.append(Cat('Health', '', ''))
+    ai.analyze_article('Story', '', 'Body.', 'http://example.com/x', categories)
+    assert ai.prompts.system_builds == 2 and len(client.cache) == 2, "a new category must rebuild the prefix"
+
+    ai.prompts.cache_prefix = False
+    ai.analyze_article('Story', '', 'Body.', 'http://example.com/y', categories)
+    assert client.uncached_prefix_tokens > 0, "without caching the prefix is billed as input"
+
+    from run_history import estimate_cost
+    cached = estimate_cost(1000, 0, cache_read_tokens=9000)
+    uncached = estimate_cost(10000, 0)
+    assert cached < uncached / 4, (cached, uncached)
+    print(f"  input cost for 10k prompt tokens, 90% cached: ${cached:.6f} vs ${uncached:.6f} uncached")
+    print("Prefix caching OK")
+
+if __name__ == "__main__":
+    test_clean_content()
+    test_compaction()
+    test_adaptive_max_tokens()
+    test_prefix_caching()
+    print("\nAll prompt tests passed!")
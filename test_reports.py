@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Test report generation (output_generators.OutputGenerator).
+
+Seeds a throwaway SQLite database and renders reports into a temp
+output directory; no Bedrock access is needed.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+from datetime import datetime
+
+workdir = tempfile.mkdtemp(prefix='rss_reports_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+# (title, published, score)
+SEED = [
+    ('January low', datetime(2026, 1, 10, 8, 0), 3),
+    ('January high', datetime(2026, 1, 20, 23, 30), 9),
+    ('February', datetime(2026, 2, 1, 0, 0), 7),
+    ('December', datetime(2025, 12, 31, 23, 59), 8),
+]
+
+def seed():
+    from database import SessionLocal, Article, Feed
+    db = SessionLocal()
+    feed = Feed(name='Example', url='http://example.com/feed.xml')
+    db.add(feed)
+    db.flush()
+    for i, (title, published, score) in enumerate(SEED):
+        db.add(Article(title=title, url=f"http://example.com/{i}", relevancy_score=score, feed_id=feed.id, author='Smith &amp; Jones',
+                       published_date=published, summary=f"**Key Points:**\n• Point {i}"))
+    db.commit()
+    db.close()
+
+def generator():
+    from output_generators import OutputGenerator
+    gen = OutputGenerator()
+    gen.output_dir = os.path.join(workdir, 'output')
+    return gen
+
+def test_date_range_filter():
+    print("Testing date-range reports...")
+    report = ''.join(generator().iter_report('markdown', '2026-01-01', '2026-01-31'))
+    titles = [line[len('### ['):line.index(']')] for line in report.splitlines() if line.startswith('### [')]
+    assert titles == ['January high', 'January low'], titles  # whole end day included, by relevancy
+    assert 'Total Articles: 2' in report
+    assert 'Date Range: 2026-01-01 to 2026-01-31' in report
+
+    report = ''.join(generator().iter_report('markdown'))
+    assert 'Total Articles: 4' in report
+    print("Date range OK")
+
+def test_single_pass_formats():
+    print("Testing multi-format rendering...")
+    import output_generators
+    gen = generator()
+    scans = []
+    stream_rows = gen._stream_rows
+    gen._stream_rows = lambda query: scans.append(1) or stream_rows(query)
+    files = gen.generate_reports(formats=('markdown', 'html', 'text'))
+    assert len(scans) == 1, "every format comes from one scan of the articles"
+    contents = {}
+    for fmt, path in files.items():
+        with open(path, encoding='utf-8') as f:
+            contents[fmt] = f.read()
+    order = [title for title, _, _ in sorted(SEED, key=lambda row: -row[2])]
+    for fmt, text in contents.items():
+        positions = [text.index(title) for title in order]
+        assert positions == sorted(positions), f"{fmt} lists articles by relevancy"
+    # Entities from the feed are decoded once, then escaped only for HTML
+    assert 'Smith & Jones' in contents['markdown'] and 'Smith & Jones' in contents['text']
+    assert 'Smith &amp; Jones' in contents['html'] and '&amp;amp;' not in contents['html']
+    assert output_generators.report_macros('html') is output_generators.report_macros('html'), \
+        "templates are compiled once per process"
+    print("Multi-format OK")
+
+def test_report_cache():
+    print("Testing the report cache...")
+    from database import SessionLocal, Article
+    from report_cache import ReportCache, bump_content_revision
+    cache = ReportCache(generator())
+
+    path, chunks = cache.open_report('markdown')
+    assert path is None, "first request is a miss"
+    first = ''.join(chunks)
+    path, chunks = cache.open_report('markdown')
+    assert chunks is None and open(path, encoding='utf-8').read() == first, "unchanged data is a hit"
+    assert cache.open_report('markdown', '2026-01-01', '2026-01-31')[0] is None, "each date range has its own entry"
+
+    # A new article changes the data version
+    db = SessionLocal()
+    db.add(Article(title='Breaking', url='http://example.com/breaking', relevancy_score=10,
+                   published_date=datetime(2026, 3, 1)))
+    db.commit()
+    path, chunks = cache.open_report('markdown')
+    assert path is None
+    assert 'Breaking' in ''.join(chunks)
+    assert cache.open_report('markdown')[0] is not None
+
+    # So does an in-place edit, once it bumps the content revision
+    db.query(Article).filter(Article.title == 'Breaking').update({Article.summary: 'Edited summary'})
+    db.commit()
+    assert cache.open_report('markdown')[0] is not None, "the fingerprint does not read summaries"
+    bump_content_revision(db)
+    db.commit()
+    db.close()
+    path, chunks = cache.open_report('markdown')
+    assert path is None and 'Edited summary' in ''.join(chunks)
+
+    # A client that disconnects mid-stream leaves nothing behind
+    db = SessionLocal()
+    bump_content_revision(db)
+    db.commit()
+    db.close()
+    path, chunks = cache.open_report('markdown')
+    next(chunks)
+    chunks.close()
+    assert cache.open_report('markdown')[0] is None, "a partial report is never cached"
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith('.tmp')]
+    print("Report cache OK")
+
+if __name__ == "__main__":
+    seed()
+    test_date_range_filter()
+    test_single_pass_formats()
+    test_report_cache()
+    print("\nAll report tests passed!")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Test the Bedrock resilience layer against a local fault-injecting stub.
+
+FaultyBedrockClient stands in for the bedrock-runtime client: it throttles
+when more calls are in flight than its capacity, can fail a scripted set of
+calls with ClientError-shaped errors, and makes a share of calls slow. The
+checks cover error classification, retries with backoff, the deadline, AIMD
+convergence under throttling, hedging of slow calls, and a full
+analyze_pending run that loses no entries to throttling. No AWS access is
+needed.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class FakeClientError(Exception):
+    """Shaped like botocore.exceptions.ClientError"""
+    def __init__(self, code, status):
+        super().__init__(f"An error occurred ({code})")
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+class ReadTimeoutError(Exception):
+    """Named like botocore.exceptions.ReadTimeoutError"""
+
+class FaultyBedrockClient:
+    def __init__(self, latency=0.01, capacity=None, fail=None, slow_every=0, slow_latency=0.5):
+        self.latency = latency
+        self.capacity = capacity  # concurrent calls accepted before throttling
+        self.fail = fail or {}  # call number -> exception to raise
+        self.slow_every = slow_every
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            over = self.capacity is not None and self.in_flight > self.capacity
+            if over:
+                self.throttled += 1
+        try:
+            if over:
+                raise FakeClientError('ThrottlingException', 400)
+            if call in self.fail:
+                raise self.fail[call]
+            slow = self.slow_every and call % self.slow_every == 0
+            time.sleep(self.slow_latency if slow else self.latency)
+            text = json.dumps({'bullets': ['Stub bullet one', 'Stub bullet two'], 'category': 'Economy',
+                               'relevancy_score': 90, 'author': ''})
+            body = {'content': [{'type': 'text', 'text': text}], 'usage': {'input_tokens': 100, 'output_tokens': 20}}
+            return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def make_invoker(client, **kwargs):
+    from resilience import ResilientInvoker, AIMDLimiter
+    limiter = kwargs.pop('limiter', None) or AIMDLimiter(initial=4, maximum=16)
+    kwargs.setdefault('hedge_percentile', 0)
+    return ResilientInvoker(lambda: client, limiter=limiter, **kwargs)
+
+def test_classification():
+    print("Testing error classification...")
+    from resilience import classify_error, THROTTLE, TRANSIENT, FATAL
+    assert classify_error(FakeClientError('ThrottlingException', 400)) == THROTTLE
+    assert classify_error(FakeClientError('SomethingElse', 429)) == THROTTLE
+    assert classify_error(FakeClientError('ServiceUnavailableException', 503)) == TRANSIENT
+    assert classify_error(FakeClientError('InternalServerException', 500)) == TRANSIENT
+    assert classify_error(FakeClientError('ValidationException', 400)) == FATAL
+    assert classify_error(FakeClientError('AccessDeniedException', 403)) == FATAL
+    assert classify_error(ReadTimeoutError('read timed out')) == TRANSIENT
+    assert classify_error(ConnectionResetError()) == TRANSIENT
+    assert classify_error(ValueError('bad json')) == FATAL
+    print("Classification OK")
+
+def test_retries_and_deadline():
+    print("Testing retries, backoff and deadline...")
+    delays = []
+    client = FaultyBedrockClient(fail={1: FakeClientError('ThrottlingException', 400),
+                                       2: FakeClientError('InternalServerException', 500)})
+    invoker = make_invoker(client, sleep=delays.append)
+    result = invoker.invoke(body=b'{}')
+    assert result.calls == 3 and client.calls == 3, result
+    assert len(delays) == 2 and all(0 <= delay <= 20 for delay in delays), delays
+    assert invoker.limiter.limit < 4, "a throttle must lower the concurrency limit"
+    print(f"  recovered after 2 faults, backoff {[round(d, 2) for d in delays]}s, limit {invoker.limiter.limit:.1f}")
+
+    client = FaultyBedrockClient(fail={1: FakeClientError('ValidationException', 400)})
+    try:
+        make_invoker(client, sleep=delays.append).invoke(body=b'{}')
+        raise AssertionError("fatal errors must not be retried")
+    except FakeClientError as e:
+        assert client.calls == 1 and e.bedrock_calls == 1
+
+    client = FaultyBedrockClient(fail={n: FakeClientError('ServiceUnavailableException', 503) for n in range(1, 100)})
+    start = time.monotonic()
+    try:
+        make_invoker(client, max_attempts=50, deadline=1.0, base_delay=0.05, max_delay=0.2).invoke(body=b'{}')
+        raise AssertionError("persistent 503s must fail")
+    except FakeClientError as e:
+        elapsed = time.monotonic() - start
+        assert elapsed < 1.2 and client.calls < 50, (elapsed, client.calls)
+        print(f"  deadline stopped {e.bedrock_calls} attempts after {elapsed:.2f}s")
+    print("Retries OK")
+
+def test_aimd_under_throttling():
+    print("Testing AIMD concurrency against a throttling stub...")
+    from resilience import AIMDLimiter
+    client = FaultyBedrockClient(latency=0.02, capacity=3)
+    limiter = AIMDLimiter(initial=12, maximum=16)
+    invoker = make_invoker(client, limiter=limiter, max_attempts=30, base_delay=0.01, max_delay=0.1)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda n: invoker.invoke(body=str(n).encode()), range(300)))
+    assert len(results) == 300, "every call must eventually succeed"
+    print(f"  300 calls, {client.throttled} throttled, limit settled at {limiter.limit:.1f} (capacity 3)")
+    assert limiter.limit < 8, "the limit should settle near the stub's capacity"
+    print("AIMD OK")
+
+def test_hedging():
+    print("Testing hedged requests...")
+    def p99(invoker, calls=200):
+        latencies = []
+        for n in range(calls):
+            start = time.perf_counter()
+            invoker.invoke(body=str(n).encode())
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return latencies[int(0.99 * (len(latencies) - 1))]
+
+    plain = p99(make_invoker(FaultyBedrockClient(latency=0.005, slow_every=10, slow_latency=0.3)))
+    client = FaultyBedrockClient(latency=0.005, slow_every=10, slow_latency=0.3)
+    hedged_invoker = make_invoker(client, hedge_percentile=80)
+    hedged = p99(hedged_invoker)
+    print(f"  p99 without hedging {plain * 1000:.0f} ms, with hedging {hedged * 1000:.0f} ms "
+          f"({client.calls - 200} duplicate calls)")
+    assert hedged < plain / 2, "hedging should cut the tail"
+    print("Hedging OK")
+
+def test_analyze_pending_with_throttling():
+    print("Testing analyze_pending against a throttling stub...")
+    workdir = tempfile.mkdtemp(prefix='rss_resilience_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+    from datetime import datetime
+    from database import SessionLocal, Category, PendingEntry, Article
+    from resilience import AIMDLimiter
+    from services import NewsProcessor
+
+    db = SessionLocal()
+    db.add(Category(name='Economy', description='Test category', active=True))
+    db.add_all(PendingEntry(url=f"http://example.com/{n}", title=f"Entry {n}", author='Reporter',
+                            content='Body text ' * 80, published_date=datetime.now()) for n in range(40))
+    db.commit()
+    db.close()
+
+    processor = NewsProcessor()
+    processor.content_extractor.enabled = False
+    client = FaultyBedrockClient(latency=0.02, capacity=2)
+    processor.ai_service.bedrock_client = client
+    invoker = processor.ai_service.invoker
+    invoker.limiter = AIMDLimiter(initial=8, maximum=8)
+    invoker.max_attempts, invoker.base_delay, invoker.max_delay = 30, 0.01, 0.1
+    saved, analyzed, cancelled = processor.analyze_pending()
+    db = SessionLocal()
+    try:
+        remaining = db.query(PendingEntry).count()
+        articles = db.query(Article).count()
+    finally:
+        db.close()
+    print(f"  saved {saved} of {analyzed}; {client.throttled} throttles absorbed, peak {client.peak} in flight")
+    assert saved == analyzed == articles == 40 and remaining == 0 and not cancelled
+    print("analyze_pending OK")
+
+if __name__ == "__main__":
+    test_classification()
+    test_retries_and_deadline()
+    test_aimd_under_throttling()
+    test_hedging()
+    test_analyze_pending_with_throttling()
+    print("\nAll resilience tests passed!")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Test run history (run_history.record_run and RunRecorder).
+
+Runs stub ingest functions against a throwaway SQLite database and checks
+the processing_runs row each one leaves, including runs that fail.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+
+workdir = tempfile.mkdtemp(prefix='rss_runs_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+def latest_run():
+    from database import SessionLocal, ProcessingRun
+    db = SessionLocal()
+    try:
+        return db.query(ProcessingRun).order_by(ProcessingRun.id.desc()).first()
+    finally:
+        db.close()
+
+def test_failed_run_is_recorded():
+    print("Testing a run that raises...")
+    from run_history import record_run
+    from services import NullProgress
+
+    def crashing(progress):
+        progress.set_stage('fetching')
+        progress.incr('fetched', 12)
+        progress.incr('feed_failures')
+        progress.set_stage('analyzing')
+        progress.incr('bedrock_calls', 3)
+        progress.incr('input_tokens', 1000)
+        raise RuntimeError("database is locked")
+
+    try:
+        record_run('fetch', crashing, NullProgress())
+        assert False, "the error should propagate to the caller"
+    except RuntimeError:
+        pass
+    run = latest_run()
+    assert run is not None, "a failed run still gets a processing_runs row"
+    assert run.kind == 'fetch' and run.status == 'failed'
+    assert run.result == 'Error: database is locked'
+    assert run.entries_fetched == 12 and run.failures == 1 and run.bedrock_calls == 3
+    assert run.estimated_cost > 0
+    assert set(run.stage_seconds) == {'fetching', 'analyzing'}, "the stage that was running is closed too"
+    assert run.finished_at is not None and run.duration_seconds >= 0
+    print("Failed run OK")
+
+def test_result_status():
+    print("Testing run statuses...")
+    from run_history import record_run
+    from services import NullProgress
+
+    assert record_run('full', lambda progress: "Error: no active feeds", NullProgress()) == "Error: no active feeds"
+    assert latest_run().status == 'failed', "an error result counts as a failure"
+
+    class Cancelled(NullProgress):
+        def is_cancelled(self):
+            return True
+    record_run('full', lambda progress: "Stopped", Cancelled())
+    assert latest_run().status == 'cancelled'
+
+    record_run('analyze', lambda progress: (5, 4), NullProgress())
+    run = latest_run()
+    assert run.status == 'completed' and run.result == '(5, 4)'
+    print("Statuses OK")
+
+def test_profiler_failure_releases_tracemalloc():
+    print("Testing a profiler that fails to stop...")
+    import tracemalloc
+    import profiling
+    from run_history import record_run
+    from services import NullProgress
+
+    class BrokenProfile:
+        def disable(self):
+            raise RuntimeError("profiler state lost")
+
+    def run(progress):
+        # progress is the RunRecorder; swap its profiler's cProfile for one that fails in stop()
+        progress.profiler._cprofile.disable()
+        progress.profiler._cprofile = BrokenProfile()
+        return "done"
+
+    assert not tracemalloc.is_tracing()
+    assert record_run('analyze', run, NullProgress(), profile='cprofile') == "done"
+    assert latest_run().status == 'completed', "losing the profile does not lose the run"
+    assert profiling._tracing_owners == 0 and not tracemalloc.is_tracing(), "tracemalloc is released"
+    print("Profiler failure OK")
+
+if __name__ == "__main__":
+    test_failed_run_is_recorded()
+    test_result_status()
+    test_profiler_failure_releases_tracemalloc()
+    print("\nAll run history tests passed!")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test feed sharding across several worker processes on one machine.
+
+Builds a throwaway SQLite database with local RSS files as feeds, starts
+three `worker.py --fetch-only` processes against it, and checks that the
+workers split the feeds without overlap, that every entry is queued
+exactly once, and that the survivors take over a killed worker's feeds.
+No network or Bedrock access is needed.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import signal
+import subprocess
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from sharding import HashRing
+
+FEEDS = 60
+ENTRIES_PER_FEED = 3
+WORKERS = 3
+TTL = 3
+
+def test_hash_ring():
+    print("Testing consistent hash ring...")
+    feed_ids = list(range(1, 1001))
+    ring = HashRing(['w1', 'w2', 'w3'])
+    shards = {worker: set(ring.shard(feed_ids, worker)) for worker in ring.workers}
+    assert sum(len(shard) for shard in shards.values()) == len(feed_ids), "shards must cover every feed once"
+    assert set.union(*shards.values()) == set(feed_ids)
+    print(f"  shard sizes: {[len(shard) for shard in shards.values()]}")
+
+    grown = HashRing(['w1', 'w2', 'w3', 'w4'])
+    moved = sum(1 for feed_id in feed_ids if ring.owner(feed_id) != grown.owner(feed_id))
+    print(f"  adding a 4th worker moved {moved} of {len(feed_ids)} feeds")
+    assert moved < len(feed_ids) / 2, "consistent hashing should move only about 1/N of the feeds"
+
+    shrunk = HashRing(['w1', 'w3'])
+    assert all(shrunk.owner(feed_id) == ring.owner(feed_id) for feed_id in shards['w1'] | shards['w3']), \
+        "removing a worker must not move feeds between the survivors"
+    print("Hash ring OK")
+
+def write_feeds(directory):
+    now = format_datetime(datetime.now(timezone.utc))
+    paths = []
+    for feed in range(FEEDS):
+        items = ''.join(
+            f"<item><title>Feed {feed} item {i}</title><link>http://example.com/{feed}/{i}</link>"
+            f"<description>Body {feed}-{i}</description><pubDate>{now}</pubDate></item>"
+            for i in range(ENTRIES_PER_FEED)
+        )
+        path = os.path.join(directory, f"feed{feed}.xml")
+        with open(path, 'w') as f:
+            f.write(f"<?xml version='1.0'?><rss version='2.0'><channel><title>Feed {feed}</title>{items}</channel></rss>")
+        paths.append(path)
+    return paths
+
+def start_worker(env, worker_id):
+    return subprocess.Popen(
+        [sys.executable, 'worker.py', '--id', worker_id, '--interval', '1', '--ttl', str(TTL), '--fetch-only'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def shard_sizes(db_path):
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        return dict(conn.execute("SELECT worker_id, shard_size FROM worker_leases").fetchall())
+
+def test_workers():
+    print("\nTesting worker processes...")
+    directory = tempfile.mkdtemp(prefix='rss_sharding_')
+    db_path = os.path.join(directory, 'news.db')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+
+    from sqlalchemy import create_engine
+    from database import Base
+    Base.metadata.create_all(create_engine(env['DATABASE_URL']))
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO feeds (name, url, active) VALUES (?, ?, 1)",
+                         [(f"Feed {i}", path) for i, path in enumerate(write_feeds(directory))])
+
+    workers = {f"worker-{i}": start_worker(env, f"worker-{i}") for i in range(WORKERS)}
+    try:
+        time.sleep(6)
+        sizes = shard_sizes(db_path)
+        print(f"  shard sizes with {WORKERS} workers: {sizes}")
+        assert len(sizes) == WORKERS and sum(sizes.values()) == FEEDS
+
+        # Each worker's first cycle also starts its parse pool (a forkserver), so allow it some time
+        deadline = time.time() + 20
+        while True:
+            with sqlite3.connect(db_path, timeout=30) as conn:
+                queued, distinct = conn.execute("SELECT COUNT(*), COUNT(DISTINCT url) FROM pending_entries").fetchone()
+            if queued >= FEEDS * ENTRIES_PER_FEED or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        print(f"  queued {queued} entries ({distinct} distinct)")
+        assert queued == distinct == FEEDS * ENTRIES_PER_FEED
+
+        victim = 'worker-0'
+        workers[victim].send_signal(signal.SIGKILL)
+        workers[victim].wait()
+        time.sleep(TTL + 3)
+        sizes = shard_sizes(db_path)
+        print(f"  shard sizes after killing {victim}: {sizes}")
+        assert victim not in sizes and sum(sizes.values()) == FEEDS
+    finally:
+        for proc in workers.values():
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+    print("Worker sharding OK")
+
+if __name__ == "__main__":
+    test_hash_ring()
+    test_workers()
+    print("\nAll sharding tests passed!")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Test the precomputed article_stats table (stats.py) and its dashboard use.
+
+Seeds a throwaway SQLite database and checks the GROUP BY rows against
+counts taken straight from the seed, including the first read that finds
+the table empty and fills it, and that dashboard category badges only
+link to sections that are actually on the page.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp(prefix='rss_stats_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+
+DAY1 = datetime(2026, 1, 1, 9, 0)
+DAY2 = datetime(2026, 1, 2, 9, 0)
+# (category, feed, score, created_at)
+SEED = [
+    ('Tech', 'Feed A', 8, DAY1),
+    ('Tech', 'Feed A', 6, DAY2),
+    ('Tech', 'Feed B', 4, DAY2 + timedelta(hours=1)),
+    ('Science', 'Feed B', 9, DAY1),
+    (None, None, 3, DAY2),
+]
+
+def seed():
+    from database import SessionLocal, Article, Category, Feed
+    db = SessionLocal()
+    feeds = {name: Feed(name=name, url=f"http://example.com/{name}.xml") for name in ('Feed A', 'Feed B')}
+    db.add_all(feeds.values())
+    db.add_all([Category(name='Tech', color='#ff0000'), Category(name='Science', color='#00ff00'),
+                Category(name='Sports', color='#0000ff')])
+    db.flush()
+    for i, (category, feed, score, created_at) in enumerate(SEED):
+        db.add(Article(title=f"Article {i}", url=f"http://example.com/{i}", relevancy_score=score,
+                       category_name=category, feed_id=feeds[feed].id if feed else None,
+                       created_at=created_at, published_date=created_at))
+    db.commit()
+    feed_ids = {name: str(feed.id) for name, feed in feeds.items()}
+    db.close()
+    return feed_ids
+
+def test_stats_self_populate_and_group_by():
+    print("Testing article_stats aggregation...")
+    from database import SessionLocal, ArticleStat
+    from stats import get_article_stats, get_total_stat, refresh_article_stats
+    feed_ids = seed()
+    db = SessionLocal()
+    try:
+        assert db.query(ArticleStat).count() == 0
+        # The first read finds the table empty and fills it
+        categories = get_article_stats(db, 'category')
+        assert db.query(ArticleStat).count() > 0, "an empty table is populated on first read"
+        assert {key: stat.article_count for key, stat in categories.items()} == {'Tech': 3, 'Science': 1}
+        assert categories['Tech'].avg_score == 6
+        assert categories['Tech'].latest_created_at == DAY2 + timedelta(hours=1)
+
+        total = get_total_stat(db)
+        assert total.article_count == len(SEED)
+        assert total.avg_score == sum(row[2] for row in SEED) / len(SEED)
+
+        feeds = get_article_stats(db, 'feed')
+        assert feeds[feed_ids['Feed A']].article_count == 2 and feeds[feed_ids['Feed A']].label == 'Feed A'
+        assert feeds[feed_ids['Feed B']].article_count == 2
+        assert feeds['None'].article_count == 1 and feeds['None'].label == 'Unknown'
+
+        days = get_article_stats(db, 'day')
+        assert {key: stat.article_count for key, stat in days.items()} == {'2026-01-01': 2, '2026-01-02': 3}
+
+        # Refreshing replaces every row rather than adding to them
+        rows = db.query(ArticleStat).count()
+        assert refresh_article_stats(db) == rows
+        assert db.query(ArticleStat).count() == rows
+    finally:
+        db.close()
+
+    # An empty articles table still yields a total row, so the dashboard does not rebuild on every view
+    from database import Article
+    db = SessionLocal()
+    try:
+        db.query(Article).delete()
+        db.commit()
+        refresh_article_stats(db)
+        assert get_total_stat(db).article_count == 0
+        assert get_article_stats(db, 'category') == {}
+    finally:
+        db.close()
+    print("Stats OK")
+
+def test_dashboard_badges_link_to_shown_sections():
+    print("Testing dashboard category badges...")
+    from app import app
+    from database import SessionLocal, Article
+    from stats import refresh_article_stats
+    db = SessionLocal()
+    for i, (category, feed, score, created_at) in enumerate(SEED):
+        db.add(Article(title=f"Article {i}", url=f"http://example.com/{i}", relevancy_score=score,
+                       category_name=category, created_at=created_at, published_date=created_at))
+    db.commit()
+    refresh_article_stats(db)
+    # Science stays in the counts but drops out of the article list
+    db.query(Article).filter(Article.category_name == 'Science').delete()
+    db.commit()
+    db.close()
+
+    with app.test_client() as client:
+        html = client.get('/').get_data(as_text=True)
+    assert 'href="#category-tech"' in html and 'id="category-tech"' in html
+    assert 'Science' in html, "the badge still shows the category's count"
+    assert 'href="#category-science"' not in html, "no link to a section that is not on the page"
+    print("Dashboard badges OK")
+
+if __name__ == "__main__":
+    test_stats_self_populate_and_group_by()
+    test_dashboard_badges_link_to_shown_sections()
+    print("\nAll stats tests passed!")
@@ -33,9 +33,9 @@ def verify_access_key_logic():
         # So we'll inspect the fetcher's behavior or just call it and catch the parse error,
         # but we really want to know if the header was sent.
         
-        # Let's monkeypatch requests.get to intercept the call
-        import requests
-        original_get = requests.get
+        # Let's monkeypatch the fetcher's session.get to intercept the call
+        session = fetcher.session
+        original_get = session.get
         
         captured_headers = {}
         
@@ -44,7 +44,7 @@ def verify_access_key_logic():
             captured_headers = headers
             return original_get(url, headers=headers, **kwargs)
             
-        requests.get = mock_get
+        session.get = mock_get
         
         try:
             print("Testing fetch with access key...")
@@ -53,7 +53,7 @@ def verify_access_key_logic():
             # Expected to fail parsing JSON as RSS
             pass
         finally:
-            requests.get = original_get
+            session.get = original_get
             
         if captured_headers.get('Authorization') == test_access_key:
             print(f"✓ Fetcher: Authorization header sent correctly: {captured_headers.get('Authorization')}")
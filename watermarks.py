@@ -0,0 +1,42 @@
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_
+from database import Article, HighWaterMark
+
+def load_watermark(db, name):
+    """Return the HighWaterMark row for a consumer, or None on its first run"""
+    return db.get(HighWaterMark, name)
+
+def after_watermark(query, mark, settle_seconds=None):
+    """Restrict an article query to rows after the mark, in (created_at, id) keyset order.
+
+    created_at is compared first because SQLite may reuse ids after the
+    newest rows are deleted (e.g. "Clear All News"). Rows younger than
+    settle_seconds (RSS_WATERMARK_SETTLE_SECONDS) are left for the next
+    run: created_at comes from each worker's clock when the row is built,
+    so a worker that commits late, or runs a little behind, can add a row
+    just below a mark that has already moved on.
+    """
+    if settle_seconds is None:
+        settle_seconds = float(os.getenv('RSS_WATERMARK_SETTLE_SECONDS', '60'))
+    if mark is not None and mark.last_created_at is not None:
+        query = query.where(or_(
+            Article.created_at > mark.last_created_at,
+            and_(Article.created_at == mark.last_created_at, Article.id > mark.last_article_id)
+        ))
+    if settle_seconds > 0:
+        # created_at is stored as naive UTC
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=settle_seconds)
+        query = query.where(Article.created_at <= cutoff)
+    return query.order_by(Article.created_at.asc(), Article.id.asc())
+
+def save_watermark(db, name, last_created_at, last_article_id):
+    """Advance a consumer's mark; the caller commits"""
+    mark = db.get(HighWaterMark, name)
+    if mark is None:
+        mark = HighWaterMark(name=name)
+        db.add(mark)
+    mark.last_created_at = last_created_at
+    mark.last_article_id = last_article_id
+    mark.updated_at = datetime.now(timezone.utc)
+    return mark
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Ingest worker that processes one shard of the feeds table.
+
+Start several workers, on one host or on several hosts sharing the same
+database, and each fetches and analyzes only the feeds it owns on a
+consistent hash ring of live workers. Workers heartbeat a row in
+worker_leases; when one joins, stops or misses RSS_WORKER_LEASE_TTL
+seconds of heartbeats, the others pick up its feeds on their next cycle.
+
+Usage:
+    python worker.py
+    python worker.py --id worker-a --interval 300
+    python worker.py --once --fetch-only
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import logging
+import signal
+import threading
+from database import SessionLocal, Feed
+from services import NewsProcessor, NullProgress
+from run_history import record_run
+from sharding import WorkerLeaseKeeper
+
+logger = logging.getLogger(__name__)
+
+def run_cycle(processor, lease, fetch_only=False):
+    """Fetch and analyze the feeds this worker currently owns"""
+    db = SessionLocal()
+    try:
+        feed_ids = [feed_id for feed_id, in db.query(Feed.id).filter(Feed.active == True).all()]
+    finally:
+        db.close()
+
+    shard = lease.assigned_feed_ids(feed_ids)
+    lease.heartbeat(shard_size=len(shard))
+    logger.info(f"Worker {lease.worker_id} owns {len(shard)} of {len(feed_ids)} feeds")
+    if not shard:
+        return
+
+    def ingest(progress):
+        queued, total_entries, _ = processor.fetch_feeds(progress, feed_ids=shard)
+        logger.info(f"Worker {lease.worker_id} queued {queued} of {total_entries} entries")
+        if fetch_only:
+            return f"Queued {queued} of {total_entries} entries"
+        saved, analyzed, _ = processor.analyze_pending(progress, feed_ids=shard)
+        logger.info(f"Worker {lease.worker_id} saved {saved} of {analyzed} analyzed entries")
+        if saved:
+            processor.refresh_stats(progress)
+        return f"Saved {saved} relevant articles from {analyzed} analyzed entries"
+    record_run('worker', ingest, NullProgress())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--id', help='worker id (default: hostname-pid)')
+    parser.add_argument('--interval', type=float, default=float(os.getenv('RSS_WORKER_INTERVAL', '300')),
+                        help='seconds between ingest cycles')
+    parser.add_argument('--ttl', type=int, help='lease TTL in seconds (default RSS_WORKER_LEASE_TTL or 60)')
+    parser.add_argument('--once', action='store_true', help='run a single cycle and exit')
+    parser.add_argument('--fetch-only', action='store_true', help='queue entries without analyzing them')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    processor = NewsProcessor()
+    lease = WorkerLeaseKeeper(args.id, args.ttl)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    lease.start()
+    # Let peers that start at the same moment register before the first shard is computed
+    stopping.wait(min(2.0, args.interval))
+    try:
+        while not stopping.is_set():
+            try:
+                run_cycle(processor, lease, args.fetch_only)
+            except Exception as e:
+                logger.error(f"Worker cycle failed: {e}")
+            if args.once:
+                break
+            stopping.wait(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        lease.stop()
+        logger.info(f"Worker {lease.worker_id} stopped")
+
+if __name__ == "__main__":
+    main()
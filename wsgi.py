@@ -0,0 +1,12 @@
+"""Production WSGI entry point.
+
+Run with:  gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app
+
+app = create_app()